@@ -10,10 +10,13 @@ import threading
 import time
 import os
 import json
-from datetime import datetime
+import uuid
+from datetime import date, datetime, timedelta
 from telegram_listener import TelegramBotListener
+from message_store import StorageUnavailable
 from telethon.errors import SessionPasswordNeededError
 import config
+import rollups
 
 # Debug logging helper
 def debug_log(location, message, data=None, hypothesis_id=None):
@@ -391,6 +394,9 @@ def run_listener():
                 print(f"[Listener] ✗ {error_msg}")
                 import traceback
                 traceback.print_exc()
+                # Stop the background threads of the listener being discarded
+                if bot_listener is not None and hasattr(bot_listener, "persistence_queue"):
+                    bot_listener.close_persistence()
                 bot_listener = None
                 init_error = error_msg
                 last_init_attempt = datetime.now().isoformat()
@@ -653,12 +659,242 @@ def send_command():
         }), 500
 
 
+def send_topup_request(prefix, uid, diamonds, fast=False):
+    """Send "{prefix} {uid} {diamonds}" to the bot and wait for the UID-matched result.
+    
+    Waits for the card list (usedUc) of the order. With fast the call returns as
+    soon as the topup header (status, UID, Order ID) is matched: usedUc is then
+    null and cardsPending is set unless the cards were already parsed, and the
+    cards are served by /api/orders/<orderId>.
+    
+    Returns:
+        (response dict, HTTP status code)
+    """
+    # Format message: {prefix} {uid} {diamonds}
+    message = f"{prefix} {uid} {diamonds}"
+    
+    if not bot_listener or not bot_listener.bot_entity:
+        return {
+            "success": False,
+            "error": "Bot listener not initialized. Please wait a moment and try again."
+        }, 503
+    
+    # Send message to bot
+    async def send_and_wait():
+        # Register pending request BEFORE sending to ensure we catch the response
+        response_event, pending_item = await bot_listener.register_pending_request(uid, None)
+    
+        # Send message to bot
+        sent_message = await bot_listener.client.send_message(
+            bot_listener.bot_entity, 
+            message
+        )
+    
+        # Update pending request with sent_message_id
+        pending_item["sent_message_id"] = sent_message.id
+    
+        # Wait for UID-matched response (max 10 seconds)
+        try:
+            # Wait for event to be set (with timeout)
+            await asyncio.wait_for(response_event.wait(), timeout=10.0)
+    
+            # Get the response data from the pending item
+            response = pending_item["response_data"]
+    
+            # Clean up pending request
+            await bot_listener.unregister_pending_request(uid, pending_item)
+    
+            return {
+                "sent_message_id": sent_message.id,
+                "response": response,
+                "parsed_event": pending_item["parsed_event"]
+            }
+        except asyncio.TimeoutError:
+            # Timeout - clean up pending request
+            await bot_listener.unregister_pending_request(uid, pending_item)
+            print(f"  [Pending] Timeout waiting for response for UID: {uid}")
+    
+            # Fallback to old behavior: try to find any response after our message
+            response = None
+            async with bot_listener.response_lock:
+                if bot_listener.recent_responses:
+                    latest_response = max(
+                        bot_listener.recent_responses.values(),
+                        key=lambda x: x["date"]
+                    )
+                    # Check if this response came after our message
+                    if latest_response["message_id"] > sent_message.id:
+                        response = latest_response
+    
+            return {
+                "sent_message_id": sent_message.id,
+                "response": response
+            }
+    
+    # Run async function
+    if listener_loop and listener_loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(send_and_wait(), listener_loop)
+        result = future.result(timeout=15)
+    else:
+        return {
+            "success": False,
+            "error": "Listener loop not running"
+        }, 503
+    
+    # Extract full topupResult from MongoDB or response data
+    topup_result = None
+    status = None
+    uid = None
+    order_id = None
+    used_uc_cards = []
+    
+    # The request is woken on the topup header (status, UID, Order ID); the
+    # card list and payment fields are parsed right after it
+    response_data = result.get("response")
+    raw_data = (response_data or {}).get("raw_data") or {}
+    topup_header = raw_data.get("topupHeader")
+    if topup_header:
+        status = topup_header.get("status")
+        uid = topup_header.get("uid")
+        order_id = topup_header.get("orderId")
+        if not fast and status != "failed" and result.get("parsed_event"):
+            result["parsed_event"].wait(timeout=5)
+        topup_result = raw_data.get("topupResult")
+    
+    # Without a matched header (timeout fallback), or when asked to wait for
+    # the cards, look the result up in storage
+    if (not fast or not topup_header) and not topup_result and bot_listener.store_available():
+        try:
+            # Wait a bit for MongoDB to save the response unless the listener already parsed it
+            if not raw_data.get("topupResult"):
+                time.sleep(1.5)
+    
+            # Get the response message_id
+            response_data = result.get("response")
+            message_id = None
+    
+            if response_data:
+                message_id = response_data.get("message_id")
+                # Check if topupResult is already in response raw_data
+                if response_data.get("raw_data") and response_data["raw_data"].get("topupResult"):
+                    topup_result = response_data["raw_data"]["topupResult"]
+                    status = topup_result.get("status")
+                    if topup_result.get("user"):
+                        uid = topup_result["user"].get("uid")
+                    if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
+                        used_uc_obj = topup_result["payment"]["usedUc"]
+                        if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
+                            used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
+                        elif isinstance(used_uc_obj, list):
+                            used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
+    
+            # If topupResult not found in response, query MongoDB by message_id
+            if not topup_result and message_id:
+                mongo_doc = bot_listener.store_lookup(bot_listener.store.find_by_message_id, message_id)
+                if mongo_doc and mongo_doc.get("topupResult"):
+                    topup_result = mongo_doc["topupResult"]
+                    status = topup_result.get("status")
+                    if topup_result.get("user"):
+                        uid = topup_result["user"].get("uid")
+                    if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
+                        used_uc_obj = topup_result["payment"]["usedUc"]
+                        if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
+                            used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
+                        elif isinstance(used_uc_obj, list):
+                            used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
+    
+            # If still not found, try to get latest topupResult document
+            if not topup_result:
+                # Find latest document with topupResult
+                latest_doc = bot_listener.store_lookup(bot_listener.store.find_latest, "topupResult")
+                if latest_doc and latest_doc.get("topupResult"):
+                    # Check if this document is recent (within last 30 seconds)
+                    doc_date = latest_doc.get("raw_date")
+                    use_this_doc = False
+                    if doc_date:
+                        try:
+                            doc_datetime = datetime.fromisoformat(doc_date.replace('Z', '+00:00'))
+                            now = datetime.now(doc_datetime.tzinfo) if doc_datetime.tzinfo else datetime.now()
+                            if (now - doc_datetime.replace(tzinfo=None)).total_seconds() < 30:
+                                use_this_doc = True
+                        except:
+                            # If date parsing fails, use the document anyway
+                            use_this_doc = True
+    
+                    if use_this_doc:
+                        topup_result = latest_doc["topupResult"]
+                        status = topup_result.get("status")
+                        if topup_result.get("user"):
+                            uid = topup_result["user"].get("uid")
+                        if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
+                            used_uc_obj = topup_result["payment"]["usedUc"]
+                            if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
+                                used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
+                            elif isinstance(used_uc_obj, list):
+                                used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
+        except Exception as e:
+            print(f"Error extracting topupResult from MongoDB: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    # Return status, uid, and usedUc cards
+    # If status is "failed", set success to False
+    final_status = status or "pending"
+    api_success = final_status != "failed"
+    
+    # Build response
+    response_data = {
+        "success": api_success,
+        "status": final_status
+    }
+    
+    # Add uid if available (extracted from topup_result or use pre-extracted uid)
+    if uid:
+        response_data["uid"] = uid
+    elif topup_result and topup_result.get("user") and topup_result["user"].get("uid"):
+        response_data["uid"] = topup_result["user"]["uid"]
+    
+    if order_id is None and topup_result:
+        order_id = topup_result.get("orderId")
+    if order_id is not None:
+        response_data["orderId"] = order_id
+    
+    # fast: the card list may still be being parsed (see /api/orders/<orderId>)
+    if fast:
+        response_data["usedUc"] = None
+        if topup_header and not topup_result and final_status != "failed":
+            response_data["cardsPending"] = True
+    
+    # Failed cards of the order (see /api/retry-failed)
+    if topup_result and isinstance((topup_result.get("payment") or {}).get("usedUc"), dict):
+        summary = topup_result["payment"]["usedUc"].get("summary")
+        if summary and summary.get("failed"):
+            response_data["failedUc"] = summary["failedCodes"]
+    
+    # Add usedUc cards if available (extracted from topup_result or use pre-extracted used_uc_cards)
+    if used_uc_cards:
+        response_data["usedUc"] = used_uc_cards
+    elif topup_result and topup_result.get("payment") and topup_result["payment"].get("usedUc"):
+        used_uc_obj = topup_result["payment"]["usedUc"]
+        if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
+            response_data["usedUc"] = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
+        elif isinstance(used_uc_obj, list):
+            response_data["usedUc"] = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
+        else:
+            response_data["usedUc"] = used_uc_obj
+    
+    return response_data, 200
+
+
 @app.route('/api/send-message-raw', methods=['GET', 'POST'])
 def send_message_raw():
     """Send a raw message to the bot.
     
     GET: /api/send-message-raw?prefix=ktp&uid=123&diamonds=100
     POST: {"prefix": "ktp", "uid": "uid", "diamonds": "diamonds"}
+    
+    Waits for the card list (usedUc); add fast=true to return on the order
+    header instead (usedUc null, cardsPending, cards from /api/orders/<orderId>).
     """
     try:
         # Get parameters from request
@@ -666,11 +902,13 @@ def send_message_raw():
             prefix = request.args.get('prefix')
             uid = request.args.get('uid')
             diamonds = request.args.get('diamonds')
+            fast = request.args.get('fast', '').lower() in ('1', 'true', 'yes')
         else:
             data = request.get_json() or {}
             prefix = data.get('prefix')
             uid = data.get('uid')
             diamonds = data.get('diamonds')
+            fast = data.get('fast') in (True, 1, '1', 'true', 'yes')
         
         if not prefix or not uid or not diamonds:
             return jsonify({
@@ -678,188 +916,150 @@ def send_message_raw():
                 "error": "prefix, uid, and diamonds parameters are required"
             }), 400
         
-        # Format message: {prefix} {uid} {diamonds}
-        message = f"{prefix} {uid} {diamonds}"
+        response_data, status_code = send_topup_request(prefix, uid, diamonds, fast=fast)
+        return jsonify(response_data), status_code
         
-        if not bot_listener or not bot_listener.bot_entity:
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/api/retry-failed', methods=['POST'])
+def retry_failed_cards():
+    """Re-issue only the failed cards of a Monthly order.
+    
+    POST: {"prefix": "ktp", "orderId": 2237}
+    
+    The order is looked up in recent orders, then in storage, and the bot is
+    sent "{prefix} {uid} {failed card count}" instead of the whole order. The
+    amount argument of a Monthly command is the number of units and each unit
+    is one card, so this is only done for orders whose card count equals the
+    ordered quantity. The retry is recorded on the order as "pending" before
+    the command is sent and becomes "sent" once the bot answers with an order;
+    a second call meanwhile returns 409 with that record. If no order comes back
+    (send error, timeout, listener not ready) the record is released and the
+    order can be retried again.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        prefix = data.get('prefix')
+        order_id = data.get('orderId')
+        
+        if not prefix or order_id is None:
+            return jsonify({
+                "success": False,
+                "error": "prefix and orderId parameters are required"
+            }), 400
+        try:
+            order_id = int(str(order_id).lstrip('#'))
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "orderId must be a number"
+            }), 400
+        
+        if not bot_listener:
             return jsonify({
                 "success": False,
                 "error": "Bot listener not initialized. Please wait a moment and try again."
             }), 503
-        
-        # Send message to bot
-        async def send_and_wait():
-            # Register pending request BEFORE sending to ensure we catch the response
-            response_event, pending_item = await bot_listener.register_pending_request(uid, None)
-            
-            # Send message to bot
-            sent_message = await bot_listener.client.send_message(
-                bot_listener.bot_entity, 
-                message
-            )
-            
-            # Update pending request with sent_message_id
-            pending_item["sent_message_id"] = sent_message.id
-            
-            # Wait for UID-matched response (max 10 seconds)
-            try:
-                # Wait for event to be set (with timeout)
-                await asyncio.wait_for(response_event.wait(), timeout=10.0)
-                
-                # Get the response data from the pending item
-                response = pending_item["response_data"]
-                
-                # Clean up pending request
-                await bot_listener.unregister_pending_request(uid, pending_item)
-                
-                return {
-                    "sent_message_id": sent_message.id,
-                    "response": response
-                }
-            except asyncio.TimeoutError:
-                # Timeout - clean up pending request
-                await bot_listener.unregister_pending_request(uid, pending_item)
-                print(f"  [Pending] Timeout waiting for response for UID: {uid}")
-                
-                # Fallback to old behavior: try to find any response after our message
-                response = None
-                async with bot_listener.response_lock:
-                    if bot_listener.recent_responses:
-                        latest_response = max(
-                            bot_listener.recent_responses.values(),
-                            key=lambda x: x["date"]
-                        )
-                        # Check if this response came after our message
-                        if latest_response["message_id"] > sent_message.id:
-                            response = latest_response
-                
-                return {
-                    "sent_message_id": sent_message.id,
-                    "response": response
-                }
-        
-        # Run async function
-        if listener_loop and listener_loop.is_running():
-            future = asyncio.run_coroutine_threadsafe(send_and_wait(), listener_loop)
-            result = future.result(timeout=15)
-        else:
+        if not listener_loop or not listener_loop.is_running():
             return jsonify({
                 "success": False,
                 "error": "Listener loop not running"
             }), 503
         
-        # Extract full topupResult from MongoDB or response data
-        topup_result = None
-        status = None
-        uid = None
-        used_uc_cards = []
+        # Find the original order: recent orders first, then storage
+        try:
+            order, _ = bot_listener.find_order(order_id)
+        except StorageUnavailable as e:
+            return jsonify({
+                "success": False,
+                "orderId": order_id,
+                "error": f"Order lookup failed, storage unavailable: {e}"
+            }), 503
+        topup_result = order["topupResult"] if order else None
         
-        if bot_listener.mongo_collection is not None:
-            try:
-                # Wait a bit for MongoDB to save the response (increase wait time)
-                time.sleep(1.5)
-                
-                # Get the response message_id
-                response_data = result.get("response")
-                message_id = None
-                
-                if response_data:
-                    message_id = response_data.get("message_id")
-                    # Check if topupResult is already in response raw_data
-                    if response_data.get("raw_data") and response_data["raw_data"].get("topupResult"):
-                        topup_result = response_data["raw_data"]["topupResult"]
-                        status = topup_result.get("status")
-                        if topup_result.get("user"):
-                            uid = topup_result["user"].get("uid")
-                        if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
-                            used_uc_obj = topup_result["payment"]["usedUc"]
-                            if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
-                                used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
-                            elif isinstance(used_uc_obj, list):
-                                used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
-                
-                # If topupResult not found in response, query MongoDB by message_id
-                if not topup_result and message_id:
-                    mongo_doc = bot_listener.mongo_collection.find_one({"message_id": message_id})
-                    if mongo_doc and mongo_doc.get("topupResult"):
-                        topup_result = mongo_doc["topupResult"]
-                        status = topup_result.get("status")
-                        if topup_result.get("user"):
-                            uid = topup_result["user"].get("uid")
-                        if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
-                            used_uc_obj = topup_result["payment"]["usedUc"]
-                            if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
-                                used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
-                            elif isinstance(used_uc_obj, list):
-                                used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
-                
-                # If still not found, try to get latest topupResult document
-                if not topup_result:
-                    # Find latest document with topupResult
-                    latest_doc = bot_listener.mongo_collection.find_one(
-                        {"topupResult": {"$exists": True}},
-                        sort=[("_id", -1)]  # Sort by _id descending (latest first)
-                    )
-                    if latest_doc and latest_doc.get("topupResult"):
-                        # Check if this document is recent (within last 30 seconds)
-                        doc_date = latest_doc.get("raw_date")
-                        use_this_doc = False
-                        if doc_date:
-                            try:
-                                doc_datetime = datetime.fromisoformat(doc_date.replace('Z', '+00:00'))
-                                now = datetime.now(doc_datetime.tzinfo) if doc_datetime.tzinfo else datetime.now()
-                                if (now - doc_datetime.replace(tzinfo=None)).total_seconds() < 30:
-                                    use_this_doc = True
-                            except:
-                                # If date parsing fails, use the document anyway
-                                use_this_doc = True
-                        
-                        if use_this_doc:
-                            topup_result = latest_doc["topupResult"]
-                            status = topup_result.get("status")
-                            if topup_result.get("user"):
-                                uid = topup_result["user"].get("uid")
-                            if topup_result.get("payment") and topup_result["payment"].get("usedUc"):
-                                used_uc_obj = topup_result["payment"]["usedUc"]
-                                if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
-                                    used_uc_cards = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
-                                elif isinstance(used_uc_obj, list):
-                                    used_uc_cards = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
-            except Exception as e:
-                print(f"Error extracting topupResult from MongoDB: {e}")
-                import traceback
-                traceback.print_exc()
+        if not topup_result:
+            return jsonify({
+                "success": False,
+                "error": f"Order #{order_id} not found"
+            }), 404
+        
+        if topup_result.get("status") == "failed":
+            return jsonify({
+                "success": False,
+                "orderId": order_id,
+                "error": "The whole order failed (Limit Over); send it again with /api/send-message-raw"
+            }), 409
+        
+        used_uc_obj = (topup_result.get("payment") or {}).get("usedUc")
+        summary = used_uc_obj.get("summary") if isinstance(used_uc_obj, dict) else None
+        if not summary:
+            return jsonify({
+                "success": False,
+                "orderId": order_id,
+                "error": "Order has no per-card status; it was stored before card status was recorded"
+            }), 409
+        
+        if not summary["failed"]:
+            return jsonify({
+                "success": True,
+                "orderId": order_id,
+                "retried": False,
+                "failedCount": 0
+            })
         
-        # Return status, uid, and usedUc cards
-        # If status is "failed", set success to False
-        final_status = status or "pending"
-        api_success = final_status != "failed"
+        # One card per ordered unit, so the failed card count is the amount to re-order
+        quantity = (topup_result.get("product") or {}).get("quantity")
+        if quantity != summary["total"]:
+            return jsonify({
+                "success": False,
+                "orderId": order_id,
+                "error": f"Order has {summary['total']} cards for quantity {quantity}; "
+                         f"the failed cards do not map to a unit count, re-send them with /api/send-message-raw"
+            }), 409
         
-        # Build response
-        response_data = {
-            "success": api_success,
-            "status": final_status
+        uid = topup_result["user"]["uid"]
+        retry = {
+            "retryId": uuid.uuid4().hex,
+            "state": "pending",
+            "retriedAt": datetime.now().isoformat(),
+            "command": f"{prefix} {uid} {summary['failed']}",
+            "failedCount": summary["failed"],
+            "failedUc": summary["failedCodes"]
         }
+        claimed, retry_record = bot_listener.claim_order_retry(order_id, retry)
+        if not claimed:
+            return jsonify({
+                "success": False,
+                "orderId": order_id,
+                "error": f"Order #{order_id} was already retried",
+                "retry": retry_record
+            }), 409
         
-        # Add uid if available (extracted from topup_result or use pre-extracted uid)
-        if uid:
-            response_data["uid"] = uid
-        elif topup_result and topup_result.get("user") and topup_result["user"].get("uid"):
-            response_data["uid"] = topup_result["user"]["uid"]
-        
-        # Add usedUc cards if available (extracted from topup_result or use pre-extracted used_uc_cards)
-        if used_uc_cards:
-            response_data["usedUc"] = used_uc_cards
-        elif topup_result and topup_result.get("payment") and topup_result["payment"].get("usedUc"):
-            used_uc_obj = topup_result["payment"]["usedUc"]
-            if isinstance(used_uc_obj, dict) and used_uc_obj.get("codes"):
-                response_data["usedUc"] = [card.get("code") for card in used_uc_obj["codes"] if card.get("code")]
-            elif isinstance(used_uc_obj, list):
-                response_data["usedUc"] = [card.get("code") if isinstance(card, dict) else str(card) for card in used_uc_obj]
-            else:
-                response_data["usedUc"] = used_uc_obj
-        
-        return jsonify(response_data)
+        # The claim is released unless the bot answers with a new order
+        retry_order_id = None
+        try:
+            response_data, status_code = send_topup_request(prefix, uid, summary["failed"])
+            if status_code == 200 and response_data.get("orderId") not in (None, order_id):
+                retry_order_id = response_data["orderId"]
+        finally:
+            bot_listener.finish_order_retry(order_id, retry, retry_order_id)
+        
+        response_data.update({
+            "retryOrderId": retry_order_id,
+            "retryState": "sent" if retry_order_id is not None else "released",
+            "orderId": order_id,
+            "retried": True,
+            "retriedAt": retry["retriedAt"],
+            "command": retry["command"],
+            "failedCount": summary["failed"],
+            "retriedUc": summary["failedCodes"]
+        })
+        return jsonify(response_data), status_code
         
     except Exception as e:
         return jsonify({
@@ -868,6 +1068,245 @@ def send_message_raw():
         }), 500
 
 
+@app.route('/api/prices', methods=['GET'])
+def get_prices():
+    """Return the current price list from memory.
+    
+    Supports ETag/If-None-Match: a client sending the last ETag gets 304 while
+    the version is unchanged.
+    """
+    if not bot_listener:
+        return jsonify({
+            "success": False,
+            "error": "Bot listener not initialized. Please wait a moment and try again."
+        }), 503
+    
+    snapshot = bot_listener.price_list_store.snapshot()
+    if snapshot is None:
+        return jsonify({
+            "success": False,
+            "error": "No price list received from the bot yet"
+        }), 404
+    
+    if request.if_none_match.contains(snapshot["etag"]):
+        response = app.response_class(status=304)
+        response.set_etag(snapshot["etag"])
+        return response
+    
+    response = jsonify({
+        "success": True,
+        "version": snapshot["version"],
+        "hash": snapshot["hash"],
+        "updatedAt": snapshot["updatedAt"],
+        "ucPriceList": snapshot["ucPriceList"],
+        "specialPackages": snapshot["specialPackages"]
+    })
+    response.set_etag(snapshot["etag"])
+    return response
+
+
+@app.route('/api/account', methods=['GET'])
+def get_account():
+    """Return the latest account status (name, due, balance, due limit) from memory.
+    
+    GET: /api/account
+    GET: /api/account?max_age=60  - refresh through the bot if the snapshot is older than 60s
+    GET: /api/account?max_age=60&command=...  - override ACCOUNT_STATUS_COMMAND for the refresh
+    """
+    if not bot_listener:
+        return jsonify({
+            "success": False,
+            "error": "Bot listener not initialized. Please wait a moment and try again."
+        }), 503
+    
+    max_age = request.args.get('max_age')
+    if max_age is not None:
+        try:
+            max_age = float(max_age)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "max_age must be a number of seconds"
+            }), 400
+    
+    refreshed = False
+    age = bot_listener.account_snapshot.age_seconds()
+    if max_age is not None and (age is None or age > max_age):
+        command = request.args.get('command') or config.ACCOUNT_STATUS_COMMAND
+        if not command:
+            print("  [Account] Snapshot is stale but ACCOUNT_STATUS_COMMAND is not set, serving cached status")
+        elif not bot_listener.bot_entity or not listener_loop or not listener_loop.is_running():
+            return jsonify({
+                "success": False,
+                "error": "Listener loop not running"
+            }), 503
+        else:
+            future = asyncio.run_coroutine_threadsafe(
+                bot_listener.refresh_account_status(command), listener_loop
+            )
+            try:
+                refreshed = future.result(timeout=15) is not None
+            except Exception as e:
+                print(f"  [Account] Refresh failed: {e}")
+            age = bot_listener.account_snapshot.age_seconds()
+    
+    snapshot = bot_listener.account_snapshot.snapshot()
+    if snapshot is None:
+        return jsonify({
+            "success": False,
+            "error": "No account status received from the bot yet"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "account_status": snapshot["account_status"],
+        "updatedAt": snapshot["updatedAt"],
+        "ageSeconds": age,
+        "stale": max_age is not None and age > max_age,
+        "refreshed": refreshed
+    })
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Return topup totals per day and per UID, read from the roll-ups only.
+    
+    GET: /api/stats  - today
+    GET: /api/stats?days=7  - the last 7 days including today
+    GET: /api/stats?from=2026-10-01&to=2026-10-07
+    GET: /api/stats?days=7&uid=5801424265  - one UID
+    GET: /api/stats?days=7&top=20  - list the 20 UIDs with the highest total (default 10)
+    """
+    if not bot_listener:
+        return jsonify({
+            "success": False,
+            "error": "Bot listener not initialized. Please wait a moment and try again."
+        }), 503
+    
+    try:
+        if request.args.get('from'):
+            first_day = date.fromisoformat(request.args['from'])
+            last_day = date.fromisoformat(request.args.get('to') or date.today().isoformat())
+        else:
+            days = int(request.args.get('days', '1'))
+            if days < 1:
+                raise ValueError("days must be at least 1")
+            last_day = date.today()
+            first_day = last_day - timedelta(days=days - 1)
+        top = int(request.args.get('top', '10'))
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": f"Invalid parameters: {e} (use days=N or from=YYYY-MM-DD&to=YYYY-MM-DD, top=N)"
+        }), 400
+    if first_day > last_day or (last_day - first_day).days >= config.STATS_MAX_DAYS:
+        return jsonify({
+            "success": False,
+            "error": f"Date range must be 1 to {config.STATS_MAX_DAYS} days, from <= to"
+        }), 400
+    
+    if not bot_listener.store_available():
+        return jsonify({
+            "success": False,
+            "error": "Storage not available"
+        }), 503
+    
+    uid = request.args.get('uid')
+    first_day, last_day = first_day.isoformat(), last_day.isoformat()
+    try:
+        if uid:
+            day_docs = bot_listener.store_lookup(bot_listener.store.find_rollups, rollups.ROLLUP_UID,
+                                                 first_day, last_day, uid=uid)
+            uid_docs = day_docs
+        else:
+            day_docs = bot_listener.store_lookup(bot_listener.store.find_rollups, rollups.ROLLUP_DAILY, first_day, last_day)
+            uid_docs = bot_listener.store_lookup(bot_listener.store.find_rollups, rollups.ROLLUP_UID, first_day, last_day)
+    except Exception as e:
+        print(f"  [Stats] Roll-up lookup failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": f"Roll-up lookup failed: {e}"
+        }), 503
+    
+    docs_by_day = {doc["day"]: doc for doc in day_docs}
+    per_day = [dict(rollups.summarize([docs_by_day[day]] if day in docs_by_day else []), day=day)
+               for day in rollups.day_range(first_day, last_day)]
+    
+    docs_by_uid = {}
+    for doc in uid_docs:
+        docs_by_uid.setdefault(doc["uid"], []).append(doc)
+    per_uid = sorted(
+        (dict(rollups.summarize(docs), uid=doc_uid) for doc_uid, docs in docs_by_uid.items()),
+        key=lambda row: row["total"],
+        reverse=True
+    )
+    
+    return jsonify({
+        "success": True,
+        "from": first_day,
+        "to": last_day,
+        "uid": uid,
+        "totals": rollups.summarize(day_docs),
+        "days": per_day,
+        "uids": per_uid[:max(0, top)] if not uid else per_uid,
+        "uidCount": len(per_uid)
+    })
+
+
+@app.route('/api/orders/<order_id>', methods=['GET'])
+def get_order(order_id):
+    """Return the topup result of an order, from recent orders or an indexed storage lookup.
+    
+    GET: /api/orders/2237  (a leading # is accepted: /api/orders/%232237)
+    """
+    try:
+        order_id = int(str(order_id).lstrip('#'))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "orderId must be a number"
+        }), 400
+    
+    if not bot_listener:
+        return jsonify({
+            "success": False,
+            "error": "Bot listener not initialized. Please wait a moment and try again."
+        }), 503
+    
+    start = time.perf_counter()
+    try:
+        order, source = bot_listener.find_order(order_id)
+    except Exception as e:
+        print(f"  [Orders] Lookup of order #{order_id} failed: {e}")
+        return jsonify({
+            "success": False,
+            "orderId": order_id,
+            "error": f"Order lookup failed: {e}",
+            "lookupMs": round((time.perf_counter() - start) * 1000, 3)
+        }), 503
+    lookup_ms = round((time.perf_counter() - start) * 1000, 3)
+    
+    if order is None:
+        return jsonify({
+            "success": False,
+            "orderId": order_id,
+            "error": f"Order #{order_id} not found",
+            "storageChecked": bot_listener.store_available(),
+            "lookupMs": lookup_ms
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "orderId": order_id,
+        "topupResult": order["topupResult"],
+        "messageId": order["messageId"],
+        "date": order["date"],
+        "retry": order.get("retry"),
+        "source": source,
+        "lookupMs": lookup_ms
+    })
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint with diagnostic information."""
@@ -936,7 +1375,13 @@ def status_check():
         "bot_info": {
             "bot_entity": str(bot_listener.bot_entity) if bot_listener and bot_listener.bot_entity else None,
             "bot_username": config.BOT_USERNAME
-        }
+        },
+        "parse_cache": bot_listener.parse_cache.stats() if bot_listener else None,
+        "persistence_queue": bot_listener.persistence_queue.stats() if bot_listener else None,
+        "spool": bot_listener.spool.stats() if bot_listener and bot_listener.spool is not None else None,
+        "storage": bot_listener.store.stats() if bot_listener and bot_listener.store is not None else None,
+        "mongo_breaker": bot_listener.mongo_breaker.stats() if bot_listener else None,
+        "recent_orders": bot_listener.recent_orders.stats() if bot_listener else None
     }
     
     return jsonify(response)
@@ -1000,6 +1445,11 @@ if __name__ == '__main__':
     print("Endpoints:")
     print("  GET/POST /api/send?command=Krate")
     print("  GET/POST /api/send-message-raw?prefix=ktp&uid=123&diamonds=100")
+    print("  POST /api/retry-failed {\"prefix\": \"ktp\", \"orderId\": 2237}")
+    print("  GET /api/prices")
+    print("  GET /api/account?max_age=60")
+    print("  GET /api/stats?days=7&uid=123")
+    print("  GET /api/orders/2237")
     print("  GET /health")
     print("="*80 + "\n")
     
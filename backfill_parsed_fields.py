@@ -0,0 +1,196 @@
+"""
+Backfill parsed fields (topupResult, account_status, price_list) on existing
+MongoDB documents using the listener's parsers.
+
+Streams the collection in _id order, parses each batch in a process pool,
+writes with unordered bulk_write and checkpoints the last _id after every
+batch, so an interrupted run resumes where it stopped. A backfilled document
+is stored the way the listener stores a parsed message: text is cleared and
+expires_at removed, so the chatter TTL does not delete it.
+
+Price lists cannot be recovered: stored text was cleaned by a normalizer that
+stripped the ☞/➪ row markers the price list parser needs, so old price list
+messages stay unparsed.
+
+Usage: python backfill_parsed_fields.py [--kinds topup,account_status,price_list]
+                                        [--batch-size 1000] [--workers N] [--restart]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+import config
+import message_parser
+
+
+# Stored document field for each message kind
+KIND_FIELDS = {
+    message_parser.MESSAGE_KIND_TOPUP: "topupResult",
+    message_parser.MESSAGE_KIND_ACCOUNT_STATUS: "account_status",
+    message_parser.MESSAGE_KIND_PRICE_LIST: "price_list",
+}
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(config.SESSION_DIR, "backfill_checkpoint.json")
+
+
+def parse_document_text(item):
+    """Parse one (_id, text) pair in a worker process.
+
+    Returns:
+        (_id, kind, parsed) or (_id, None, None) if nothing was recognised
+    """
+    doc_id, text = item
+    parsed_message = message_parser.parse_message(None, text)
+    if parsed_message.topup_result:
+        return doc_id, message_parser.MESSAGE_KIND_TOPUP, parsed_message.topup_result
+    if parsed_message.account_status:
+        return doc_id, message_parser.MESSAGE_KIND_ACCOUNT_STATUS, parsed_message.account_status
+    if parsed_message.price_list:
+        return doc_id, message_parser.MESSAGE_KIND_PRICE_LIST, parsed_message.price_list
+    return doc_id, None, None
+
+
+def load_checkpoint(path):
+    """Return the saved checkpoint dict, or an empty one."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Could not read checkpoint {path}: {e} - starting from the beginning")
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    """Atomically write the checkpoint dict."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def iter_batches(collection, last_id, batch_size):
+    """Yield lists of (_id, text) for documents with text, in _id order after last_id."""
+    while True:
+        query = {"text": {"$type": "string", "$ne": ""}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = [
+            (doc["_id"], doc["text"])
+            for doc in collection.find(query, {"text": 1}).sort("_id", 1).limit(batch_size)
+        ]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def run_backfill(collection, kinds=None, batch_size=1000, workers=None,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH, restart=False):
+    """Backfill parsed fields on every document that still has raw text.
+
+    Args:
+        collection: pymongo collection
+        kinds: Message kinds to write (message_parser.MESSAGE_KIND_*), all if None
+        batch_size: Documents per read/parse/write batch
+        workers: Parser processes (os.cpu_count() if None)
+        checkpoint_path: JSON file holding the last processed _id
+        restart: Ignore an existing checkpoint
+
+    Returns:
+        dict with scanned/parsed/updated counters
+    """
+    kinds = set(kinds or KIND_FIELDS)
+    checkpoint = {} if restart else load_checkpoint(checkpoint_path)
+    last_id = ObjectId(checkpoint["last_id"]) if checkpoint.get("last_id") else None
+    stats = checkpoint.get("stats") or {"scanned": 0, "parsed": 0, "updated": 0}
+
+    if last_id is not None:
+        print(f"Resuming after _id {last_id} ({stats['scanned']} documents already scanned)")
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in iter_batches(collection, last_id, batch_size):
+            chunksize = max(1, len(batch) // ((workers or os.cpu_count() or 1) * 4))
+            operations = []
+            for doc_id, kind, parsed in pool.map(parse_document_text, batch, chunksize=chunksize):
+                if kind in kinds:
+                    operations.append(UpdateOne({"_id": doc_id}, {
+                        "$set": {KIND_FIELDS[kind]: parsed, "text": None},
+                        "$unset": {"expires_at": ""}
+                    }))
+
+            if operations:
+                result = collection.bulk_write(operations, ordered=False)
+                stats["updated"] += result.modified_count
+            stats["scanned"] += len(batch)
+            stats["parsed"] += len(operations)
+
+            last_id = batch[-1][0]
+            save_checkpoint(checkpoint_path, {"last_id": str(last_id), "stats": stats})
+
+            elapsed = time.time() - start_time
+            print(f"  scanned {stats['scanned']} | parsed {stats['parsed']} | updated {stats['updated']}"
+                  f" | last _id {last_id} | {elapsed:.1f}s")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill parsed fields on existing bot messages")
+    parser.add_argument("--kinds", default=",".join(KIND_FIELDS),
+                        help="Comma separated kinds: " + ", ".join(KIND_FIELDS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in KIND_FIELDS]
+    if unknown:
+        print(f"ERROR: Unknown kinds: {', '.join(unknown)}")
+        sys.exit(1)
+
+    if not config.MONGODB_URI:
+        print("ERROR: MONGODB_URI environment variable is required.")
+        sys.exit(1)
+
+    print("Connecting to MongoDB using URI...")
+    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+    try:
+        client.server_info()
+        collection = client[config.MONGODB_DATABASE][config.MONGODB_COLLECTION]
+        print(f"Connected to MongoDB: {config.MONGODB_DATABASE}.{config.MONGODB_COLLECTION}")
+
+        stats = run_backfill(
+            collection,
+            kinds=kinds,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            restart=args.restart
+        )
+
+        print(f"\n{'='*60}")
+        print(f"Summary:")
+        print(f"  Documents scanned: {stats['scanned']}")
+        print(f"  Successfully parsed: {stats['parsed']}")
+        print(f"  Updated: {stats['updated']}")
+        print(f"{'='*60}\n")
+    except KeyboardInterrupt:
+        print(f"\nInterrupted - run again to resume from {args.checkpoint}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline benchmark suite for the bot message parsers.
+Usage: python benchmark_parsers.py [messages] [seed]
+
+Runs entirely offline on a synthetic UcBot corpus (bot_message_corpus.py) and
+reports per-message latency percentiles, throughput and allocations for each
+parser and for the full message_handler path, plus a UC card scaling check.
+Default: 2000 messages, seed 0.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import bot_message_corpus
+import message_parser
+
+
+CARD_COUNTS = [10, 100, 500, 1000, 2000, 5000]
+
+
+def legacy_extract_uc_cards(text):
+    """Card extraction as it was before the single-pass rewrite, kept for comparison.
+
+    Two regex searches per line and list-membership dedup (quadratic in cards).
+    """
+    uc_cards = []
+    uc_card_pattern = r'((?:BDMB|UPBD|[A-Z]{4})[-\w]+\s+[\d-]+)'
+    for line in text.split('\n'):
+        line = line.strip()
+        if re.search(r'(BDMB|UPBD|[A-Z]{4})[-\w]+\s+[\d-]+', line, re.IGNORECASE):
+            card_match = re.search(uc_card_pattern, line, re.IGNORECASE)
+            if card_match:
+                card_str = re.sub(r'\s+', ' ', card_match.group(1).strip())
+                if card_str not in uc_cards:
+                    uc_cards.append(card_str)
+    if not uc_cards:
+        for match in re.findall(uc_card_pattern, text, re.IGNORECASE):
+            card_str = re.sub(r'\s+', ' ', match.strip())
+            if card_str not in uc_cards:
+                uc_cards.append(card_str)
+    return uc_cards
+
+
+def time_call(func, arg, min_seconds=0.2):
+    """Return the average seconds per call of func(arg)."""
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or runs < 3:
+        func(arg)
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / runs
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure_latencies(func, inputs):
+    """Call func once per input and return the per-call latencies in seconds."""
+    latencies = []
+    perf_counter = time.perf_counter
+    for item in inputs:
+        start = perf_counter()
+        func(item)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def measure_allocations(func, inputs):
+    """Return the mean peak of memory allocated during one call of func, in bytes."""
+    if not inputs:
+        return 0
+    tracemalloc.start()
+    try:
+        total_peak = 0
+        for item in inputs:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            func(item)
+            _, peak = tracemalloc.get_traced_memory()
+            total_peak += max(0, peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return total_peak / len(inputs)
+
+
+def print_header(title):
+    print("=" * 100)
+    print(title)
+    print("=" * 100)
+    print(f"{'stage':<28} {'msgs':>6} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'max us':>10} {'msgs/s':>10} {'peak KiB':>9}")
+
+
+def print_row(name, latencies, peak_bytes):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    throughput = len(latencies) / total if total else 0.0
+    print(
+        f"{name:<28} {len(latencies):>6} {percentile(latencies, 0.50) * 1e6:>9.1f}"
+        f" {percentile(latencies, 0.90) * 1e6:>9.1f} {percentile(latencies, 0.99) * 1e6:>9.1f}"
+        f" {latencies[-1] * 1e6 if latencies else 0.0:>10.1f} {throughput:>10.0f}"
+        f" {peak_bytes / 1024:>9.1f}"
+    )
+
+
+def benchmark_stage(name, func, inputs):
+    """Benchmark one stage: warm up, time every input, then measure allocations."""
+    for item in inputs[:50]:
+        func(item)
+    latencies = measure_latencies(func, inputs)
+    peak_bytes = measure_allocations(func, inputs[:200])
+    print_row(name, latencies, peak_bytes)
+
+
+def benchmark_parsers(corpus):
+    """Benchmark every parser stage on the messages it would see in production."""
+    texts = [text for _, text in corpus]
+    normalized = [message_parser.normalize_text(text) for text in texts]
+    by_kind = {}
+    for text in normalized:
+        by_kind.setdefault(message_parser.classify_message(text), []).append(text)
+
+    kind_counts = ", ".join(f"{kind}={count}" for kind, count in sorted(Counter(kind for kind, _ in corpus).items()))
+    print(f"Corpus: {len(corpus)} messages ({kind_counts})")
+    print_header("PARSER STAGES")
+    benchmark_stage("normalize_text", message_parser.normalize_text, texts)
+    benchmark_stage("classify_message", message_parser.classify_message, normalized)
+    benchmark_stage("parse_topup_result", message_parser.parse_topup_result,
+                    by_kind.get(message_parser.MESSAGE_KIND_TOPUP, []))
+    benchmark_stage("parse_account_status", message_parser.parse_account_status,
+                    by_kind.get(message_parser.MESSAGE_KIND_ACCOUNT_STATUS, []))
+    benchmark_stage("parse_price_list", message_parser.parse_price_list,
+                    by_kind.get(message_parser.MESSAGE_KIND_PRICE_LIST, []))
+    benchmark_stage("parse_message (all)", lambda text: message_parser.parse_message(0, text), texts)
+
+    # Repeated broadcasts: every text already in the cache
+    cache = message_parser.ParseCache(maxsize=len(texts))
+    for text in texts:
+        cache.parse(0, text)
+    benchmark_stage("ParseCache.parse (hits)", lambda text: cache.parse(0, text), texts)
+
+
+def build_fake_event(message_id, text):
+    """Build a stand-in for a Telethon NewMessage event carrying a text message."""
+    message = SimpleNamespace(
+        id=message_id,
+        date=datetime.now(timezone.utc),
+        sender_id=1,
+        chat_id=1,
+        text=text,
+        photo=None,
+        video=None,
+        audio=None,
+        document=None,
+        sticker=None,
+        voice=None,
+    )
+    return SimpleNamespace(message=message)
+
+
+def benchmark_message_handler(corpus):
+    """Benchmark TelegramBotListener.message_handler without MongoDB or Telegram.
+
+    The session file goes to a temporary directory and nothing connects; console
+    output is captured so printing is part of the measured path.
+    """
+    os.environ.setdefault("SESSION_DIR", tempfile.mkdtemp(prefix="tg-bench-"))
+    try:
+        from telegram_listener import TelegramBotListener
+    except ImportError as e:
+        print(f"\n[Skip] message_handler benchmark needs the listener dependencies: {e}")
+        return
+
+    listener = TelegramBotListener()
+    events = [build_fake_event(index + 1, text) for index, (_, text) in enumerate(corpus)]
+
+    async def run_all():
+        latencies = []
+        perf_counter = time.perf_counter
+        for event in events:
+            start = perf_counter()
+            await listener.message_handler(event)
+            latencies.append(perf_counter() - start)
+        return latencies
+
+    loop = asyncio.new_event_loop()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = loop.run_until_complete(run_all())
+            peak_bytes = measure_allocations(
+                lambda event: loop.run_until_complete(listener.message_handler(event)), events[:200]
+            )
+    finally:
+        loop.close()
+
+    print_header("FULL PATH (MongoDB disabled)")
+    print_row("message_handler", latencies, peak_bytes)
+
+
+def benchmark_uc_cards():
+    """Compare card extraction time per card across order sizes."""
+    print("=" * 100)
+    print("UC CARD EXTRACTION (normalized TOPUP DONE text)")
+    print("=" * 100)
+    print(f"{'cards':>8} {'extract_uc_cards':>18} {'per card':>10} {'legacy':>12} {'per card':>10} {'speedup':>8}")
+
+    for card_count in CARD_COUNTS:
+        text = message_parser.normalize_text(bot_message_corpus.build_topup_message(card_count))
+        cards = message_parser.extract_uc_cards(text)
+        assert len(cards) == card_count, f"expected {card_count} cards, got {len(cards)}"
+        assert cards == legacy_extract_uc_cards(text), "extractors disagree"
+
+        current = time_call(message_parser.extract_uc_cards, text)
+        legacy = time_call(legacy_extract_uc_cards, text)
+        print(
+            f"{card_count:>8} {current * 1000:>15.3f} ms {current / card_count * 1e6:>7.2f} us"
+            f" {legacy * 1000:>9.3f} ms {legacy / card_count * 1e6:>7.2f} us {legacy / current:>7.1f}x"
+        )
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    corpus = bot_message_corpus.generate_corpus(message_count, seed=seed)
+    benchmark_parsers(corpus)
+    benchmark_message_handler(corpus)
+    print()
+    benchmark_uc_cards()
+
+
+if __name__ == "__main__":
+    main()
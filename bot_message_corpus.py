@@ -0,0 +1,176 @@
+"""
+Synthetic UcBot message corpus
+Generates realistic bot messages (TOPUP DONE, Limit Over, price lists,
+account status and noise) for offline benchmarks and parser comparisons.
+"""
+
+import random
+
+
+KIND_TOPUP_DONE = "topup_done"
+KIND_LIMIT_OVER = "limit_over"
+KIND_PRICE_LIST = "price_list"
+KIND_ACCOUNT_STATUS = "account_status"
+KIND_NOISE = "noise"
+
+# Share of each kind in a generated corpus
+DEFAULT_MIX = (
+    (KIND_TOPUP_DONE, 0.35),
+    (KIND_LIMIT_OVER, 0.10),
+    (KIND_PRICE_LIST, 0.15),
+    (KIND_ACCOUNT_STATUS, 0.15),
+    (KIND_NOISE, 0.25),
+)
+
+# Card counts per TOPUP DONE order: most orders are small, a few are huge
+CARD_COUNT_WEIGHTS = (
+    ((1, 4), 0.55),
+    ((5, 20), 0.25),
+    ((21, 200), 0.14),
+    ((201, 1000), 0.05),
+    ((1001, 2000), 0.01),
+)
+
+USER_NAMES = ["ツOɴʟʏ⸙ᴢ!xᴜ모", "Rᴀʜɪᴍ", "ⓀⒾⓃⒼ", "Sakib 🔥", "Mohammad Robayet", "ᴅᴀʀᴋ ʟᴏʀᴅ"]
+CARD_PREFIXES = ["BDMB-S-S", "BDMB-T-S", "UPBD-G-S", "UPBD-P-S"]
+NOISE_MESSAGES = [
+    "Processing your order, please wait... ⏳",
+    "❌ Invalid command. Send /help for the command list.",
+    "👋 Welcome back!",
+    "⚠️ Server is busy, try again in a minute.",
+    "Your request has been received ✅",
+    "🔄 Checking UID 2194747891 ...",
+    "Unknown product code. Available: 25, 50, 115, 240, 610, 1240, 2530",
+]
+
+
+def card_number(rng):
+    """Return a random 16 digit card number in 4-4-4-4 format."""
+    return "-".join(f"{rng.randint(0, 9999):04d}" for _ in range(4))
+
+
+def build_topup_message(card_count, rng=None, order_id=None, uid=None, failed_every=0):
+    """Build a TOPUP DONE message listing card_count unique UC cards.
+
+    Args:
+        card_count: Number of card lines
+        rng: random.Random instance (a fixed-seed one is used if None)
+        order_id: Order ID (random if None)
+        uid: Player UID (random if None)
+        failed_every: Mark every n-th card as failed (0 = all succeed)
+    """
+    rng = rng or random.Random(0)
+    order_id = order_id if order_id is not None else rng.randint(1000, 99999)
+    uid = uid if uid is not None else rng.randint(10**9, 10**10 - 1)
+    total = card_count * 733.5
+    lines = [
+        "✅ Monthly 💎 TOPUP DONE",
+        "┌──────────────────────────┐",
+        f"│ Order ID : #{order_id}",
+        f"│ User   : {rng.choice(USER_NAMES)}",
+        f"│ UID    : {uid}",
+        "└──────────────────────────┘",
+    ]
+    for index in range(card_count):
+        status = "❌ Failed" if failed_every and (index + 1) % failed_every == 0 else "✅ Success"
+        lines.append(f"{rng.choice(CARD_PREFIXES)}-{index:08d} {card_number(rng)}  {status}")
+    lines += [
+        "┌──────────────────────────┐",
+        f"│ Total  : {total:.1f}৳ ৳ (0.5৳ Fee/Unit)",
+        f"│ Monthly  : {card_count}x",
+        f"│ Baki   : {total:.2f}৳",
+        f"│ Due    : 0.00 + {total:.2f} = {total:.2f}৳",
+        "│ ",
+        f"│ Duration : {rng.uniform(0.5, 30):.2f}s",
+        "└── 🤖 Powered by UcBot ───┘",
+    ]
+    return "\n".join(lines)
+
+
+def build_limit_over_message(rng=None):
+    """Build a Limit Over (failed order) message."""
+    rng = rng or random.Random(0)
+    return "\n".join([
+        "🚫 LIMIT OVER",
+        "┌──────────────────────────┐",
+        f"│ Order ID : #{rng.randint(1000, 99999)}",
+        f"│ User   : {rng.choice(USER_NAMES)}",
+        f"│ UID    : {rng.randint(10**9, 10**10 - 1)}",
+        "└──────────────────────────┘",
+        "Your due limit is over. Please pay your due first.",
+    ])
+
+
+def build_price_list_message(rng=None):
+    """Build a price list message with UC prices and special packages."""
+    rng = rng or random.Random(0)
+    lines = ["💎 Pʀɪᴄᴇ Lɪsᴛ 💎", "▔▔▔▔▔▔▔▔▔▔▔▔▔▔"]
+    for amount in (20, 36, 80, 161, 324, 812, 1625):
+        price = int(amount * rng.uniform(0.9, 1.15))
+        lines.append(f"☞ {amount}   🆄🅲  ➪  {price}  Bᴀɴᴋ")
+    lines.append(f"☞ Weekly Lite  ➪ {rng.choice([38.0, 40.0, 42.0])} Bᴀɴᴋ")
+    for level in (6, 10, 15, 20, 25, 30):
+        lines.append(f"☞ Level Up-{level}   ➪ {level * 5.5:.1f} Bᴀɴᴋ")
+    for days in (3, 7, 30):
+        lines.append(f"☞ Evo {days} Day   ➪ {days * 22.0:.1f} Bᴀɴᴋ")
+    lines.append("▔▔▔▔▔▔▔▔▔▔▔▔▔▔")
+    return "\n".join(lines)
+
+
+def build_account_status_message(rng=None):
+    """Build an account status block (NAME/DUE/BALANCE/DUE LIMIT)."""
+    rng = rng or random.Random(0)
+    return "\n".join([
+        "▔▔▔▔▔▔▔▔▔▔▔▔▔▔",
+        "➪ Nᴀᴍᴇ : Mohammad Robayet",
+        f"➪ Dᴜᴇ : {rng.uniform(0, 5000):.1f} Tk",
+        f"➪ Bᴀʟᴀɴᴄᴇ : {rng.uniform(0, 2000):.1f} Tk",
+        f"➪ Dᴜᴇ Lɪᴍɪᴛ : {rng.choice([5000, 10000, 20000])} Tk",
+        "▔▔▔▔▔▔▔▔▔▔▔▔▔▔",
+    ])
+
+
+def build_noise_message(rng=None):
+    """Build a plain chatter message that no parser should accept."""
+    rng = rng or random.Random(0)
+    return rng.choice(NOISE_MESSAGES)
+
+
+def pick_weighted(rng, weighted):
+    """Pick a value from a sequence of (value, weight) pairs."""
+    values = [value for value, _ in weighted]
+    weights = [weight for _, weight in weighted]
+    return rng.choices(values, weights=weights)[0]
+
+
+def generate_message(kind, rng):
+    """Generate one message of the given kind."""
+    if kind == KIND_TOPUP_DONE:
+        low, high = pick_weighted(rng, CARD_COUNT_WEIGHTS)
+        return build_topup_message(rng.randint(low, high), rng)
+    if kind == KIND_LIMIT_OVER:
+        return build_limit_over_message(rng)
+    if kind == KIND_PRICE_LIST:
+        return build_price_list_message(rng)
+    if kind == KIND_ACCOUNT_STATUS:
+        return build_account_status_message(rng)
+    return build_noise_message(rng)
+
+
+def generate_corpus(count, seed=0, mix=DEFAULT_MIX):
+    """Generate a reproducible corpus of bot messages.
+
+    Args:
+        count: Number of messages
+        seed: Random seed
+        mix: Sequence of (kind, weight) pairs
+
+    Returns:
+        list of (kind, text) tuples
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        kind = pick_weighted(rng, mix)
+        corpus.append((kind, generate_message(kind, rng)))
+    return corpus
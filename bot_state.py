@@ -0,0 +1,198 @@
+"""
+In-memory bot state
+Latest values derived from bot messages, kept by the listener and read by the
+API server without going through the bot or MongoDB.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class PriceListStore:
+    """Current price list with a version number and a content hash.
+
+    The listener updates it from every parsed price list; the version only moves
+    when ucPriceList/specialPackages actually change. Readers on other threads
+    get an immutable snapshot (the current dict is replaced, never mutated).
+    """
+
+    def __init__(self):
+        self._current = None
+
+    @staticmethod
+    def compute_hash(price_list):
+        """Return a stable SHA-256 hex digest of the price list contents."""
+        content = {
+            "ucPriceList": price_list.get("ucPriceList", []),
+            "specialPackages": price_list.get("specialPackages", [])
+        }
+        encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _set(self, price_list, version, content_hash, message_id, updated_at):
+        self._current = {
+            "version": version,
+            "hash": content_hash,
+            "etag": f"{version}-{content_hash[:16]}",
+            "messageId": message_id,
+            "updatedAt": updated_at,
+            "ucPriceList": price_list.get("ucPriceList", []),
+            "specialPackages": price_list.get("specialPackages", [])
+        }
+
+    def update(self, price_list, message_id=None):
+        """Record a parsed price list.
+
+        Args:
+            price_list: Parsed price list ({"ucPriceList": [...], "specialPackages": [...]})
+            message_id: Message the price list came from
+
+        Returns:
+            True if the contents changed and a new version was created, False otherwise
+        """
+        content_hash = self.compute_hash(price_list)
+        current = self._current
+        if current is not None and current["hash"] == content_hash:
+            return False
+
+        version = current["version"] + 1 if current is not None else 1
+        self._set(price_list, version, content_hash, message_id, datetime.now().isoformat())
+        return True
+
+    def load(self, price_list, version=None, message_id=None, updated_at=None):
+        """Restore the latest persisted version (e.g. at startup)."""
+        self._set(price_list, version or 1, self.compute_hash(price_list), message_id, updated_at)
+
+    @property
+    def version(self):
+        return self._current["version"] if self._current is not None else 0
+
+    def snapshot(self):
+        """Return the current version as a dict, or None if no price list is known."""
+        return self._current
+
+
+class AccountSnapshot:
+    """Latest account status (name, due, balance, due limit) with its timestamp.
+
+    Updated by the listener from every parsed account status message and read
+    by /api/account, so callers don't have to ask the bot and poll for a reply.
+    """
+
+    def __init__(self):
+        self._current = None
+
+    def update(self, account_status, message_id=None, updated_at=None):
+        """Record a parsed account status.
+
+        Args:
+            account_status: Parsed account status dict
+            message_id: Message the status came from
+            updated_at: datetime the status was received (now if None)
+        """
+        updated_at = updated_at or datetime.now()
+        self._current = {
+            "account_status": account_status,
+            "messageId": message_id,
+            "updatedAt": updated_at.isoformat(),
+            "timestamp": updated_at.timestamp()
+        }
+
+    def age_seconds(self):
+        """Return seconds since the last update, or None if no status is known."""
+        current = self._current
+        if current is None:
+            return None
+        return max(0.0, datetime.now().timestamp() - current["timestamp"])
+
+    def snapshot(self):
+        """Return the latest status as a dict, or None if no status is known."""
+        return self._current
+
+
+class RecentOrders:
+    """LRU of recent topup results keyed by Order ID.
+
+    The listener adds every parsed topup result (and results the API had to
+    load from storage); /api/orders and /api/retry-failed read hot orders from
+    here without a database round trip. Safe to use from several threads.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, topup_result, message_id=None, date=None, retry=None):
+        """Record the latest topup result of its order (ignored without an Order ID).
+
+        A retry already recorded for the order is kept.
+        """
+        order_id = topup_result.get("orderId")
+        if order_id is None or self.maxsize <= 0:
+            return
+        entry = {"topupResult": topup_result, "messageId": message_id, "date": date, "retry": retry}
+        with self._lock:
+            previous = self._entries.get(order_id)
+            if previous is not None and previous.get("retry") is not None:
+                entry["retry"] = previous["retry"]
+            self._entries[order_id] = entry
+            self._entries.move_to_end(order_id)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, order_id):
+        """Return {"topupResult", "messageId", "date", "retry"} of order_id, or None."""
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(order_id)
+            self.hits += 1
+            return entry
+
+    def claim_retry(self, order_id, retry):
+        """Record a retry of the order's failed cards unless one is already recorded.
+
+        Returns:
+            (claimed, retry record of the order); (False, None) if the order is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None:
+                return False, None
+            if entry.get("retry") is not None:
+                return False, entry["retry"]
+            entry["retry"] = retry
+            return True, retry
+
+    def set_retry(self, order_id, retry):
+        """Replace the retry record of a cached order (the one stored with it wins)."""
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is not None:
+                entry["retry"] = retry
+
+    def release_retry(self, order_id, retry_id):
+        """Drop the retry record of an order if it is still the claim retry_id (nothing was sent)."""
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is not None and (entry.get("retry") or {}).get("retryId") == retry_id:
+                entry["retry"] = None
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxSize": self.maxsize
+        }
@@ -0,0 +1,250 @@
+"""
+Differential harness for bot message parsers.
+Usage: python compare_parsers.py BASELINE CANDIDATE [--generate N] [--seed S]
+                                 [--file corpus.jsonl] [--mongo] [--limit N] [--export corpus.jsonl]
+
+Runs two parser implementations over the same corpus, diffs their structured
+output (topupResult / account_status / price_list) field by field and reports
+timings and speedups per message kind.
+
+An implementation is "module[:function]" or "path/to/file.py[:function]"; the
+function defaults to parse_message and is called as function(message_id, text).
+It may return a message_parser.ParsedMessage or a dict with topupResult /
+account_status / price_list keys. To compare against an older revision:
+
+    git show HEAD~1:message_parser.py > /tmp/old_parser.py
+    python compare_parsers.py /tmp/old_parser.py message_parser --generate 5000
+
+The corpus is generated (default, bot_message_corpus.py), read from a JSON
+lines file ({"text": ...} per line) or exported from MongoDB (documents that
+still have text; --export saves it for repeat runs).
+
+MongoDB is a poor corpus: documents with a topupResult, account_status or
+price_list are stored with text None, and the remaining text was cleaned by
+the normalizer of the time (emojis and, in older versions, the ☞/➪ row markers
+removed). A --mongo corpus is therefore unparsed chatter only and does not
+exercise the topup, account status or price list parsers; use --generate, or
+a --file of raw message texts, for those.
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+import bot_message_corpus
+
+
+OUTPUT_FIELDS = ("topupResult", "account_status", "price_list")
+MAX_EXAMPLES = 3
+
+
+def load_implementation(spec):
+    """Load a parser function from "module[:function]" or "file.py[:function]"."""
+    target, _, function_name = spec.partition(":")
+    function_name = function_name or "parse_message"
+
+    if target.endswith(".py") or os.sep in target:
+        module_name = "compare_" + os.path.splitext(os.path.basename(target))[0]
+        module_spec = importlib.util.spec_from_file_location(module_name, target)
+        if module_spec is None:
+            raise ImportError(f"Cannot load {target}")
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+
+    function = getattr(module, function_name, None)
+    if function is None:
+        raise ImportError(f"{target} has no function {function_name}")
+    return function
+
+
+def structured_output(result):
+    """Return {"kind", "topupResult", "account_status", "price_list"} from a parser result."""
+    if result is None:
+        return {"kind": None, **{field: None for field in OUTPUT_FIELDS}}
+    if isinstance(result, dict):
+        output = {field: result.get(field) for field in OUTPUT_FIELDS}
+        output["kind"] = result.get("kind")
+        return output
+    return {
+        "kind": getattr(result, "kind", None),
+        "topupResult": getattr(result, "topup_result", None),
+        "account_status": getattr(result, "account_status", None),
+        "price_list": getattr(result, "price_list", None)
+    }
+
+
+def diff_values(baseline, candidate, path, differences):
+    """Append (path, baseline value, candidate value) for every differing leaf."""
+    if isinstance(baseline, dict) and isinstance(candidate, dict):
+        for key in list(baseline) + [key for key in candidate if key not in baseline]:
+            diff_values(baseline.get(key), candidate.get(key), f"{path}.{key}", differences)
+    elif isinstance(baseline, list) and isinstance(candidate, list):
+        if len(baseline) != len(candidate):
+            differences.append((f"{path}.length", len(baseline), len(candidate)))
+        for index, (left, right) in enumerate(zip(baseline, candidate)):
+            diff_values(left, right, f"{path}[{index}]", differences)
+    elif baseline != candidate or type(baseline) is not type(candidate):
+        differences.append((path, baseline, candidate))
+
+
+def generalize_path(path):
+    """Collapse list indexes so differences are counted per field ("codes[]")."""
+    parts = []
+    for part in path.split("["):
+        parts.append(part.split("]", 1)[1] if "]" in part else part)
+    return "[]".join(parts)
+
+
+def run_implementation(function, texts):
+    """Parse every text once; return (outputs, per-message seconds)."""
+    outputs = []
+    timings = []
+    perf_counter = time.perf_counter
+    for index, text in enumerate(texts):
+        start = perf_counter()
+        result = function(index, text)
+        timings.append(perf_counter() - start)
+        outputs.append(structured_output(result))
+    return outputs, timings
+
+
+def load_corpus_file(path):
+    """Read texts from a JSON lines file."""
+    texts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                texts.append(json.loads(line)["text"])
+    return texts
+
+
+def load_corpus_mongodb(limit):
+    """Read stored texts from the bot_messages collection (chatter only, see the module docstring)."""
+    from pymongo import MongoClient
+    import config
+
+    if not config.MONGODB_URI:
+        print("ERROR: MONGODB_URI environment variable is required.")
+        sys.exit(1)
+
+    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+    try:
+        collection = client[config.MONGODB_DATABASE][config.MONGODB_COLLECTION]
+        parsed_count = collection.count_documents({"$or": [{field: {"$exists": True}} for field in OUTPUT_FIELDS]})
+        cursor = collection.find({"text": {"$type": "string", "$ne": ""}}, {"text": 1}).sort("_id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        texts = [doc["text"] for doc in cursor]
+        print(f"WARNING: the MongoDB corpus holds {len(texts)} stored chatter texts only. The {parsed_count}"
+              f" documents with {' / '.join(OUTPUT_FIELDS)} are stored without text, so the parsers of"
+              f" those messages are not compared; use --generate or a --file of raw texts for them.")
+        return texts
+    finally:
+        client.close()
+
+
+def export_corpus(path, texts):
+    with open(path, 'w', encoding='utf-8') as f:
+        for text in texts:
+            f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+    print(f"Exported {len(texts)} texts to {path}")
+
+
+def report(texts, baseline_outputs, baseline_timings, candidate_outputs, candidate_timings):
+    """Print differences and timings; return the number of differing messages."""
+    differing_messages = 0
+    field_counts = Counter()
+    examples = defaultdict(list)
+
+    for index, (baseline, candidate) in enumerate(zip(baseline_outputs, candidate_outputs)):
+        differences = []
+        diff_values(baseline, candidate, "", differences)
+        if not differences:
+            continue
+        differing_messages += 1
+        for path, left, right in differences:
+            field = generalize_path(path.lstrip("."))
+            field_counts[field] += 1
+            field_examples = examples[field]
+            if len(field_examples) < MAX_EXAMPLES and (not field_examples or field_examples[-1][0] != index):
+                field_examples.append((index, left, right))
+
+    print("=" * 100)
+    print(f"OUTPUT DIFF: {differing_messages} of {len(texts)} messages differ")
+    print("=" * 100)
+    for field, count in field_counts.most_common():
+        print(f"{field:<60} {count:>8}")
+        for index, left, right in examples[field]:
+            print(f"    message {index}: baseline={left!r:.80} candidate={right!r:.80}")
+
+    by_kind = defaultdict(lambda: [0, 0.0, 0.0])
+    for output, baseline_time, candidate_time in zip(baseline_outputs, baseline_timings, candidate_timings):
+        row = by_kind[output["kind"] or "none"]
+        row[0] += 1
+        row[1] += baseline_time
+        row[2] += candidate_time
+    by_kind["(all)"] = [len(texts), sum(baseline_timings), sum(candidate_timings)]
+
+    print()
+    print("=" * 100)
+    print("TIMINGS (grouped by the baseline's message kind)")
+    print("=" * 100)
+    print(f"{'kind':<18} {'msgs':>7} {'baseline ms':>12} {'candidate ms':>13} {'base us/msg':>12} {'cand us/msg':>12} {'speedup':>8}")
+    for kind, (count, baseline_time, candidate_time) in sorted(by_kind.items()):
+        speedup = baseline_time / candidate_time if candidate_time else float("inf")
+        print(
+            f"{kind:<18} {count:>7} {baseline_time * 1000:>12.2f} {candidate_time * 1000:>13.2f}"
+            f" {baseline_time / count * 1e6:>12.1f} {candidate_time / count * 1e6:>12.1f} {speedup:>7.2f}x"
+        )
+
+    return differing_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two bot message parser implementations")
+    parser.add_argument("baseline", help="module[:function] or file.py[:function]")
+    parser.add_argument("candidate", help="module[:function] or file.py[:function]")
+    parser.add_argument("--generate", type=int, default=2000, help="Generated corpus size (default)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--file", help="JSON lines corpus ({\"text\": ...} per line)")
+    parser.add_argument("--mongo", action="store_true", help="Export texts from MongoDB (stored chatter only)")
+    parser.add_argument("--limit", type=int, default=0, help="Max documents read from MongoDB")
+    parser.add_argument("--export", help="Write the corpus to a JSON lines file")
+    args = parser.parse_args()
+
+    if args.file:
+        texts = load_corpus_file(args.file)
+    elif args.mongo:
+        texts = load_corpus_mongodb(args.limit)
+    else:
+        texts = [text for _, text in bot_message_corpus.generate_corpus(args.generate, seed=args.seed)]
+
+    if args.export:
+        export_corpus(args.export, texts)
+
+    baseline = load_implementation(args.baseline)
+    candidate = load_implementation(args.candidate)
+
+    # Warm up both (regex compilation, caches) before timing
+    for text in texts[:50]:
+        baseline(0, text)
+        candidate(0, text)
+
+    baseline_outputs, baseline_timings = run_implementation(baseline, texts)
+    candidate_outputs, candidate_timings = run_implementation(candidate, texts)
+
+    print(f"Corpus: {len(texts)} messages | baseline: {args.baseline} | candidate: {args.candidate}\n")
+    differing_messages = report(texts, baseline_outputs, baseline_timings, candidate_outputs, candidate_timings)
+    sys.exit(1 if differing_messages else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -61,6 +61,58 @@ if MONGODB_PORT:
 
 MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "telegram_bot")
 MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "bot_messages")
+# Per-day and per-UID topup counters served by /api/stats
+MONGODB_ROLLUP_COLLECTION = os.getenv("MONGODB_ROLLUP_COLLECTION", "bot_message_rollups")
+# Messages already counted in each roll-up (one small document per roll-up and message)
+MONGODB_ROLLUP_MEMBER_COLLECTION = os.getenv("MONGODB_ROLLUP_MEMBER_COLLECTION", "bot_message_rollup_members")
+# Longest date range /api/stats accepts (one roll-up document per day, plus one per UID and day)
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "366"))
+
+# Message storage backend: mongo (the MongoDB settings above), sqlite (embedded file at
+# SQLITE_STORE_PATH, for offline deployments) or memory (lost on exit, for benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+SQLITE_STORE_PATH = os.getenv("SQLITE_STORE_PATH", os.path.join(SESSION_DIR, "messages.sqlite3"))
+
+# Days MongoDB keeps messages without a parsed topupResult, account_status or price_list
+# (0 keeps them forever). Applies to new messages only; stored messages get it only through
+# an explicit migrate_dates.py --ttl-days N --confirm-expiry run.
+CHATTER_TTL_DAYS = float(os.getenv("CHATTER_TTL_DAYS", "30"))
+
+# Number of recent topup results kept by Order ID for /api/orders (0 disables the cache)
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "1000"))
+
+# Number of distinct message texts kept in the parse cache (0 disables caching)
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "256"))
+
+# Seconds to wait for the next part of a topup result split across several
+# messages before the order is stored with the parts received so far
+TOPUP_ASSEMBLY_WINDOW = float(os.getenv("TOPUP_ASSEMBLY_WINDOW", "30"))
+
+# Write-behind persistence: queued MongoDB writes and what to do when the queue is full
+# (drop_oldest, drop_newest, or block - waits up to PERSIST_BLOCK_TIMEOUT seconds, stalling the listener)
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "1000"))
+PERSIST_OVERFLOW = os.getenv("PERSIST_OVERFLOW", "drop_oldest")
+PERSIST_BLOCK_TIMEOUT = float(os.getenv("PERSIST_BLOCK_TIMEOUT", "5"))
+# Queued writes are flushed together once PERSIST_BATCH_SIZE documents are waiting
+# or the oldest has waited PERSIST_LINGER_MS milliseconds
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))
+PERSIST_LINGER_MS = int(os.getenv("PERSIST_LINGER_MS", "50"))
+
+# On-disk spool for writes made while MongoDB is unreachable (on the sessions volume);
+# replayed in ordered batches once a reconnect, tried every SPOOL_RETRY_SECONDS, succeeds
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join(SESSION_DIR, "mongo_spool.sqlite3"))
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", "500"))
+SPOOL_RETRY_SECONDS = float(os.getenv("SPOOL_RETRY_SECONDS", "15"))
+
+# Circuit breaker around MongoDB: opens after MONGO_BREAKER_FAILURES failures in a row,
+# sending writes to the spool and skipping MongoDB lookups; the health thread pings
+# MongoDB again once MONGO_BREAKER_RESET_SECONDS have passed and closes it on success
+MONGO_BREAKER_FAILURES = int(os.getenv("MONGO_BREAKER_FAILURES", "3"))
+MONGO_BREAKER_RESET_SECONDS = float(os.getenv("MONGO_BREAKER_RESET_SECONDS", "30"))
+
+# Command that makes the bot reply with the account status block (NAME/DUE/BALANCE).
+# Used by /api/account to refresh a stale snapshot; empty disables refreshing.
+ACCOUNT_STATUS_COMMAND = os.getenv("ACCOUNT_STATUS_COMMAND", "")
 
 
 # Helper functions
@@ -0,0 +1,985 @@
+"""
+Bot Message Parser
+Classifies and parses UcBot messages (topup results, account status, price lists).
+Topup templates are described once as declarative field specs and compiled into
+a single combined pattern at import, so a message is scanned in one pass.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+
+
+# Box drawing characters the bot wraps header/footer fields in
+BOX_CHARS_PATTERN = re.compile(r'[└┘┌┐│─━┃┏┓┗┛├┤┬┴┼╭╮╯╰╱╲╳]+')
+
+# Message kinds recognised by classify_message(); at most one parser runs per message
+MESSAGE_KIND_TOPUP = "topup"
+MESSAGE_KIND_PRICE_LIST = "price_list"
+MESSAGE_KIND_ACCOUNT_STATUS = "account_status"
+
+# Cheap signatures checked once per message, in priority order. TOPUP_SIGNATURE
+# is matched on raw text by parse_topup_header() and on normalized text by
+# classify_message(), so it may only hold words that survive normalize_text()
+# (🚫 is stripped as an emoji).
+TOPUP_SIGNATURE = re.compile(r'TOPUP DONE|LIMIT OVER', re.IGNORECASE)
+PRICE_LIST_SIGNATURE = re.compile(r'☞[^\n]*➪')
+ACCOUNT_STATUS_SIGNATURE = re.compile(r'^[^:\n]*name[^:\n]*:', re.IGNORECASE | re.MULTILINE)
+
+
+class FieldSpec:
+    """A named field extracted from a bot message.
+
+    The pattern must contain exactly one capturing group holding the raw value;
+    use (?:...) for any other grouping. The converter turns the raw string into
+    the stored value and may return None (or raise ValueError) to skip the field.
+    """
+
+    __slots__ = ("name", "pattern", "convert")
+
+    def __init__(self, name, pattern, convert=str):
+        self.name = name
+        self.pattern = pattern
+        self.convert = convert
+
+
+class MessageSpec:
+    """A bot message template compiled from its field specs.
+
+    All field patterns are joined into one alternation with a named wrapper group
+    per field, so extract() walks the text once and keeps the first occurrence
+    of every field.
+    """
+
+    def __init__(self, name, fields, flags=re.IGNORECASE):
+        self.name = name
+        self.fields = tuple(fields)
+
+        alternatives = []
+        for field in self.fields:
+            if re.compile(field.pattern, flags).groups != 1:
+                raise ValueError(f"Field '{field.name}' of spec '{name}' must have exactly one capturing group")
+            alternatives.append(f"(?P<{field.name}>{field.pattern})")
+        self.pattern = re.compile("|".join(alternatives), flags)
+
+        # The value group directly follows the wrapper group of its field
+        self._converters = {
+            field.name: (self.pattern.groupindex[field.name] + 1, field.convert)
+            for field in self.fields
+        }
+
+    def extract(self, text):
+        """Extract all fields from text in a single scan.
+
+        Args:
+            text: Message text
+
+        Returns:
+            dict of field name -> converted value for every field found
+        """
+        values = {}
+        if not text:
+            return values
+
+        remaining = len(self._converters)
+        for match in self.pattern.finditer(text):
+            name = match.lastgroup
+            if name in values:
+                continue
+            value_group, convert = self._converters[name]
+            try:
+                value = convert(match.group(value_group))
+            except (ValueError, ZeroDivisionError):
+                continue
+            if value is None:
+                continue
+            values[name] = value
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        return values
+
+
+def clean_user_name(value):
+    """Strip surrounding whitespace and box drawing characters from a user name."""
+    user_name = BOX_CHARS_PATTERN.sub('', value.strip()).strip()
+    return user_name or None
+
+
+# Order header shared by TOPUP DONE and Limit Over messages
+# │ Order ID : #2237
+# │ User   : ツOɴʟʏ⸙ᴢ!xᴜ모
+# │ UID    : 2194747891
+# Fields are one per line: [^\S\n]* keeps a label from matching into the next
+# line (a user name that normalizes to nothing must not swallow "UID : ...").
+ORDER_HEADER_FIELDS = (
+    FieldSpec("orderId", r'Order[^\S\n]+ID[^\S\n]*:[^\S\n]*#?(\d+)', int),
+    FieldSpec("userName", r'User[^\S\n]*:[^\S\n]*(.+)', clean_user_name),
+    FieldSpec("uid", r'UID[^\S\n]*:[^\S\n]*(\d+)', str),
+)
+
+# Order footer of a TOPUP DONE message
+# │ Total  : 2934.0৳ ৳ (0.5৳ Fee/Unit)
+# │ Monthly  : 4x
+# │ Baki   : 2934.00৳
+# │ Due    : 0.00 + 2934.00 = 2934.00৳
+# │ Duration : 5.47s
+ORDER_FOOTER_FIELDS = (
+    FieldSpec("total", r'Total[^\S\n]*:[^\S\n]*([\d.]+)', float),
+    FieldSpec("feePerUnit", r'\(([\d.]+)[^\S\n]*[৳Tk]+[^\S\n]*Fee/Unit\)', float),
+    FieldSpec("quantity", r'Monthly[^\S\n]*:[^\S\n]*(\d+)x?', int),
+    FieldSpec("baki", r'Baki[^\S\n]*:[^\S\n]*([\d.]+)', float),
+    # previous_due + new_due = total_due - keep the total after "="
+    FieldSpec("due", r'Due[^\S\n]*:[^\S\n]*[\d.]+[^\S\n]*\+[^\S\n]*[\d.]+[^\S\n]*=[^\S\n]*([\d.]+)', float),
+    FieldSpec("durationSec", r'Duration[^\S\n]*:[^\S\n]*([\d.]+)[^\S\n]*s', float),
+)
+
+ORDER_HEADER_SPEC = MessageSpec("order_header", ORDER_HEADER_FIELDS)
+LIMIT_OVER_SPEC = ORDER_HEADER_SPEC
+TOPUP_DONE_SPEC = MessageSpec("topup_done", ORDER_HEADER_FIELDS + ORDER_FOOTER_FIELDS)
+
+# The footer closes an order. Only the end of the text is checked.
+ORDER_FOOTER_PATTERN = re.compile(r'Total\s*:[\s\S]*Duration\s*:\s*[\d.]+\s*s', re.IGNORECASE)
+FOOTER_TAIL_CHARS = 512
+
+# Telegram caps a message at 4096 characters and the bot splits a longer card
+# list there. A TOPUP DONE message without the footer is only the first part of
+# a split order if it is close to that cap or ends with a continuation marker
+# ("...", "…", "continued", "(1/2)"); otherwise the bot left the footer out and
+# the message is complete on its own.
+MESSAGE_LENGTH_LIMIT = 4096
+SPLIT_LENGTH_MARGIN = 400
+CONTINUATION_MARKER_PATTERN = re.compile(
+    r'(?:\.\.\.|…|\bcontinued\b|\(\s*\d+\s*/\s*\d+\s*\))[^\w\n]*\s*$', re.IGNORECASE
+)
+
+
+def has_order_footer(text):
+    """True if text ends with the Total ... Duration footer of a TOPUP DONE message."""
+    return ORDER_FOOTER_PATTERN.search(text[-FOOTER_TAIL_CHARS:]) is not None
+
+
+def is_split_part(text):
+    """True if a footerless TOPUP DONE text is a part of an order split at the message length cap."""
+    if has_order_footer(text):
+        return False
+    if len(text) >= MESSAGE_LENGTH_LIMIT - SPLIT_LENGTH_MARGIN:
+        return True
+    return CONTINUATION_MARKER_PATTERN.search(text[-FOOTER_TAIL_CHARS:]) is not None
+
+# UC card line: BDMB-S-S-02536618 5494-2393-2291-4243  ✅ Success
+# Supports BDMB, UPBD and any other 4-letter prefix. The code and the card number
+# are captured separately, so "code number" needs no whitespace normalization.
+UC_CARD_CODE = r'((?:BDMB|UPBD|[A-Z]{4})[-\w]+)'
+UC_CARD_NUMBER = r'([\d-]+)'
+# First card on each line, found for every line in one scan over the text; the
+# rest of the line holds the card status
+UC_CARD_LINE_PATTERN = re.compile(r'^.*?' + UC_CARD_CODE + r'[^\S\n]+' + UC_CARD_NUMBER + r'([^\n]*)',
+                                  re.IGNORECASE | re.MULTILINE)
+# Fallback when no line holds a whole card (code and number split across lines)
+UC_CARD_PATTERN = re.compile(UC_CARD_CODE + r'\s+' + UC_CARD_NUMBER, re.IGNORECASE)
+# A whole card line with its status, anchored at the start of the line. Used to
+# accept a message without a header as the next part of a split order, so
+# chatter such as "Order 2237" or "Checking UID 2194747891" is not appended.
+SPLIT_CARD_LINE_PATTERN = re.compile(
+    r'^[^\w\n]*(?:BDMB|UPBD|[A-Z]{4})-[-\w]+[^\S\n]+\d[\d-]*[^\S\n]+[^\w\n]*(?i:success|failed|fail)\b',
+    re.MULTILINE
+)
+
+# Per-card outcome after the card number ("✅ Success" / "❌ Failed")
+CARD_STATUS_SUCCESS = "success"
+CARD_STATUS_FAILED = "failed"
+CARD_STATUS_UNKNOWN = "unknown"
+CARD_STATUS_PATTERN = re.compile(r'\b(success|failed|fail)\b', re.IGNORECASE)
+
+
+def card_status(line_tail):
+    """Return the card status for the text following a card number."""
+    match = CARD_STATUS_PATTERN.search(line_tail)
+    if not match:
+        return CARD_STATUS_UNKNOWN
+    return CARD_STATUS_SUCCESS if match.group(1).lower() == "success" else CARD_STATUS_FAILED
+
+
+def extract_uc_card_statuses(text):
+    """Extract UC cards with their status from a TOPUP DONE message.
+
+    Single pass like extract_uc_cards(); a card listed twice keeps its first
+    position and status. Cards found only by the split-line fallback have
+    status "unknown".
+
+    Returns:
+        dict of "CODE NUMBER" -> "success" | "failed" | "unknown", in message order
+    """
+    uc_cards = {}
+    # Line tails repeat ("  Success"), so each distinct tail is classified once
+    tail_statuses = {}
+    for code, number, tail in UC_CARD_LINE_PATTERN.findall(text):
+        card_str = f"{code} {number}"
+        if card_str not in uc_cards:
+            status = tail_statuses.get(tail)
+            if status is None:
+                status = tail_statuses[tail] = card_status(tail)
+            uc_cards[card_str] = status
+
+    # Also try searching entire text if line-by-line didn't work
+    if not uc_cards:
+        uc_cards = dict.fromkeys(
+            (f"{code} {number}" for code, number in UC_CARD_PATTERN.findall(text)), CARD_STATUS_UNKNOWN
+        )
+
+    return uc_cards
+
+
+def extract_uc_cards(text):
+    """Extract UC card codes from a TOPUP DONE message, in order, without duplicates.
+
+    Runs in a single pass and deduplicates with an insertion-ordered dict, so it
+    stays linear for orders with thousands of cards.
+
+    Returns:
+        list of "CODE NUMBER" strings
+    """
+    return list(extract_uc_card_statuses(text))
+
+
+def summarize_card_statuses(card_statuses):
+    """Count cards per status and list the failed ones.
+
+    Args:
+        card_statuses: dict from extract_uc_card_statuses()
+
+    Returns:
+        {"total", "success", "failed", "unknown", "failedCodes": [...]}
+    """
+    summary = {
+        "total": len(card_statuses),
+        CARD_STATUS_SUCCESS: 0,
+        CARD_STATUS_FAILED: 0,
+        CARD_STATUS_UNKNOWN: 0,
+        "failedCodes": []
+    }
+    for card_str, status in card_statuses.items():
+        summary[status] += 1
+        if status == CARD_STATUS_FAILED:
+            summary["failedCodes"].append(card_str)
+    return summary
+
+
+def parse_topup_header(text):
+    """Parse only the status and order header of a TOPUP DONE or Limit Over message.
+
+    Works on raw (not normalized) text. The status comes from the first status
+    word and the header fields stop scanning once Order ID, User and UID are
+    found, so the cost does not grow with the number of card lines. Used to
+    resolve the waiting API request before the full parse.
+
+    Returns:
+        {"status": "success"|"failed", "orderId": int|None, "uid": str, "complete": bool}
+        or None if this is not a topup message or it has no UID. complete is False
+        for the first part of a split TOPUP DONE message (see is_split_part()).
+    """
+    if not text:
+        return None
+
+    status_match = TOPUP_SIGNATURE.search(text)
+    if not status_match:
+        return None
+    status = "success" if status_match.group(0).upper() == "TOPUP DONE" else "failed"
+
+    fields = ORDER_HEADER_SPEC.extract(text)
+    if not fields.get("uid"):
+        return None
+
+    return {
+        "status": status,
+        "orderId": fields.get("orderId"),
+        "uid": fields["uid"],
+        "complete": status == "failed" or not is_split_part(text)
+    }
+
+
+def parse_topup_result(text):
+    """Parse a TOPUP DONE or Limit Over message.
+
+    Expected format:
+    ✅ Monthly 💎 TOPUP DONE
+    ┌──────────────────────────┐
+    │ Order ID : #2237
+    │ User   : ツOɴʟʏ⸙ᴢ!xᴜ모
+    │ UID    : 2194747891
+    └──────────────────────────┘
+    BDMB-S-S-02536618 5494-2393-2291-4243  ✅ Success
+    BDMB-S-S-02539602 1251-3736-3127-9172  ✅ Success
+    ...
+    ┌──────────────────────────┐
+    │ Total  : 2934.0৳ ৳ (0.5৳ Fee/Unit)
+    │ Monthly  : 4x
+    │ Baki   : 2934.00৳
+    │ Due    : 0.00 + 2934.00 = 2934.00৳
+    │
+    │ Duration : 5.47s
+    └── 🤖 Powered by UcBot ───┘
+
+    Returns structured data or None if format doesn't match.
+    """
+    if not text:
+        return None
+
+    # Check if this is a TOPUP DONE message or Limit Over message
+    is_topup_done = "TOPUP DONE" in text.upper()
+    is_limit_over = "LIMIT OVER" in text.upper() or "🚫" in text
+
+    if not is_topup_done and not is_limit_over:
+        return None
+
+    if is_limit_over:
+        # For Limit Over, return minimal structure with failed status
+        fields = LIMIT_OVER_SPEC.extract(text)
+        return {
+            "status": "failed",
+            "orderId": fields.get("orderId"),
+            "user": {
+                "name": fields.get("userName"),
+                "uid": fields.get("uid")
+            }
+        }
+
+    fields = TOPUP_DONE_SPEC.extract(text)
+
+    topup_result = {
+        "status": "success",
+        "orderId": fields.get("orderId"),
+        "user": {
+            "name": fields.get("userName"),
+            "uid": fields.get("uid")
+        },
+        "product": {
+            "type": "diamond",
+            "quantity": fields.get("quantity"),
+            "unitPrice": None
+        },
+        "payment": {
+            "usedUc": [],
+            "feePerUnit": fields.get("feePerUnit"),
+            "total": fields.get("total"),
+            "paid": None,
+            # Baki is the remaining amount; the "Due : a + b = c" line takes precedence
+            "due": fields.get("due", fields.get("baki"))
+        },
+        "meta": {
+            "durationSec": fields.get("durationSec"),
+            "provider": "UcBot"
+        }
+    }
+
+    uc_cards = extract_uc_card_statuses(text)
+    if uc_cards:
+        # usedUc is an object containing an array of {"code": ..., "status": ...} objects
+        # and a per-order summary of failed cards
+        topup_result["payment"]["usedUc"] = {
+            "codes": [{"code": card_str, "status": status} for card_str, status in uc_cards.items()],
+            "summary": summarize_card_statuses(uc_cards)
+        }
+
+    # Calculate unitPrice from total and quantity
+    total = topup_result["payment"]["total"]
+    quantity = topup_result["product"]["quantity"]
+    if total and quantity:
+        topup_result["product"]["unitPrice"] = total / quantity
+
+    # Calculate paid amount: paid = total - due
+    if total is not None and topup_result["payment"]["due"] is not None:
+        topup_result["payment"]["paid"] = total - topup_result["payment"]["due"]
+
+    # Need at least orderId and user info to consider this a valid topup result
+    # (a name made only of emoji/CJK normalizes to nothing; the UID identifies the user)
+    if topup_result["orderId"] and (topup_result["user"]["name"] or topup_result["user"]["uid"]):
+        return topup_result
+
+    return None
+
+
+def build_char_class(ranges, keep):
+    """Build a regex character class from codepoint ranges, leaving out the keep characters."""
+    keep_codepoints = sorted(ord(char) for char in keep)
+    parts = []
+    for start, end in ranges:
+        for codepoint in keep_codepoints:
+            if start <= codepoint <= end:
+                if start < codepoint:
+                    parts.append((start, codepoint - 1))
+                start = codepoint + 1
+        if start <= end:
+            parts.append((start, end))
+    return "[" + "".join(f"{re.escape(chr(start))}-{re.escape(chr(end))}" for start, end in parts) + "]"
+
+
+def fold_small_capitals(match):
+    """Replace a run of small capital letters with their ASCII lowercase letters."""
+    return match.group().translate(SMALL_CAPITALS_TABLE)
+
+
+# Emoji codepoint ranges removed by normalize_text(), merged and deduplicated:
+# - U+24C2..U+1F64F: enclosed alphanumerics, misc symbols, dingbats, enclosed/CJK
+#   supplements, misc symbols & pictographs, emoticons
+# - U+1F680..U+1F6FF: transport & map symbols
+# - U+1F900..U+1FAFF: supplemental symbols, chess symbols, symbols extended-A
+EMOJI_RANGES = (
+    (0x24C2, 0x1F64F),
+    (0x1F680, 0x1F6FF),
+    (0x1F900, 0x1FAFF),
+)
+# 🆄🅲 is part of the UC price rows; ☞ and ➪ delimit price list and account rows
+KEEP_CHARS = "🆄🅲☞➪"
+EMOJI_PATTERN = re.compile(build_char_class(EMOJI_RANGES, KEEP_CHARS) + "+")
+
+# Small capital letters the bot uses for labels (Bᴀɴᴋ, Nᴀᴍᴇ, Oɴʟʏ) folded to ASCII
+SMALL_CAPITALS = "ᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘǫʀꜱᴛᴜᴠᴡʏᴢ"
+SMALL_CAPITALS_TABLE = str.maketrans(SMALL_CAPITALS, "abcdefghijklmnopqrstuvwyz")
+SMALL_CAPITALS_PATTERN = re.compile(f"[{SMALL_CAPITALS}]+")
+
+
+def normalize_text(text):
+    """Normalize bot message text before classification and parsing.
+
+    Folds small capital letters to ASCII and removes emojis except 🆄🅲 and the
+    ☞/➪ row markers. Both tables are precomputed at import. str.translate is not
+    used for the deletion because CPython takes a per-character slow path for
+    non-ASCII text, which made it several times slower than one character class.
+
+    Args:
+        text: Input text that may contain emojis
+
+    Returns:
+        Normalized text
+    """
+    if not text or text.isascii():
+        return text
+
+    # Fold first: ꜰ and ꜱ fall inside the emoji ranges
+    text = SMALL_CAPITALS_PATTERN.sub(fold_small_capitals, text)
+    return EMOJI_PATTERN.sub('', text)
+
+
+def remove_emojis_except_uc(text):
+    """Remove all emojis from text except 🆄🅲 emoji.
+
+    Kept for existing callers; this is normalize_text(), so small capitals are
+    folded to ASCII and the ☞/➪ row markers are kept as well.
+    """
+    return normalize_text(text)
+
+
+def classify_message(text):
+    """Classify a bot message by cheap signatures so only one parser runs.
+
+    Returns:
+        MESSAGE_KIND_TOPUP, MESSAGE_KIND_PRICE_LIST, MESSAGE_KIND_ACCOUNT_STATUS,
+        or None for plain chatter that no parser would accept.
+    """
+    if not text:
+        return None
+
+    # "TOPUP DONE" / "LIMIT OVER" header
+    if TOPUP_SIGNATURE.search(text):
+        return MESSAGE_KIND_TOPUP
+
+    # ☞ ... ➪ price rows
+    if PRICE_LIST_SIGNATURE.search(text):
+        return MESSAGE_KIND_PRICE_LIST
+
+    # NAME/DUE/BALANCE block - the parser needs at least a "Name :" line
+    if ACCOUNT_STATUS_SIGNATURE.search(text):
+        return MESSAGE_KIND_ACCOUNT_STATUS
+
+    return None
+
+
+# Account status rows (labels are ASCII after normalize_text):
+# ➪ Name : Mohammad Robayet
+# ➪ Due : 69.0 Tk
+SEPARATOR_LINE_PATTERN = re.compile(r'^[▔═\-_]+$')
+NAME_VALUE_PATTERN = re.compile(r'([a-zA-Z\s]+)')
+NUMBER_PATTERN = re.compile(r'([\d.]+)')
+
+
+def parse_account_status(text):
+    """Parse account status from bot response.
+
+    Expects text from normalize_text(), where labels like Nᴀᴍᴇ have become ASCII.
+
+    Returns structured data or None if format doesn't match.
+    """
+    if not text:
+        return None
+
+    # Clean the text - remove separator lines
+    lines = text.split('\n')
+    cleaned_lines = []
+
+    for line in lines:
+        line = line.strip()
+        # Skip separator lines and empty lines
+        if not line or SEPARATOR_LINE_PATTERN.match(line):
+            continue
+        cleaned_lines.append(line)
+
+    account_status = {
+        "user": {"name": None},
+        "wallet": {},
+        "currency": "Tk"
+    }
+
+    # Check if this looks like an account status message
+    # It should have NAME/DUE/BALANCE/DUE LIMIT fields
+    has_account_fields = False
+    for line in cleaned_lines:
+        line_lower = line.lower()
+        if any(field in line_lower for field in ['name', 'due', 'balance', 'limit']):
+            has_account_fields = True
+            break
+
+    if not has_account_fields:
+        return None
+
+    # Process each line
+    for line in cleaned_lines:
+        # Check if line contains account information
+        # Handle both formats: "NAME : Mohammad Robayet" and "➪ Name : Mohammad Robayet"
+        if ':' not in line:
+            continue
+
+        # Split by colon
+        parts = line.split(':', 1)
+        if len(parts) < 2:
+            continue
+
+        field_name = parts[0].strip().lower()
+        field_value = parts[1].strip()
+
+        # Handle name field
+        if 'name' in field_name:
+            # Extract just the name (remove any trailing numbers/currency)
+            name_match = NAME_VALUE_PATTERN.search(field_value)
+            if name_match:
+                account_status["user"]["name"] = name_match.group(1).strip()
+
+        # Handle due field (not due limit)
+        elif 'due' in field_name and 'limit' not in field_name:
+            # Handle G9.0 -> 69.0 conversion (G might be typo for 6)
+            field_value = field_value.replace('G', '6').replace('g', '6')
+            value_match = NUMBER_PATTERN.search(field_value)
+            if value_match:
+                try:
+                    account_status["wallet"]["due"] = float(value_match.group(1))
+                except ValueError:
+                    pass
+
+        # Handle balance field
+        elif 'balance' in field_name:
+            value_match = NUMBER_PATTERN.search(field_value)
+            if value_match:
+                try:
+                    account_status["wallet"]["balance"] = float(value_match.group(1))
+                except ValueError:
+                    pass
+
+        # Handle due limit field
+        elif 'due' in field_name and 'limit' in field_name:
+            value_match = NUMBER_PATTERN.search(field_value)
+            if value_match:
+                try:
+                    account_status["wallet"]["dueLimit"] = float(value_match.group(1))
+                except ValueError:
+                    pass
+
+    # Check if we extracted a name
+    if account_status["user"]["name"]:
+        return account_status
+
+    return None
+
+
+# Price list rows (Bᴀɴᴋ is normalized to "Bank"):
+# ☞ 20   🆄🅲  ➪  19  Bank  - UC price, 🆄🅲 or plain UC
+# ☞ Weekly Lite  ➪ 40.0 Bank
+# ☞ Level Up-6   ➪ 35.0 Bank
+# ☞ Evo 3 Day   ➪ 66.0 Bank
+UC_PRICE_PATTERN = re.compile(r'☞\s*(\d+)\s*(?:🆄\s*🅲|🆄🅲|[UC]+)\s*➪\s*(\d+)\s*Bank', re.IGNORECASE)
+WEEKLY_PRICE_PATTERN = re.compile(r'☞\s*Weekly\s+Lite\s*➪\s*([\d.]+)\s*Bank', re.IGNORECASE)
+LEVEL_UP_PRICE_PATTERN = re.compile(r'☞\s*Level\s+Up-(\d+)\s*➪\s*([\d.]+)\s*Bank', re.IGNORECASE)
+EVO_PRICE_PATTERN = re.compile(r'☞\s*Evo\s+(\d+)\s+Day\s*➪\s*([\d.]+)\s*Bank', re.IGNORECASE)
+
+
+def parse_price_list(text):
+    """Parse price list from bot response.
+
+    Expected format:
+    ☞ 20   🆄🅲  ➪  19  Bᴀɴᴋ
+    ☞ Weekly Lite  ➪ 40.0 Bᴀɴᴋ
+    ☞ Level Up-6   ➪ 35.0 Bᴀɴᴋ
+    ☞ Evo 3 Day   ➪ 66.0 Bᴀɴᴋ
+
+    Expects text from normalize_text(), where Bᴀɴᴋ has become "Bank".
+
+    Returns structured data with ucPriceList and specialPackages arrays, or None if format doesn't match.
+    """
+    if not text:
+        return None
+
+    uc_price_list = []
+    special_packages = []
+
+    uc_matches = UC_PRICE_PATTERN.findall(text)
+
+    for match in uc_matches:
+        try:
+            amount = int(match[0])
+            price = int(match[1])
+            uc_price_list.append({
+                "type": "uc",
+                "amount": amount,
+                "price": price,
+                "payment": "bank"
+            })
+        except (ValueError, IndexError):
+            continue
+
+    weekly_match = WEEKLY_PRICE_PATTERN.search(text)
+    if weekly_match:
+        try:
+            price = float(weekly_match.group(1))
+            special_packages.append({
+                "type": "weekly",
+                "name": "Weekly Lite",
+                "price": price,
+                "payment": "bank"
+            })
+        except (ValueError, IndexError):
+            pass
+
+    level_up_matches = LEVEL_UP_PRICE_PATTERN.findall(text)
+    for match in level_up_matches:
+        try:
+            level = int(match[0])
+            price = float(match[1])
+            special_packages.append({
+                "type": "level-up",
+                "name": f"Level Up {level}",
+                "price": price,
+                "payment": "bank"
+            })
+        except (ValueError, IndexError):
+            continue
+
+    evo_matches = EVO_PRICE_PATTERN.findall(text)
+    for match in evo_matches:
+        try:
+            days = int(match[0])
+            price = float(match[1])
+            special_packages.append({
+                "type": "evo",
+                "name": f"Evo {days} Day",
+                "price": price,
+                "payment": "bank"
+            })
+        except (ValueError, IndexError):
+            continue
+
+    # Only return if we found at least one UC price or special package
+    if uc_price_list or special_packages:
+        return {
+            "ucPriceList": uc_price_list,
+            "specialPackages": special_packages
+        }
+
+    return None
+
+
+class ParsedMessage:
+    """A bot message normalized and parsed exactly once.
+
+    Built by parse_message() for every update and shared by console output,
+    pending-request matching, persistence and recent_responses so no stage
+    re-derives the text or re-runs a parser. Instances are immutable.
+    """
+
+    __slots__ = ("message_id", "text", "cleaned_text", "kind", "topup_result", "account_status", "price_list")
+
+    def __init__(self, message_id, text, cleaned_text, kind, topup_result=None, account_status=None, price_list=None):
+        set_slot = object.__setattr__
+        set_slot(self, "message_id", message_id)
+        set_slot(self, "text", text)
+        set_slot(self, "cleaned_text", cleaned_text)
+        set_slot(self, "kind", kind)
+        set_slot(self, "topup_result", topup_result)
+        set_slot(self, "account_status", account_status)
+        set_slot(self, "price_list", price_list)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParsedMessage is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ParsedMessage is immutable")
+
+    def __repr__(self):
+        return f"ParsedMessage(message_id={self.message_id!r}, kind={self.kind!r})"
+
+    def with_message_id(self, message_id):
+        """Return a copy of this parse for another message with identical text."""
+        return ParsedMessage(message_id, self.text, self.cleaned_text, self.kind,
+                             self.topup_result, self.account_status, self.price_list)
+
+    def with_topup_result(self, topup_result):
+        """Return a copy with topup_result replaced (e.g. by an assembled multi-part result)."""
+        return ParsedMessage(self.message_id, self.text, self.cleaned_text, MESSAGE_KIND_TOPUP,
+                             topup_result, self.account_status, self.price_list)
+
+    @property
+    def has_structured_data(self):
+        """True if any parser produced structured data for this message."""
+        return bool(self.topup_result or self.account_status or self.price_list)
+
+    @property
+    def uid(self):
+        """UID of a topup result as a string, or None."""
+        if self.topup_result and self.topup_result.get("user") and self.topup_result["user"].get("uid"):
+            return str(self.topup_result["user"]["uid"])
+        return None
+
+
+def parse_message(message_id, text):
+    """Normalize, classify and parse a bot message once.
+
+    Args:
+        message_id: Telegram message ID
+        text: Raw message text (may be empty)
+
+    Returns:
+        ParsedMessage
+    """
+    text = text or ""
+    cleaned_text = normalize_text(text)
+    kind = classify_message(cleaned_text)
+
+    topup_result = None
+    account_status = None
+    price_list = None
+    if kind == MESSAGE_KIND_TOPUP:
+        topup_result = parse_topup_result(cleaned_text)
+    elif kind == MESSAGE_KIND_PRICE_LIST:
+        price_list = parse_price_list(cleaned_text)
+    elif kind == MESSAGE_KIND_ACCOUNT_STATUS:
+        account_status = parse_account_status(cleaned_text)
+
+    return ParsedMessage(message_id, text, cleaned_text, kind, topup_result, account_status, price_list)
+
+
+class ParseCache:
+    """Bounded LRU cache of parse results keyed by a hash of the raw text.
+
+    The bot re-sends byte-identical price lists and account status blocks; a
+    repeat costs one digest and one dict lookup instead of a full parse. The
+    structured dicts are shared between hits and must not be mutated.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def parse(self, message_id, text):
+        """Return the ParsedMessage for text, parsing it only on a cache miss.
+
+        Args:
+            message_id: Telegram message ID
+            text: Raw message text (may be empty)
+        """
+        text = text or ""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached.with_message_id(message_id)
+
+        self.misses += 1
+        parsed_message = parse_message(message_id, text)
+        if self.maxsize > 0:
+            self._entries[key] = parsed_message
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return parsed_message
+
+    def clear(self):
+        """Drop all cached entries and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxSize": self.maxsize
+        }
+
+
+# TopupAssembler.feed() states
+ASSEMBLY_NONE = "none"            # not part of a split order, use the message's own parse
+ASSEMBLY_PARTIAL = "partial"      # buffered, the order is not complete yet
+ASSEMBLY_COMPLETE = "complete"    # footer arrived, the assembled result is returned
+ASSEMBLY_ASSEMBLED = "assembled"  # edit of a part of an order already assembled, nothing to do
+
+
+class TopupAssembler:
+    """Joins a TOPUP DONE message split across several Telegram messages.
+
+    The first part has the status line and order header but no footer and is
+    close to the message length cap (see is_split_part()); the following parts
+    carry more card lines and the last one the Total/Duration footer. Parts are
+    grouped by Order ID when a part repeats the header, otherwise they go to the
+    most recently extended open order, and only within window_seconds of its
+    previous part. When the footer arrives the parts are parsed together into
+    one topup result; an order whose footer never arrives is flushed by
+    expire() with the parts received so far.
+
+    Parts are keyed by message_id: an edit of a buffered part replaces it in
+    place, and an edit of a part of an order already assembled is ignored.
+    """
+
+    def __init__(self, window_seconds=30.0, max_open=64, max_assembled=1024):
+        self.window_seconds = window_seconds
+        self.max_open = max_open
+        self.max_assembled = max_assembled
+        self._open = OrderedDict()       # orderId -> {"parts": {message_id: {"text", "context"}}, "lastSeen"}
+        self._part_orders = {}           # message_id of a buffered part -> orderId
+        self._assembled = OrderedDict()  # message_id of a part of an assembled order -> orderId
+
+    def expire(self, now):
+        """Flush open orders whose last part is older than the window.
+
+        The parts received so far are parsed into a topup result with
+        meta.footerMissing set, so the order is still stored and answered.
+
+        Returns:
+            list of (orderId, topup_result or None, context of the last part)
+        """
+        expired = [order_id for order_id, assembly in self._open.items()
+                   if now - assembly["lastSeen"] > self.window_seconds]
+        flushed = []
+        for order_id in expired:
+            assembly = self._close(order_id)
+            assembled = self._assemble(assembly)
+            if assembled is not None:
+                assembled["meta"]["footerMissing"] = True
+            last_part = next(reversed(assembly["parts"].values()))
+            flushed.append((order_id, assembled, last_part["context"]))
+        return flushed
+
+    def feed(self, parsed_message, now, context=None):
+        """Offer a parsed message (new or edited) to the assembler.
+
+        Args:
+            parsed_message: ParsedMessage of the incoming message
+            now: Arrival time in seconds (time.time())
+            context: Caller data kept with a buffered part and returned by expire()
+
+        Returns:
+            (state, topup_result): ASSEMBLY_NONE, ASSEMBLY_PARTIAL or
+            ASSEMBLY_ASSEMBLED with None, or ASSEMBLY_COMPLETE with the
+            assembled topup result
+        """
+        message_id = parsed_message.message_id
+        text = parsed_message.cleaned_text
+        topup_result = parsed_message.topup_result
+
+        if message_id in self._assembled:
+            return ASSEMBLY_ASSEMBLED, None
+
+        # Edit of a buffered part: replace it, keep the parts received after it
+        order_id = self._part_orders.get(message_id)
+        if order_id is not None:
+            assembly = self._open[order_id]
+            assembly["parts"][message_id] = {"text": text, "context": context}
+            assembly["lastSeen"] = now
+            return self._complete_if_closed(order_id)
+
+        # First part: TOPUP DONE header, no footer, cut at the length cap
+        if topup_result and topup_result["status"] == "success":
+            if has_order_footer(text) or not is_split_part(parsed_message.text):
+                return ASSEMBLY_NONE, None
+            order_id = topup_result["orderId"]
+            if order_id in self._open:
+                self._close(order_id)
+            self._open[order_id] = {"parts": {message_id: {"text": text, "context": context}}, "lastSeen": now}
+            self._part_orders[message_id] = order_id
+            if len(self._open) > self.max_open:
+                self._close(next(iter(self._open)))
+            return ASSEMBLY_PARTIAL, None
+
+        if parsed_message.kind is not None or not self._open:
+            return ASSEMBLY_NONE, None
+
+        # Continuation: whole card lines and/or the footer, no status line
+        if not has_order_footer(text) and not SPLIT_CARD_LINE_PATTERN.search(text):
+            return ASSEMBLY_NONE, None
+
+        order_id = ORDER_HEADER_SPEC.extract(text).get("orderId")
+        if order_id not in self._open:
+            order_id = next(reversed(self._open))
+        assembly = self._open[order_id]
+        if now - assembly["lastSeen"] > self.window_seconds:
+            return ASSEMBLY_NONE, None
+
+        assembly["parts"][message_id] = {"text": text, "context": context}
+        assembly["lastSeen"] = now
+        self._part_orders[message_id] = order_id
+        self._open.move_to_end(order_id)
+        return self._complete_if_closed(order_id)
+
+    def _complete_if_closed(self, order_id):
+        """Assemble the order if its last part carries the footer."""
+        assembly = self._open[order_id]
+        last_part = next(reversed(assembly["parts"].values()))
+        if not has_order_footer(last_part["text"]):
+            return ASSEMBLY_PARTIAL, None
+
+        self._close(order_id)
+        for message_id in assembly["parts"]:
+            self._assembled[message_id] = order_id
+        while len(self._assembled) > self.max_assembled:
+            self._assembled.popitem(last=False)
+        assembled = self._assemble(assembly)
+        if assembled is None:
+            return ASSEMBLY_NONE, None
+        return ASSEMBLY_COMPLETE, assembled
+
+    def _close(self, order_id):
+        """Remove an open order and its part index; return its assembly."""
+        assembly = self._open.pop(order_id)
+        for message_id in assembly["parts"]:
+            self._part_orders.pop(message_id, None)
+        return assembly
+
+    @staticmethod
+    def _assemble(assembly):
+        """Parse the buffered parts of an order together (None if they do not parse)."""
+        assembled = parse_topup_result("\n".join(part["text"] for part in assembly["parts"].values()))
+        if assembled is None:
+            return None
+        assembled["meta"]["parts"] = len(assembly["parts"])
+        assembled["meta"]["messageIds"] = list(assembly["parts"])
+        return assembled
+
+    def stats(self):
+        """Return the number of orders waiting for more parts."""
+        return {"open": len(self._open)}
@@ -0,0 +1,705 @@
+"""
+Message storage backends
+One interface for everything the listener and API read from or write to the
+message collection, with three implementations picked by config.STORAGE_BACKEND:
+
+    mongo   MongoDB / Atlas (production)
+    sqlite  embedded SQLite file (offline deployments)
+    memory  in-process dicts (benchmarks, profiling the write path)
+
+Writes are upsert records from TelegramBotListener.build_upserts():
+{"message_id", "set": fields to overwrite, "document": full document}.
+"Latest" means most recently inserted, like sorting MongoDB's _id descending.
+Dates are ISO strings in documents passed in and returned; MongoDB stores them
+as native datetimes.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import rollups
+
+
+STORAGE_MONGO = "mongo"
+STORAGE_SQLITE = "sqlite"
+STORAGE_MEMORY = "memory"
+STORAGE_BACKENDS = (STORAGE_MONGO, STORAGE_SQLITE, STORAGE_MEMORY)
+
+# Parsed document fields; find_latest() looks them up and documents with any of
+# them are kept forever (the rest is chatter, expired after the chatter TTL)
+STRUCTURED_FIELDS = ("topupResult", "price_list", "account_status")
+
+# Document fields holding dates; raw_date is local time without an offset
+DATE_FIELDS = ("date", "raw_date", "edit_date")
+LOCAL_DATE_FIELDS = ("raw_date",)
+
+
+class StorageUnavailable(Exception):
+    """The backend cannot be reached (the write can be spooled and retried)."""
+
+
+class MessageStore:
+    """Interface of a message storage backend."""
+
+    name = None
+    # True if the backend is remote and writes should be spooled while it is down
+    remote = False
+
+    def __init__(self):
+        self.connected = False
+
+    def connect(self):
+        """Open the backend. Raises StorageUnavailable if it cannot be reached."""
+        self.connected = True
+
+    def ping(self):
+        """Check the backend is reachable. Raises StorageUnavailable if not."""
+
+    def write_upserts(self, upserts, ordered=False):
+        """Insert or update one document per upsert record.
+
+        Args:
+            upserts: Records from build_upserts()
+            ordered: Apply in order (spool replay, where a message_id may repeat)
+
+        Returns:
+            {index in upserts: id of the new document} for records that were inserted
+        """
+        raise NotImplementedError
+
+    def find_by_message_id(self, message_id):
+        """Return the document of a Telegram message_id, or None."""
+        raise NotImplementedError
+
+    def find_latest(self, field):
+        """Return the latest document that has field (one of STRUCTURED_FIELDS), or None."""
+        raise NotImplementedError
+
+    def find_topup_by_order_id(self, order_id):
+        """Return the latest document whose topupResult has this Order ID, or None."""
+        raise NotImplementedError
+
+    def claim_order_retry(self, order_id, retry):
+        """Set retry on the latest document of the order unless a retry is already recorded on it.
+
+        Returns:
+            (claimed, retry record of the order); (False, None) if no document has the order
+        """
+        raise NotImplementedError
+
+    def update_order_retry(self, order_id, retry_id, retry):
+        """Replace the retry record of the order if it is still the claim retry_id.
+
+        Args:
+            order_id: Order ID of the original order
+            retry_id: retryId of the claim made by claim_order_retry()
+            retry: New retry record, or None to release the claim
+
+        Returns:
+            True if the record was replaced
+        """
+        raise NotImplementedError
+
+    def increment_rollups(self, entries):
+        """Add roll-up entries (rollups.rollup_entries()); a member already counted in a roll-up is skipped."""
+        raise NotImplementedError
+
+    def find_rollups(self, kind, first_day, last_day, uid=None):
+        """Return the roll-up documents of kind for days first_day..last_day (ISO dates), by day."""
+        raise NotImplementedError
+
+    def close(self):
+        self.connected = False
+
+    def describe(self):
+        """Human readable location of the stored messages."""
+        return self.name
+
+    def stats(self):
+        return {"backend": self.name, "connected": self.connected, "location": self.describe()}
+
+
+def merge_upsert(existing, upsert):
+    """Apply an upsert record to a stored document (None if new); return the resulting document."""
+    if existing is None:
+        document = dict(upsert["document"])
+    else:
+        document = existing
+    document.update(upsert["set"])
+    return document
+
+
+def to_stored_date(value):
+    """Convert an ISO date string to an aware UTC datetime (naive strings are local time).
+
+    Values that are not strings, or not ISO dates, are returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value
+    return parsed.astimezone(timezone.utc)
+
+
+def from_stored_date(field, value):
+    """Convert a stored datetime back to the ISO string the listener produced for field."""
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if field in LOCAL_DATE_FIELDS:
+        return value.astimezone().replace(tzinfo=None).isoformat()
+    return value.isoformat()
+
+
+def chatter_expiry(document, ttl_seconds):
+    """Return when a new document expires: None if it has parsed fields or the TTL is disabled."""
+    if not ttl_seconds or any(field in document for field in STRUCTURED_FIELDS):
+        return None
+    stored_at = to_stored_date(document.get("raw_date"))
+    if not isinstance(stored_at, datetime):
+        stored_at = datetime.now(timezone.utc)
+    return stored_at + timedelta(seconds=ttl_seconds)
+
+
+class MongoMessageStore(MessageStore):
+    """Messages in a MongoDB collection, written with bulk upserts on the unique message_id index.
+
+    Date fields are stored as BSON datetimes. With a chatter TTL, documents
+    without parsed fields get an expires_at date that the chatter_ttl index
+    deletes them at; expires_at is removed if parsed fields arrive later.
+    """
+
+    name = STORAGE_MONGO
+    remote = True
+
+    def __init__(self, uri, database, collection, rollup_collection, rollup_member_collection,
+                 server_selection_timeout_ms=5000, chatter_ttl_seconds=0):
+        super().__init__()
+        self.uri = uri
+        self.database_name = database
+        self.collection_name = collection
+        self.rollup_collection_name = rollup_collection
+        self.rollup_member_collection_name = rollup_member_collection
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.chatter_ttl_seconds = chatter_ttl_seconds
+        self.client = None
+        self.collection = None
+        self.rollups = None
+        self.rollup_members = None
+
+    def connect(self):
+        from pymongo import MongoClient
+        from pymongo.errors import ConnectionFailure
+        import mongo_indexes
+
+        client = MongoClient(self.uri, serverSelectionTimeoutMS=self.server_selection_timeout_ms, tz_aware=True)
+        try:
+            # Test connection
+            client.server_info()
+        except ConnectionFailure as e:
+            client.close()
+            raise StorageUnavailable(str(e)) from e
+        self.client = client
+        self.collection = client[self.database_name][self.collection_name]
+        self.rollups = client[self.database_name][self.rollup_collection_name]
+        self.rollup_members = client[self.database_name][self.rollup_member_collection_name]
+        # Indexes behind every query path (unique message_id for the upserts)
+        mongo_indexes.ensure_indexes(self.collection)
+        mongo_indexes.report_indexes(self.collection)
+        mongo_indexes.ensure_indexes(self.rollups, mongo_indexes.ROLLUP_INDEXES)
+        mongo_indexes.ensure_indexes(self.rollup_members, mongo_indexes.ROLLUP_MEMBER_INDEXES)
+        self.connected = True
+
+    def ping(self):
+        from pymongo.errors import ConnectionFailure
+
+        try:
+            self.client.admin.command("ping")
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def write_upserts(self, upserts, ordered=False):
+        """Write upsert records with one bulk_write.
+
+        Parsed fields (and edited text) go in $set, the rest of the document in
+        $setOnInsert, so no lookup is needed first.
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError, ConnectionFailure
+
+        operations = []
+        for upsert in upserts:
+            set_fields = self.encode_dates(upsert["set"])
+            # A field may not appear in both $set and $setOnInsert
+            insert_fields = {key: value for key, value in upsert["document"].items() if key not in set_fields}
+            update = {}
+            if set_fields:
+                update["$set"] = set_fields
+            if any(field in set_fields for field in STRUCTURED_FIELDS):
+                # Chatter stored before its parsed result arrived is kept from now on
+                update["$unset"] = {"expires_at": ""}
+            else:
+                expires_at = chatter_expiry(upsert["document"], self.chatter_ttl_seconds)
+                if expires_at is not None:
+                    insert_fields["expires_at"] = expires_at
+            update["$setOnInsert"] = self.encode_dates(insert_fields)
+            operations.append(UpdateOne({"message_id": upsert["message_id"]}, update, upsert=True))
+
+        try:
+            try:
+                result = self.collection.bulk_write(operations, ordered=ordered)
+                return dict(result.upserted_ids)
+            except BulkWriteError as e:
+                # Two writers upserting the same new message_id: one insert loses on the
+                # unique index; retrying turns it into an update
+                write_errors = e.details.get("writeErrors", [])
+                retry_indexes = [error["index"] for error in write_errors if error.get("code") == 11000]
+                if len(retry_indexes) != len(write_errors):
+                    raise
+                if ordered:
+                    # An ordered bulk stops at the first error; redo everything after it
+                    retry_indexes = list(range(min(retry_indexes), len(operations)))
+                upserted_ids = {upsert["index"]: upsert["_id"] for upsert in e.details.get("upserted", [])}
+                self.collection.bulk_write([operations[index] for index in retry_indexes], ordered=ordered)
+                print(f"  [MongoDB] Retried {len(retry_indexes)} upsert(s) after duplicate key race")
+                return upserted_ids
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    @staticmethod
+    def encode_dates(fields):
+        """Return fields with DATE_FIELDS converted to datetimes."""
+        return {key: to_stored_date(value) if key in DATE_FIELDS else value for key, value in fields.items()}
+
+    @staticmethod
+    def decode_dates(document):
+        """Return a stored document with DATE_FIELDS back as ISO strings."""
+        if document is None:
+            return None
+        for field in DATE_FIELDS:
+            if field in document:
+                document[field] = from_stored_date(field, document[field])
+        return document
+
+    def find_by_message_id(self, message_id):
+        return self.decode_dates(self._find_one({"message_id": message_id}))
+
+    def find_latest(self, field):
+        return self.decode_dates(self._find_one({field: {"$exists": True}}, sort=[("_id", -1)]))
+
+    def find_topup_by_order_id(self, order_id):
+        return self.decode_dates(self._find_one({"topupResult.orderId": order_id}, sort=[("_id", -1)]))
+
+    def _find_one(self, query, sort=None):
+        """find_one that raises StorageUnavailable instead of ConnectionFailure, like the writes."""
+        from pymongo.errors import ConnectionFailure
+
+        try:
+            return self.collection.find_one(query, sort=sort)
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def claim_order_retry(self, order_id, retry):
+        """Claim with one conditional update, so two API processes cannot both retry an order."""
+        from pymongo.errors import ConnectionFailure
+
+        try:
+            document = self.collection.find_one({"topupResult.orderId": order_id}, {"retry": 1}, sort=[("_id", -1)])
+            if document is None:
+                return False, None
+            if document.get("retry") is not None:
+                return False, document["retry"]
+            result = self.collection.update_one({"_id": document["_id"], "retry": None}, {"$set": {"retry": retry}})
+            if result.modified_count:
+                return True, retry
+            document = self.collection.find_one({"_id": document["_id"]}, {"retry": 1})
+            return False, (document or {}).get("retry")
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def update_order_retry(self, order_id, retry_id, retry):
+        from pymongo.errors import ConnectionFailure
+
+        update = {"$set": {"retry": retry}} if retry is not None else {"$unset": {"retry": ""}}
+        try:
+            result = self.collection.update_one({"topupResult.orderId": order_id, "retry.retryId": retry_id}, update)
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+        return result.modified_count > 0
+
+    def increment_rollups(self, entries):
+        """Record the members, then $inc the roll-ups of the newly recorded ones.
+
+        Counted members are small {rollup, member} documents under a unique
+        index (rollup_member_unique), so the roll-up documents stay a fixed
+        size. A member already counted fails its insert with a duplicate key
+        and its increment is skipped, so counting is idempotent. If the $inc
+        bulk fails after the members were recorded, those increments are lost
+        rather than counted twice on a retry.
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError, ConnectionFailure
+
+        if not entries:
+            return
+        members = [{"rollup": entry["key"], "member": entry["member"]} for entry in entries]
+        try:
+            try:
+                self.rollup_members.insert_many(members, ordered=False)
+                counted = set()
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != 11000 for error in write_errors):
+                    raise
+                counted = {error["index"] for error in write_errors}
+            operations = [
+                UpdateOne({"_id": entry["key"]}, {"$inc": entry["inc"], "$setOnInsert": entry["fields"]}, upsert=True)
+                for index, entry in enumerate(entries) if index not in counted
+            ]
+            if operations:
+                self.rollups.bulk_write(operations, ordered=False)
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def find_rollups(self, kind, first_day, last_day, uid=None):
+        from pymongo.errors import ConnectionFailure
+
+        query = {"kind": kind, "day": {"$gte": first_day, "$lte": last_day}}
+        if uid is not None:
+            query["uid"] = uid
+        try:
+            return list(self.rollups.find(query, {"members": 0}).sort("day", 1))
+        except ConnectionFailure as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.collection = None
+        self.rollups = None
+        self.rollup_members = None
+        self.connected = False
+
+    def describe(self):
+        return f"MongoDB {self.database_name}.{self.collection_name}"
+
+
+class SQLiteMessageStore(MessageStore):
+    """Messages as JSON documents in an embedded SQLite file.
+
+    The fields behind the lookups (Order ID, which STRUCTURED_FIELDS a document has)
+    are kept in indexed columns next to the document. Safe to use from several
+    threads.
+    """
+
+    name = STORAGE_SQLITE
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def connect(self):
+        try:
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " message_id INTEGER NOT NULL UNIQUE,"
+                " order_id TEXT,"
+                " has_topup INTEGER NOT NULL DEFAULT 0,"
+                " has_price_list INTEGER NOT NULL DEFAULT 0,"
+                " has_account_status INTEGER NOT NULL DEFAULT 0,"
+                " document TEXT NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS messages_order_id ON messages (order_id, id)")
+            for column in ("has_topup", "has_price_list", "has_account_status"):
+                connection.execute(f"CREATE INDEX IF NOT EXISTS messages_{column} ON messages (id) WHERE {column} = 1")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " key TEXT PRIMARY KEY, kind TEXT NOT NULL, day TEXT NOT NULL, uid TEXT, document TEXT NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS rollups_kind_day ON rollups (kind, day)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rollup_members ("
+                " key TEXT NOT NULL, member INTEGER NOT NULL, PRIMARY KEY (key, member)) WITHOUT ROWID"
+            )
+        except sqlite3.Error as e:
+            raise StorageUnavailable(str(e)) from e
+        self._connection = connection
+        self.connected = True
+
+    def ping(self):
+        try:
+            with self._lock:
+                self._connection.execute("SELECT 1").fetchone()
+        except sqlite3.Error as e:
+            raise StorageUnavailable(str(e)) from e
+
+    def write_upserts(self, upserts, ordered=False):
+        """Read-modify-write every record in one transaction (SQLite applies them in order either way)."""
+        inserted = {}
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                for index, upsert in enumerate(upserts):
+                    row = self._connection.execute(
+                        "SELECT document FROM messages WHERE message_id = ?", (upsert["message_id"],)
+                    ).fetchone()
+                    document = merge_upsert(json.loads(row[0]) if row else None, upsert)
+                    topup_result = document.get("topupResult")
+                    values = (
+                        topup_result.get("orderId") if isinstance(topup_result, dict) else None,
+                        int("topupResult" in document),
+                        int("price_list" in document),
+                        int("account_status" in document),
+                        json.dumps(document, ensure_ascii=False, default=str)
+                    )
+                    if row:
+                        self._connection.execute(
+                            "UPDATE messages SET order_id = ?, has_topup = ?, has_price_list = ?,"
+                            " has_account_status = ?, document = ? WHERE message_id = ?",
+                            values + (upsert["message_id"],)
+                        )
+                    else:
+                        cursor = self._connection.execute(
+                            "INSERT INTO messages (order_id, has_topup, has_price_list, has_account_status,"
+                            " document, message_id) VALUES (?, ?, ?, ?, ?, ?)",
+                            values + (upsert["message_id"],)
+                        )
+                        inserted[index] = cursor.lastrowid
+        return inserted
+
+    def _find_one(self, where, params):
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT id, document FROM messages WHERE {where} ORDER BY id DESC LIMIT 1", params
+            ).fetchone()
+        if not row:
+            return None
+        document = json.loads(row[1])
+        document["_id"] = row[0]
+        return document
+
+    def find_by_message_id(self, message_id):
+        return self._find_one("message_id = ?", (message_id,))
+
+    def find_latest(self, field):
+        column = {
+            "topupResult": "has_topup",
+            "price_list": "has_price_list",
+            "account_status": "has_account_status"
+        }[field]
+        return self._find_one(f"{column} = 1", ())
+
+    def find_topup_by_order_id(self, order_id):
+        return self._find_one("order_id = ?", (order_id,))
+
+    def claim_order_retry(self, order_id, retry):
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                row = self._connection.execute(
+                    "SELECT id, document FROM messages WHERE order_id = ? ORDER BY id DESC LIMIT 1", (order_id,)
+                ).fetchone()
+                if not row:
+                    return False, None
+                document = json.loads(row[1])
+                if document.get("retry") is not None:
+                    return False, document["retry"]
+                document["retry"] = retry
+                self._connection.execute(
+                    "UPDATE messages SET document = ? WHERE id = ?",
+                    (json.dumps(document, ensure_ascii=False, default=str), row[0])
+                )
+                return True, retry
+
+    def update_order_retry(self, order_id, retry_id, retry):
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                for row_id, document_json in self._connection.execute(
+                    "SELECT id, document FROM messages WHERE order_id = ?", (order_id,)
+                ).fetchall():
+                    document = json.loads(document_json)
+                    if (document.get("retry") or {}).get("retryId") != retry_id:
+                        continue
+                    if retry is None:
+                        document.pop("retry")
+                    else:
+                        document["retry"] = retry
+                    self._connection.execute(
+                        "UPDATE messages SET document = ? WHERE id = ?",
+                        (json.dumps(document, ensure_ascii=False, default=str), row_id)
+                    )
+                    return True
+        return False
+
+    def increment_rollups(self, entries):
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                for entry in entries:
+                    counted = self._connection.execute(
+                        "INSERT OR IGNORE INTO rollup_members (key, member) VALUES (?, ?)", (entry["key"], entry["member"])
+                    ).rowcount
+                    if not counted:
+                        continue
+                    row = self._connection.execute("SELECT document FROM rollups WHERE key = ?", (entry["key"],)).fetchone()
+                    document = json.loads(row[0]) if row else dict(entry["fields"], _id=entry["key"])
+                    rollups.apply_increments(document, entry["inc"])
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO rollups (key, kind, day, uid, document) VALUES (?, ?, ?, ?, ?)",
+                        (entry["key"], document["kind"], document["day"], document.get("uid"), json.dumps(document))
+                    )
+
+    def find_rollups(self, kind, first_day, last_day, uid=None):
+        where, params = "kind = ? AND day >= ? AND day <= ?", [kind, first_day, last_day]
+        if uid is not None:
+            where += " AND uid = ?"
+            params.append(uid)
+        with self._lock:
+            rows = self._connection.execute(f"SELECT document FROM rollups WHERE {where} ORDER BY day", params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        if self._connection is not None:
+            with self._lock:
+                self._connection.close()
+        self._connection = None
+        self.connected = False
+
+    def describe(self):
+        return f"SQLite {self.path}"
+
+
+class MemoryMessageStore(MessageStore):
+    """Messages in process memory (lost on exit). Safe to use from several threads."""
+
+    name = STORAGE_MEMORY
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._documents = {}       # message_id -> document, in insertion order
+        self._order_ids = {}       # Order ID -> message_id of the latest document with it
+        self._next_id = 1
+        self._rollups = {}         # roll-up key -> document
+        self._rollup_members = {}  # roll-up key -> set of counted members
+
+    def write_upserts(self, upserts, ordered=False):
+        inserted = {}
+        with self._lock:
+            for index, upsert in enumerate(upserts):
+                existing = self._documents.get(upsert["message_id"])
+                document = merge_upsert(existing, upsert)
+                if existing is None:
+                    document["_id"] = self._next_id
+                    self._next_id += 1
+                    self._documents[upsert["message_id"]] = document
+                    inserted[index] = document["_id"]
+                topup_result = document.get("topupResult")
+                if isinstance(topup_result, dict) and topup_result.get("orderId"):
+                    previous = self._documents.get(self._order_ids.get(topup_result["orderId"]))
+                    if previous is None or previous["_id"] <= document["_id"]:
+                        self._order_ids[topup_result["orderId"]] = upsert["message_id"]
+        return inserted
+
+    def find_by_message_id(self, message_id):
+        with self._lock:
+            return self._documents.get(message_id)
+
+    def find_latest(self, field):
+        with self._lock:
+            for document in reversed(self._documents.values()):
+                if field in document:
+                    return document
+        return None
+
+    def find_topup_by_order_id(self, order_id):
+        with self._lock:
+            return self._documents.get(self._order_ids.get(order_id))
+
+    def claim_order_retry(self, order_id, retry):
+        with self._lock:
+            document = self._documents.get(self._order_ids.get(order_id))
+            if document is None:
+                return False, None
+            if document.get("retry") is not None:
+                return False, document["retry"]
+            document["retry"] = retry
+            return True, retry
+
+    def update_order_retry(self, order_id, retry_id, retry):
+        with self._lock:
+            document = self._documents.get(self._order_ids.get(order_id))
+            if document is None or (document.get("retry") or {}).get("retryId") != retry_id:
+                return False
+            if retry is None:
+                document.pop("retry")
+            else:
+                document["retry"] = retry
+            return True
+
+    def increment_rollups(self, entries):
+        with self._lock:
+            for entry in entries:
+                members = self._rollup_members.setdefault(entry["key"], set())
+                if entry["member"] in members:
+                    continue
+                members.add(entry["member"])
+                document = self._rollups.setdefault(entry["key"], dict(entry["fields"], _id=entry["key"]))
+                rollups.apply_increments(document, entry["inc"])
+
+    def find_rollups(self, kind, first_day, last_day, uid=None):
+        with self._lock:
+            documents = [
+                dict(document) for document in self._rollups.values()
+                if document["kind"] == kind and first_day <= document["day"] <= last_day
+                and (uid is None or document.get("uid") == uid)
+            ]
+        return sorted(documents, key=lambda document: document["day"])
+
+    def __len__(self):
+        return len(self._documents)
+
+    def describe(self):
+        return f"memory ({len(self._documents)} messages)"
+
+
+def create_store(backend):
+    """Build the configured backend (not yet connected).
+
+    Args:
+        backend: One of STORAGE_BACKENDS
+
+    Returns:
+        MessageStore, or None for mongo without MONGODB_URI
+    """
+    import config
+
+    if backend == STORAGE_MONGO:
+        if not config.MONGODB_URI:
+            return None
+        return MongoMessageStore(
+            config.MONGODB_URI,
+            config.MONGODB_DATABASE,
+            config.MONGODB_COLLECTION,
+            config.MONGODB_ROLLUP_COLLECTION,
+            config.MONGODB_ROLLUP_MEMBER_COLLECTION,
+            chatter_ttl_seconds=config.CHATTER_TTL_DAYS * 86400
+        )
+    if backend == STORAGE_SQLITE:
+        return SQLiteMessageStore(config.SQLITE_STORE_PATH)
+    if backend == STORAGE_MEMORY:
+        return MemoryMessageStore()
+    raise ValueError(f"Unknown storage backend '{backend}' (expected one of: {', '.join(STORAGE_BACKENDS)})")
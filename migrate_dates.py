@@ -0,0 +1,169 @@
+"""
+Migrate stored messages to native dates and the chatter TTL.
+
+Converts date / raw_date / edit_date stored as ISO strings to BSON datetimes
+and creates the indexes. Migrated documents no longer match the query, so an
+interrupted run simply resumes when started again.
+
+Stored chatter is kept by default. With --ttl-days N, documents without
+topupResult, account_status or price_list get an expires_at of raw_date + N
+days and the chatter_ttl index deletes them - chatter older than N days is
+deleted right away and cannot be recovered. The run then only reports how many
+documents would expire and how many are already past due; add
+--confirm-expiry to write expires_at.
+
+Usage: python migrate_dates.py [--batch-size 1000] [--ttl-days N [--confirm-expiry]]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+
+from pymongo import MongoClient, UpdateOne
+
+import config
+import message_store
+import mongo_indexes
+
+
+def migration_query(ttl_seconds):
+    """Documents with a date field stored as a string, or (with a TTL) chatter without expires_at."""
+    conditions = [{field: {"$type": "string"}} for field in message_store.DATE_FIELDS]
+    if ttl_seconds:
+        chatter = {field: {"$exists": False} for field in message_store.STRUCTURED_FIELDS}
+        chatter["expires_at"] = {"$exists": False}
+        conditions.append(chatter)
+    return {"$or": conditions}
+
+
+def count_expiring(collection, ttl_seconds):
+    """Count chatter without expires_at that a TTL would expire, and how much of it is already past due.
+
+    Returns:
+        (expiring, past_due)
+    """
+    chatter = {field: {"$exists": False} for field in message_store.STRUCTURED_FIELDS}
+    chatter["expires_at"] = {"$exists": False}
+    now = datetime.now(timezone.utc)
+    expiring = past_due = 0
+    for document in collection.find(chatter, {"raw_date": 1}):
+        expiring += 1
+        if message_store.chatter_expiry(document, ttl_seconds) <= now:
+            past_due += 1
+    return expiring, past_due
+
+
+def migrate_document(document, ttl_seconds):
+    """Return the $set for one document, or None if nothing changes."""
+    update_fields = {}
+    for field in message_store.DATE_FIELDS:
+        value = document.get(field)
+        stored = message_store.to_stored_date(value)
+        if stored is not value:
+            update_fields[field] = stored
+    if "expires_at" not in document:
+        expires_at = message_store.chatter_expiry(document, ttl_seconds)
+        if expires_at is not None:
+            update_fields["expires_at"] = expires_at
+    return update_fields or None
+
+
+def run_migration(collection, batch_size=1000, ttl_seconds=0):
+    """Convert string dates in place, batch by batch.
+
+    Args:
+        collection: pymongo collection
+        batch_size: Documents per read/write batch
+        ttl_seconds: Chatter TTL (0 leaves expires_at unset)
+
+    Returns:
+        dict with scanned/updated/expiring/unparseable counters
+    """
+    stats = {"scanned": 0, "updated": 0, "expiring": 0, "unparseable": 0}
+    projection = {field: 1 for field in message_store.DATE_FIELDS + message_store.STRUCTURED_FIELDS}
+    projection["expires_at"] = 1
+    last_id = None
+    start_time = time.time()
+
+    while True:
+        query = migration_query(ttl_seconds)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for document in batch:
+            update_fields = migrate_document(document, ttl_seconds) or {}
+            if any(isinstance(document.get(field), str) and field not in update_fields
+                   for field in message_store.DATE_FIELDS):
+                stats["unparseable"] += 1
+            if update_fields:
+                operations.append(UpdateOne({"_id": document["_id"]}, {"$set": update_fields}))
+                if "expires_at" in update_fields:
+                    stats["expiring"] += 1
+
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            stats["updated"] += result.modified_count
+        stats["scanned"] += len(batch)
+        # Documents with unparseable date strings keep matching; skip past them
+        last_id = batch[-1]["_id"]
+
+        elapsed = time.time() - start_time
+        print(f"  scanned {stats['scanned']} | updated {stats['updated']} | expiring {stats['expiring']}"
+              f" | unparseable {stats['unparseable']} | {elapsed:.1f}s")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store message dates as native datetimes and apply the chatter TTL")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--ttl-days", type=float, default=0,
+                        help="Expire stored chatter N days after raw_date (default 0: keep it)")
+    parser.add_argument("--confirm-expiry", action="store_true",
+                        help="Write expires_at with --ttl-days (without it the expiry is only reported)")
+    args = parser.parse_args()
+    ttl_seconds = args.ttl_days * 86400
+
+    if not config.MONGODB_URI:
+        print("ERROR: MONGODB_URI environment variable is required.")
+        sys.exit(1)
+
+    print("Connecting to MongoDB using URI...")
+    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000, tz_aware=True)
+    try:
+        client.server_info()
+        collection = client[config.MONGODB_DATABASE][config.MONGODB_COLLECTION]
+        print(f"Connected to MongoDB: {config.MONGODB_DATABASE}.{config.MONGODB_COLLECTION}")
+
+        if ttl_seconds:
+            expiring, past_due = count_expiring(collection, ttl_seconds)
+            print(f"With --ttl-days {args.ttl_days:g}: {expiring} stored chatter documents would expire,"
+                  f" {past_due} of them already past due (deleted by the TTL index right after the migration)")
+            if not args.confirm_expiry:
+                print("Nothing written. Re-run with --confirm-expiry to apply the TTL,"
+                      " or without --ttl-days to only convert dates.")
+                return
+
+        stats = run_migration(collection, batch_size=args.batch_size, ttl_seconds=ttl_seconds)
+        mongo_indexes.ensure_indexes(collection)
+
+        print(f"\n{'='*60}")
+        print(f"Summary:")
+        print(f"  Documents scanned: {stats['scanned']}")
+        print(f"  Updated: {stats['updated']}")
+        print(f"  Chatter set to expire: {stats['expiring']}")
+        print(f"  With unparseable date strings: {stats['unparseable']}")
+        print(f"{'='*60}\n")
+    except KeyboardInterrupt:
+        print(f"\nInterrupted - run again to continue")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+MongoDB index manager
+Declares the indexes behind every query the listener and API run, creates the
+missing ones at startup and reports indexes that are missing, undeclared or
+unused. Run directly for a report: python mongo_indexes.py
+"""
+
+import sys
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+
+# name -> (keys, options, query it serves)
+REQUIRED_INDEXES = {
+    "message_id_unique": (
+        [("message_id", ASCENDING)],
+        {"unique": True},
+        "upsert per message, send-message-raw lookup by message_id"
+    ),
+    "topup_uid": (
+        [("topupResult.user.uid", ASCENDING), ("_id", DESCENDING)],
+        {},
+        "topup results of a UID, newest first"
+    ),
+    "topup_order_id": (
+        [("topupResult.orderId", ASCENDING), ("_id", DESCENDING)],
+        {},
+        "retry-failed lookup by Order ID"
+    ),
+    "raw_date": (
+        [("raw_date", ASCENDING)],
+        {},
+        "time range scans (raw_date is a BSON datetime)"
+    ),
+    # TTL: MongoDB deletes chatter once its expires_at has passed (documents with
+    # parsed fields have no expires_at and are kept)
+    "chatter_ttl": (
+        [("expires_at", ASCENDING)],
+        {"expireAfterSeconds": 0},
+        "expiry of unstructured chatter (CHATTER_TTL_DAYS)"
+    ),
+    # Partial indexes: "latest document that has X" without scanning chatter
+    "topup_latest": (
+        [("_id", DESCENDING)],
+        {"partialFilterExpression": {"topupResult": {"$exists": True}}},
+        "send-message-raw fallback: latest topupResult"
+    ),
+    "price_list_latest": (
+        [("_id", DESCENDING)],
+        {"partialFilterExpression": {"price_list": {"$exists": True}}},
+        "startup: latest price_list"
+    ),
+    "account_status_latest": (
+        [("_id", DESCENDING)],
+        {"partialFilterExpression": {"account_status": {"$exists": True}}},
+        "startup: latest account_status"
+    ),
+}
+
+# Indexes of the roll-up collection (_id is the roll-up key)
+ROLLUP_INDEXES = {
+    "rollup_kind_day": (
+        [("kind", ASCENDING), ("day", ASCENDING)],
+        {},
+        "/api/stats: daily roll-ups and per-UID roll-ups of a day range"
+    ),
+    "rollup_uid_day": (
+        [("uid", ASCENDING), ("day", ASCENDING)],
+        {"partialFilterExpression": {"uid": {"$exists": True}}},
+        "/api/stats?uid=: roll-ups of one UID"
+    ),
+}
+
+# Indexes of the roll-up member collection
+ROLLUP_MEMBER_INDEXES = {
+    "rollup_member_unique": (
+        [("rollup", ASCENDING), ("member", ASCENDING)],
+        {"unique": True},
+        "roll-up increments: each message is counted once per roll-up"
+    ),
+}
+
+
+def ensure_indexes(collection, indexes=None):
+    """Create every declared index that does not exist yet.
+
+    Args:
+        collection: pymongo collection
+        indexes: Declared indexes (REQUIRED_INDEXES if None)
+
+    Returns:
+        list of names of declared indexes that could not be created
+    """
+    indexes = REQUIRED_INDEXES if indexes is None else indexes
+    existing = collection.index_information()
+    missing = []
+    for name, (keys, options, purpose) in indexes.items():
+        if name in existing:
+            continue
+        try:
+            collection.create_index(keys, name=name, **options)
+            print(f"  [Indexes] Created {name} ({purpose})")
+        except OperationFailure as e:
+            # e.g. duplicate message_ids before the unique index existed, or the
+            # same keys already indexed under another name
+            print(f"⚠ Warning: Could not create index {name}: {e}")
+            missing.append(name)
+    return missing
+
+
+def index_usage(collection):
+    """Return {index name: ops since the server started}, or None if $indexStats is not allowed."""
+    try:
+        return {stats["name"]: stats["accesses"]["ops"] for stats in collection.aggregate([{"$indexStats": {}}])}
+    except OperationFailure:
+        return None
+
+
+def report_indexes(collection, indexes=None):
+    """Print declared, missing, undeclared and unused indexes.
+
+    Args:
+        collection: pymongo collection
+        indexes: Declared indexes (REQUIRED_INDEXES if None)
+
+    Returns:
+        {"missing": [...], "undeclared": [...], "unused": [...]}
+    """
+    indexes = REQUIRED_INDEXES if indexes is None else indexes
+    existing = collection.index_information()
+    usage = index_usage(collection)
+
+    missing = [name for name in indexes if name not in existing]
+    undeclared = [name for name in existing if name != "_id_" and name not in indexes]
+    unused = [name for name, ops in (usage or {}).items() if name != "_id_" and ops == 0]
+
+    print(f"  [Indexes] {collection.name}: {len(indexes) - len(missing)}/{len(indexes)} declared indexes present")
+    for name in missing:
+        print(f"    - MISSING: {name} ({indexes[name][2]})")
+    for name in undeclared:
+        print(f"    - Undeclared: {name} {existing[name]['key']}")
+    if usage is None:
+        print(f"    - Usage unknown ($indexStats not permitted)")
+    for name in unused:
+        print(f"    - Unused since server start: {name}")
+
+    return {"missing": missing, "undeclared": undeclared, "unused": unused}
+
+
+def main():
+    from pymongo import MongoClient
+    import config
+
+    if not config.MONGODB_URI:
+        print("ERROR: MONGODB_URI environment variable is required.")
+        sys.exit(1)
+
+    client = MongoClient(config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+    try:
+        database = client[config.MONGODB_DATABASE]
+        for collection_name, indexes in ((config.MONGODB_COLLECTION, REQUIRED_INDEXES),
+                                         (config.MONGODB_ROLLUP_COLLECTION, ROLLUP_INDEXES),
+                                         (config.MONGODB_ROLLUP_MEMBER_COLLECTION, ROLLUP_MEMBER_INDEXES)):
+            print(f"Indexes of {config.MONGODB_DATABASE}.{collection_name}:")
+            if "--create" in sys.argv[1:]:
+                ensure_indexes(database[collection_name], indexes)
+            report_indexes(database[collection_name], indexes)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Write-behind persistence
+Bounded queue drained by a dedicated writer thread, so message_handler hands a
+message off in microseconds and MongoDB round trips never block the Telethon
+event loop (and the /api/send* calls scheduled on it). The writer coalesces
+queued items into batches so a burst costs one round trip per batch.
+While MongoDB is unreachable, writes go to an on-disk spool and are replayed
+in order once it is back; a circuit breaker stops writers from waiting on a
+server that keeps failing.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+
+# What put() does when the queue is full
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # discard the oldest queued item to make room
+OVERFLOW_DROP_NEWEST = "drop_newest"  # discard the item being added
+OVERFLOW_BLOCK = "block"              # wait for the writer (blocks the caller, up to block_timeout)
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Bounded queue of pending writes with one writer thread.
+
+    The writer takes the first queued item, then keeps collecting until the
+    batch holds batch_size items or the first item is linger_ms old, and passes
+    the list to write_batch(items) in arrival order. An exception from
+    write_batch() is logged and counted, and the writer carries on.
+    """
+
+    def __init__(self, write_batch, maxsize=1000, overflow=OVERFLOW_DROP_OLDEST, block_timeout=5.0,
+                 batch_size=100, linger_ms=50, name="mongo-writer"):
+        """
+        Args:
+            write_batch: Callable run on the writer thread with a list of items
+            maxsize: Queue capacity
+            overflow: One of OVERFLOW_POLICIES
+            block_timeout: Max seconds put() waits with OVERFLOW_BLOCK before dropping the item
+            batch_size: Max items per write_batch() call
+            linger_ms: Max milliseconds the first item of a batch waits for more items
+            name: Writer thread name
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}' (expected one of: {', '.join(OVERFLOW_POLICIES)})")
+        self.write_batch = write_batch
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.batch_size = max(1, batch_size)
+        self.linger_seconds = max(0.0, linger_ms / 1000.0)
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_write_ms = None
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        """Queue an item for writing.
+
+        Returns:
+            True if queued, False if the item was dropped
+        """
+        if self.overflow == OVERFLOW_BLOCK:
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                # Drop the oldest item; the writer may have freed a slot meanwhile
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    self.dropped += 1
+                    return False
+        self.enqueued += 1
+        return True
+
+    def _collect_batch(self):
+        """Block for the first item, then gather more until the batch is full or lingered enough.
+
+        Returns:
+            (items, stop): stop is True if the stop marker was taken
+        """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        items = [first]
+        deadline = time.monotonic() + self.linger_seconds
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self):
+        while True:
+            items, stop = self._collect_batch()
+            if items:
+                start = time.perf_counter()
+                try:
+                    self.write_batch(items)
+                    self.written += len(items)
+                except Exception as e:
+                    self.failed += len(items)
+                    print(f"  [Writer] Error writing batch of {len(items)}: {e}")
+                self.batches += 1
+                self.last_batch_size = len(items)
+                self.last_write_ms = (time.perf_counter() - start) * 1000
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    def flush(self, timeout=None):
+        """Wait until every queued item has been written.
+
+        Returns:
+            True if the queue drained, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10.0):
+        """Write what is queued, then stop the writer thread."""
+        self.flush(timeout)
+        try:
+            self._queue.put(_STOP, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Return queue depth and counters."""
+        return {
+            "depth": self._queue.qsize(),
+            "maxSize": self._queue.maxsize,
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batchSize": self.batch_size,
+            "lingerMs": self.linger_seconds * 1000,
+            "batches": self.batches,
+            "lastBatchSize": self.last_batch_size,
+            "lastWriteMs": self.last_write_ms
+        }
+
+
+class MessageSpool:
+    """Append-only on-disk spool of pending writes (SQLite).
+
+    Records are JSON-serializable values kept in insertion order; a reader
+    takes the oldest batch and deletes it once it has been written elsewhere.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL)"
+        )
+        self._count = self._connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append(self, records):
+        """Append records in order (one transaction)."""
+        rows = [(json.dumps(record, ensure_ascii=False),) for record in records]
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany("INSERT INTO spool (record) VALUES (?)", rows)
+            self._count += len(rows)
+
+    def read_batch(self, limit):
+        """Return up to limit of the oldest records as (last id, [records]); last id is None if empty."""
+        with self._lock:
+            rows = self._connection.execute("SELECT id, record FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        if not rows:
+            return None, []
+        return rows[-1][0], [json.loads(record) for _, record in rows]
+
+    def delete_through(self, last_id):
+        """Delete every record up to and including last_id."""
+        with self._lock:
+            deleted = self._connection.execute("DELETE FROM spool WHERE id <= ?", (last_id,)).rowcount
+            self._count = max(0, self._count - deleted)
+
+    def __len__(self):
+        return self._count
+
+    def stats(self):
+        return {"path": self.path, "pending": self._count}
+
+
+# CircuitBreaker states
+BREAKER_CLOSED = "closed"        # requests go through
+BREAKER_OPEN = "open"            # requests are refused until reset_timeout has passed
+BREAKER_HALF_OPEN = "half_open"  # one trial request decides between closed and open
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Opens after failure_threshold failures in a row; while open, allow_request()
+    returns False so callers take their fallback path immediately instead of
+    waiting for a timeout. After reset_timeout seconds one trial request is let
+    through: success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_closed(self):
+        return self.state == BREAKER_CLOSED
+
+    def allow_request(self):
+        """Return True if a request may go through now."""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = BREAKER_HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != BREAKER_CLOSED:
+                print(f"  [Breaker] Closed after {self.consecutive_failures} failure(s)")
+            self.state = BREAKER_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == BREAKER_HALF_OPEN or (
+                    self.state == BREAKER_CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"  [Breaker] Opened after {self.consecutive_failures} consecutive failure(s): {error}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutiveFailures": self.consecutive_failures,
+                "failureThreshold": self.failure_threshold,
+                "resetTimeoutSec": self.reset_timeout,
+                "openForSec": time.monotonic() - self.opened_at if self.opened_at is not None else None,
+                "timesOpened": self.times_opened,
+                "lastError": self.last_error
+            }
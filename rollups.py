@@ -0,0 +1,114 @@
+"""
+Topup roll-ups
+Per-day and per-UID-per-day counters kept up to date with increments whenever
+a topup result is persisted, so /api/stats answers "total spend today" or
+"cards used per UID this week" from a handful of small documents instead of
+scanning every stored message.
+
+A roll-up entry is {"key", "fields", "inc", "member"}: the roll-up document
+key, the fields it is created with, the counters to add, and the id of the
+message counted (each message is counted once per roll-up, so re-persisting
+an edit or replaying the spool does not count it again).
+"""
+
+from datetime import date, timedelta
+
+
+ROLLUP_DAILY = "daily"
+ROLLUP_UID = "uid"
+
+COUNTERS = (
+    "orders", "successOrders", "failedOrders",
+    "total", "paid", "due",
+    "cards", "failedCards",
+    "durationSum", "durationCount"
+)
+
+
+def rollup_key(kind, day, uid=None):
+    """Document key of a roll-up ("daily:2026-10-17", "uid:5801424265:2026-10-17")."""
+    if kind == ROLLUP_UID:
+        return f"{ROLLUP_UID}:{uid}:{day}"
+    return f"{ROLLUP_DAILY}:{day}"
+
+
+def topup_increments(topup_result):
+    """Return the counters one topup result adds to its roll-ups."""
+    payment = topup_result.get("payment") or {}
+    used_uc = payment.get("usedUc")
+    summary = used_uc.get("summary") if isinstance(used_uc, dict) else None
+    duration = (topup_result.get("meta") or {}).get("durationSec")
+
+    if summary:
+        cards, failed_cards = summary.get("total", 0), summary.get("failed", 0)
+    elif isinstance(used_uc, dict):
+        cards, failed_cards = len(used_uc.get("codes") or []), 0
+    else:
+        cards, failed_cards = len(used_uc or []), 0
+
+    failed = topup_result.get("status") == "failed"
+    return {
+        "orders": 1,
+        "successOrders": 0 if failed else 1,
+        "failedOrders": 1 if failed else 0,
+        "total": payment.get("total") or 0,
+        "paid": payment.get("paid") or 0,
+        "due": payment.get("due") or 0,
+        "cards": cards,
+        "failedCards": failed_cards,
+        "durationSum": duration or 0,
+        "durationCount": 1 if duration is not None else 0
+    }
+
+
+def rollup_entries(topup_result, message_id, raw_date):
+    """Return the roll-up entries for one persisted topup result.
+
+    Args:
+        topup_result: Parsed topupResult
+        message_id: Message it was parsed from
+        raw_date: ISO local time the message was received (its date is the roll-up day)
+    """
+    day = raw_date[:10]
+    inc = topup_increments(topup_result)
+    entries = [{
+        "key": rollup_key(ROLLUP_DAILY, day),
+        "fields": {"kind": ROLLUP_DAILY, "day": day},
+        "inc": inc,
+        "member": message_id
+    }]
+    uid = (topup_result.get("user") or {}).get("uid")
+    if uid:
+        entries.append({
+            "key": rollup_key(ROLLUP_UID, day, uid),
+            "fields": {"kind": ROLLUP_UID, "day": day, "uid": uid},
+            "inc": inc,
+            "member": message_id
+        })
+    return entries
+
+
+def apply_increments(document, inc):
+    """Add counters to a roll-up document in place (for backends without $inc)."""
+    for counter, value in inc.items():
+        document[counter] = document.get(counter, 0) + value
+
+
+def summarize(documents):
+    """Sum roll-up documents into one row of counters plus avgDurationSec."""
+    row = {counter: 0 for counter in COUNTERS}
+    for document in documents:
+        for counter in COUNTERS:
+            row[counter] += document.get(counter, 0)
+    row["total"] = round(row["total"], 2)
+    row["paid"] = round(row["paid"], 2)
+    row["due"] = round(row["due"], 2)
+    row["durationSum"] = round(row["durationSum"], 2)
+    row["avgDurationSec"] = round(row["durationSum"] / row["durationCount"], 2) if row["durationCount"] else None
+    return row
+
+
+def day_range(first_day, last_day):
+    """Return every ISO day from first_day to last_day inclusive."""
+    start, end = date.fromisoformat(first_day), date.fromisoformat(last_day)
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
@@ -7,12 +7,18 @@ Also saves filtered messages to MongoDB.
 import asyncio
 import re
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from telethon import TelegramClient, events
 from telethon.errors import SessionPasswordNeededError
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 import config
+import message_parser
+import message_store
+import rollups
+from bot_state import AccountSnapshot, PriceListStore, RecentOrders
+from message_store import StorageUnavailable
+from persistence import CircuitBreaker, MessageSpool, WriteBehindQueue
 
 
 class TelegramBotListener:
@@ -30,9 +36,8 @@ class TelegramBotListener:
         )
         self.bot_username = config.BOT_USERNAME
         self.bot_entity = None
-        self.mongo_client = None
-        self.mongo_db = None
-        self.mongo_collection = None
+        # Message storage (config.STORAGE_BACKEND); None if storage is disabled
+        self.store = message_store.create_store(config.STORAGE_BACKEND)
         # Store recent responses for API access
         self.recent_responses = {}
         self.response_lock = asyncio.Lock()
@@ -40,6 +45,38 @@ class TelegramBotListener:
         # Use a list per UID to handle multiple concurrent requests with same UID
         self.pending_requests = {}  # {uid: [{sent_message_id, timestamp, event, response_data}, ...]}
         self.pending_requests_lock = asyncio.Lock()
+        # Messages that already resolved a pending request (edits must not resolve another one)
+        self.matched_message_ids = OrderedDict()
+        # Parts of topup results split across several messages
+        self.topup_assembler = message_parser.TopupAssembler(config.TOPUP_ASSEMBLY_WINDOW)
+        # Parsed results of recently seen texts (the bot re-sends identical price lists/status blocks)
+        self.parse_cache = message_parser.ParseCache(config.PARSE_CACHE_SIZE)
+        # Current price list (versioned, served by /api/prices)
+        self.price_list_store = PriceListStore()
+        # Latest account status (served by /api/account) and callers waiting for a fresh one
+        self.account_snapshot = AccountSnapshot()
+        self.account_status_waiters = []
+        # Recent topup results by Order ID (served by /api/orders)
+        self.recent_orders = RecentOrders(config.ORDER_CACHE_SIZE)
+        # Opens after repeated MongoDB failures so writes and lookups stop waiting on it
+        self.mongo_breaker = CircuitBreaker(config.MONGO_BREAKER_FAILURES, config.MONGO_BREAKER_RESET_SECONDS)
+        # Writes made while MongoDB is unreachable, replayed by the health thread
+        self.spool = None
+        self.mongo_health_stop = threading.Event()
+        if self.store is not None and self.store.remote:
+            self.spool = MessageSpool(config.SPOOL_PATH)
+            if len(self.spool):
+                print(f"  [Spool] {len(self.spool)} message(s) waiting from a previous run")
+            threading.Thread(target=self.run_mongo_health, name="mongo-health", daemon=True).start()
+        # MongoDB writes run on a writer thread, off the event loop
+        self.persistence_queue = WriteBehindQueue(
+            self.write_messages,
+            maxsize=config.PERSIST_QUEUE_SIZE,
+            overflow=config.PERSIST_OVERFLOW,
+            block_timeout=config.PERSIST_BLOCK_TIMEOUT,
+            batch_size=config.PERSIST_BATCH_SIZE,
+            linger_ms=config.PERSIST_LINGER_MS
+        )
 
     def validate_session_file(self):
         """Validate session file before attempting connection.
@@ -89,62 +126,90 @@ class TelegramBotListener:
             diagnostics["error"] = f"Error validating session file: {e}"
             return False, diagnostics
 
-    def connect_mongodb(self):
-        """Connect to MongoDB."""
+    def connect_store(self, load_state=True):
+        """Connect to the configured message storage backend.
+        
+        Args:
+            load_state: Restore the price list and account status from storage
+                (False when reconnecting, as the in-memory state is newer)
+        """
+        # MONGODB_URI is optional - if not set, skip MongoDB connection
+        if self.store is None:
+            print(f"⚠ Warning: MONGODB_URI not set. Skipping MongoDB connection.")
+            print(f"⚠ Messages will only be printed to console, not saved to database.")
+            return False
+        
         try:
-            # MONGODB_URI is optional - if not set, skip MongoDB connection
-            if not config.MONGODB_URI:
-                print(f"⚠ Warning: MONGODB_URI not set. Skipping MongoDB connection.")
-                print(f"⚠ Messages will only be printed to console, not saved to database.")
-                self.mongo_client = None
-                self.mongo_collection = None
-                return False
-            
-            print(f"Connecting to MongoDB using URI...")
-            self.mongo_client = MongoClient(
-                config.MONGODB_URI,
-                serverSelectionTimeoutMS=5000
-            )
-            # Test connection
-            self.mongo_client.server_info()
-            self.mongo_db = self.mongo_client[config.MONGODB_DATABASE]
-            self.mongo_collection = self.mongo_db[config.MONGODB_COLLECTION]
-            print(f"✓ Successfully connected to MongoDB!")
-            print(f"  Database: {config.MONGODB_DATABASE}")
-            print(f"  Collection: {config.MONGODB_COLLECTION}")
+            print(f"Connecting to {self.store.name} storage...")
+            self.store.connect()
+            print(f"✓ Successfully connected to {self.store.describe()}")
+            if load_state:
+                self.load_price_list_store()
+                self.load_account_snapshot()
             return True
-        except ConnectionFailure as e:
-            print(f"✗ ERROR: Could not connect to MongoDB: {e}")
-            print("  Make sure MongoDB URI is correct and accessible")
+        except StorageUnavailable as e:
+            print(f"✗ ERROR: Could not connect to {self.store.name} storage: {e}")
+            print("  Make sure the storage settings (e.g. MONGODB_URI) are correct and accessible")
             print("  Messages will still be printed to console, but not saved to database.")
-            self.mongo_client = None
-            self.mongo_collection = None
+            self.store.close()
             return False
         except Exception as e:
-            print(f"✗ ERROR: MongoDB connection error: {e}")
+            print(f"✗ ERROR: {self.store.name} storage connection error: {e}")
             print(f"  Error type: {type(e).__name__}")
-            self.mongo_client = None
-            self.mongo_collection = None
+            self.store.close()
             return False
 
+    def load_price_list_store(self):
+        """Restore the latest persisted price list version from storage."""
+        try:
+            latest_doc = self.store.find_latest("price_list")
+            if latest_doc and latest_doc.get("price_list"):
+                self.price_list_store.load(
+                    latest_doc["price_list"],
+                    version=latest_doc.get("price_list_version"),
+                    message_id=latest_doc.get("message_id"),
+                    updated_at=latest_doc.get("raw_date")
+                )
+                print(f"  [Prices] Loaded price list version {self.price_list_store.version}")
+        except Exception as e:
+            print(f"  [Prices] Could not load latest price list: {e}")
+
+    def load_account_snapshot(self):
+        """Restore the latest persisted account status from storage."""
+        try:
+            latest_doc = self.store.find_latest("account_status")
+            if latest_doc and latest_doc.get("account_status"):
+                updated_at = None
+                if latest_doc.get("raw_date"):
+                    try:
+                        updated_at = datetime.fromisoformat(latest_doc["raw_date"])
+                    except ValueError:
+                        pass
+                self.account_snapshot.update(
+                    latest_doc["account_status"],
+                    message_id=latest_doc.get("message_id"),
+                    updated_at=updated_at
+                )
+                print(f"  [Account] Loaded account status from {self.account_snapshot.snapshot()['updatedAt']}")
+        except Exception as e:
+            print(f"  [Account] Could not load latest account status: {e}")
+
     async def initialize(self):
         """Initialize the Telegram client and authenticate."""
         start_time = datetime.now()
         print(f"[Init] Starting initialization at {start_time.strftime('%H:%M:%S')}")
         
-        # Step 1: Connect to MongoDB
+        # Step 1: Connect to storage (MongoDB unless STORAGE_BACKEND says otherwise)
         step_start = datetime.now()
-        print("[Init] Step 1/4: Connecting to MongoDB...")
+        print("[Init] Step 1/4: Connecting to storage...")
         try:
-            self.connect_mongodb()
+            self.connect_store()
             elapsed = (datetime.now() - step_start).total_seconds()
-            print(f"[Init] Step 1/4: MongoDB connection completed ({elapsed:.1f}s)")
+            print(f"[Init] Step 1/4: Storage connection completed ({elapsed:.1f}s)")
         except Exception as e:
             elapsed = (datetime.now() - step_start).total_seconds()
-            print(f"[Init] Step 1/4: MongoDB connection failed ({elapsed:.1f}s) - {e}")
-            print("⚠ Continuing without MongoDB - messages will only be printed to console")
-            self.mongo_client = None
-            self.mongo_collection = None
+            print(f"[Init] Step 1/4: Storage connection failed ({elapsed:.1f}s) - {e}")
+            print("⚠ Continuing without storage - messages will only be printed to console")
         
         # Step 2: Connect to Telegram
         step_start = datetime.now()
@@ -262,7 +327,11 @@ class TelegramBotListener:
         print(f"[Init] ✓ Initialization completed successfully in {total_elapsed:.1f}s")
 
     def extract_message_data(self, message):
-        """Extract message data for MongoDB storage."""
+        """Extract message data for MongoDB storage.
+        
+        message.text is re-rendered from entities on every access, so it is read once here.
+        """
+        text = message.text
         message_data = {
             "message_id": message.id,
             "date": message.date.isoformat() if message.date else datetime.now().isoformat(),
@@ -270,8 +339,10 @@ class TelegramBotListener:
             "chat_id": message.chat_id if hasattr(message, 'chat_id') else None,
             "message_type": "text",
             "media_type": None,
-            "text": message.text if message.text else "",
-            "raw_date": datetime.now().isoformat()
+            "text": text or "",
+            "raw_date": datetime.now().isoformat(),
+            # Set for MessageEdited updates
+            "edit_date": message.edit_date.isoformat() if getattr(message, "edit_date", None) else None
         }
         
         # Handle different media types
@@ -296,11 +367,18 @@ class TelegramBotListener:
         
         return message_data
 
-    def format_message(self, message):
-        """Format message for console output."""
+    def format_message(self, message, text=None):
+        """Format message for console output.
+        
+        Args:
+            message: Telethon message
+            text: Already extracted message text (read from message.text if None)
+        """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sender = "Bot"
-        content = message.text if message.text else "[Media/Sticker/Other]"
+        sender = "Bot (edited)" if getattr(message, "edit_date", None) else "Bot"
+        if text is None:
+            text = message.text
+        content = text if text else "[Media/Sticker/Other]"
         
         # Handle media messages
         if message.photo:
@@ -316,6 +394,14 @@ class TelegramBotListener:
         
         return f"[{timestamp}] {sender}: {content}"
 
+    def classify_message(self, text):
+        """Classify a bot message by cheap signatures so only one parser runs.
+        
+        Returns:
+            message_parser.MESSAGE_KIND_* or None for plain chatter.
+        """
+        return message_parser.classify_message(text)
+
     def extract_uc_bank_data(self, text):
         """Extract UC and BANK/PCS numbers from text lines."""
         # Pattern to match: "20 UC ⇨ 19 BANK" or "161 UC ⇨ 178 PCS"
@@ -343,718 +429,331 @@ class TelegramBotListener:
         
         Returns structured data or None if format doesn't match.
         """
-        if not text:
-            return None
-        
-        # Debug: Print what we're trying to parse
-        print(f"  [Debug] Parsing text: {text[:100]}...")
-        
-        # Clean the text - remove separator lines
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            # Skip separator lines and empty lines
-            if not line or re.match(r'^[▔═\-_]+$', line):
-                continue
-            cleaned_lines.append(line)
-        
-        account_status = {
-            "user": {"name": None},
-            "wallet": {},
-            "currency": "Tk"
-        }
-        
-        # Check if this looks like an account status message
-        # It should have NAME/DUE/BALANCE/DUE LIMIT fields
-        has_account_fields = False
-        for line in cleaned_lines:
-            line_lower = line.lower()
-            if any(field in line_lower for field in ['name', 'due', 'balance', 'limit']):
-                has_account_fields = True
-                break
-        
-        if not has_account_fields:
-            print(f"  [Debug] No account fields found in message")
-            return None
-        
-        # Process each line
-        for line in cleaned_lines:
-            # Check if line contains account information
-            # Handle both formats: "NAME : Mohammad Robayet" and "➪ Nᴀᴍᴇ : Mohammad Robayet"
-            if ':' not in line:
-                continue
-                
-            # Split by colon
-            parts = line.split(':', 1)
-            if len(parts) < 2:
-                continue
-            
-            field_name = parts[0].strip().lower()
-            field_value = parts[1].strip()
-            
-            print(f"  [Debug] Found field: '{field_name}' = '{field_value}'")
-            
-            # Handle name field
-            if 'name' in field_name:
-                # Extract just the name (remove any trailing numbers/currency)
-                name_match = re.search(r'([a-zA-Z\s]+)', field_value)
-                if name_match:
-                    account_status["user"]["name"] = name_match.group(1).strip()
-                    print(f"  [Debug] Extracted name: {account_status['user']['name']}")
-            
-            # Handle due field (not due limit)
-            elif 'due' in field_name and 'limit' not in field_name:
-                # Handle G9.0 -> 69.0 conversion (G might be typo for 6)
-                field_value = field_value.replace('G', '6').replace('g', '6')
-                value_match = re.search(r'([\d.]+)', field_value)
-                if value_match:
-                    try:
-                        account_status["wallet"]["due"] = float(value_match.group(1))
-                        print(f"  [Debug] Extracted due: {account_status['wallet']['due']}")
-                    except ValueError:
-                        print(f"  [Debug] Could not parse due value: {field_value}")
-            
-            # Handle balance field
-            elif 'balance' in field_name:
-                value_match = re.search(r'([\d.]+)', field_value)
-                if value_match:
-                    try:
-                        account_status["wallet"]["balance"] = float(value_match.group(1))
-                        print(f"  [Debug] Extracted balance: {account_status['wallet']['balance']}")
-                    except ValueError:
-                        print(f"  [Debug] Could not parse balance value: {field_value}")
-            
-            # Handle due limit field
-            elif 'due' in field_name and 'limit' in field_name:
-                value_match = re.search(r'([\d.]+)', field_value)
-                if value_match:
-                    try:
-                        account_status["wallet"]["dueLimit"] = float(value_match.group(1))
-                        print(f"  [Debug] Extracted dueLimit: {account_status['wallet']['dueLimit']}")
-                    except ValueError:
-                        print(f"  [Debug] Could not parse dueLimit value: {field_value}")
-        
-        # Check if we extracted a name
-        if account_status["user"]["name"]:
+        account_status = message_parser.parse_account_status(text)
+        if account_status:
             print(f"  [Debug] Successfully parsed account status for: {account_status['user']['name']}")
-            return account_status
-        
-        print(f"  [Debug] No name extracted, returning None")
-        return None
+        return account_status
+
     def parse_price_list(self, text):
         """Parse price list from bot response.
         
-        Expected format:
-        ☞ 20   🆄🅲  ➪  19  Bᴀɴᴋ
-        ☞ Weekly Lite  ➪ 40.0 Bᴀɴᴋ
-        ☞ Level Up-6   ➪ 35.0 Bᴀɴᴋ
-        ☞ Evo 3 Day   ➪ 66.0 Bᴀɴᴋ
-        
         Returns structured data with ucPriceList and specialPackages arrays, or None if format doesn't match.
         """
-        if not text:
-            return None
-        
-        uc_price_list = []
-        special_packages = []
-        
-        # Pattern for UC prices: ☞ 20   🆄🅲  ➪  19  Bᴀɴᴋ
-        # Match: ☞ followed by number, then 🆄🅲 (or UC), then ➪, then number, then Bᴀɴᴋ
-        # Handle both Unicode emoji (🆄🅲) and regular text (UC)
-        uc_pattern = r'☞\s*(\d+)\s*(?:🆄\s*🅲|🆄🅲|[UC]+)\s*➪\s*(\d+)\s*B[ᴀɴᴋANK]+'
-        uc_matches = re.findall(uc_pattern, text, re.IGNORECASE)
-        
-        for match in uc_matches:
-            try:
-                amount = int(match[0])
-                price = int(match[1])
-                uc_price_list.append({
-                    "type": "uc",
-                    "amount": amount,
-                    "price": price,
-                    "payment": "bank"
-                })
-            except (ValueError, IndexError):
-                continue
-        
-        # Pattern for Weekly Lite: ☞ Weekly Lite  ➪ 40.0 Bᴀɴᴋ
-        weekly_pattern = r'☞\s*Weekly\s+Lite\s*➪\s*([\d.]+)\s*B[ᴀɴᴋANK]+'
-        weekly_match = re.search(weekly_pattern, text, re.IGNORECASE)
-        if weekly_match:
-            try:
-                price = float(weekly_match.group(1))
-                special_packages.append({
-                    "type": "weekly",
-                    "name": "Weekly Lite",
-                    "price": price,
-                    "payment": "bank"
-                })
-            except (ValueError, IndexError):
-                pass
-        
-        # Pattern for Level Up packages: ☞ Level Up-6   ➪ 35.0 Bᴀɴᴋ
-        level_up_pattern = r'☞\s*Level\s+Up-(\d+)\s*➪\s*([\d.]+)\s*B[ᴀɴᴋANK]+'
-        level_up_matches = re.findall(level_up_pattern, text, re.IGNORECASE)
-        for match in level_up_matches:
-            try:
-                level = int(match[0])
-                price = float(match[1])
-                special_packages.append({
-                    "type": "level-up",
-                    "name": f"Level Up {level}",
-                    "price": price,
-                    "payment": "bank"
-                })
-            except (ValueError, IndexError):
-                continue
-        
-        # Pattern for Evo packages: ☞ Evo 3 Day   ➪ 66.0 Bᴀɴᴋ
-        evo_pattern = r'☞\s*Evo\s+(\d+)\s+Day\s*➪\s*([\d.]+)\s*B[ᴀɴᴋANK]+'
-        evo_matches = re.findall(evo_pattern, text, re.IGNORECASE)
-        for match in evo_matches:
-            try:
-                days = int(match[0])
-                price = float(match[1])
-                special_packages.append({
-                    "type": "evo",
-                    "name": f"Evo {days} Day",
-                    "price": price,
-                    "payment": "bank"
-                })
-            except (ValueError, IndexError):
-                continue
-        
-        # Only return if we found at least one UC price or special package
-        if uc_price_list or special_packages:
-            return {
-                "ucPriceList": uc_price_list,
-                "specialPackages": special_packages
-            }
-        
-        return None
+        return message_parser.parse_price_list(text)
 
     def parse_topup_result(self, text):
-        """Parse TOPUP DONE message from bot response.
-        
-        Expected format:
-        ✅ Monthly 💎 TOPUP DONE
-        ┌──────────────────────────┐
-        │ Order ID : #2237
-        │ User   : ツOɴʟʏ⸙ᴢ!xᴜ모
-        │ UID    : 2194747891
-        └──────────────────────────┘
-        BDMB-S-S-02536618 5494-2393-2291-4243  ✅ Success
-        BDMB-S-S-02539602 1251-3736-3127-9172  ✅ Success
-        ...
-        ┌──────────────────────────┐
-        │ Total  : 2934.0৳ ৳ (0.5৳ Fee/Unit)
-        │ Monthly  : 4x
-        │ Baki   : 2934.00৳
-        │ Due    : 0.00 + 2934.00 = 2934.00৳
-        │ 
-        │ Duration : 5.47s
-        └── 🤖 Powered by UcBot ───┘
+        """Parse TOPUP DONE or Limit Over message from bot response.
+        
+        Field extraction is table-driven, see message_parser.TOPUP_DONE_SPEC.
         
         Returns structured data or None if format doesn't match.
         """
-        if not text:
+        topup_result = message_parser.parse_topup_result(text)
+        if topup_result is None:
+            if text and "TOPUP DONE" in text.upper():
+                print(f"  [Debug] Incomplete TOPUP DONE data, returning None")
             return None
         
-        # Check if this is a TOPUP DONE message or Limit Over message
-        is_topup_done = "TOPUP DONE" in text.upper()
-        is_limit_over = "LIMIT OVER" in text.upper() or "🚫" in text
-        
-        if not is_topup_done and not is_limit_over:
-            return None
+        if topup_result["status"] == "failed":
+            print(f"  [Debug] Parsed Limit Over message (UID: {topup_result['user']['uid']})")
+        else:
+            used_uc = topup_result["payment"]["usedUc"]
+            card_count = len(used_uc["codes"]) if isinstance(used_uc, dict) else 0
+            print(f"  [Debug] Successfully parsed TOPUP DONE for order #{topup_result['orderId']} ({card_count} UC cards)")
+        return topup_result
+
+    def remove_emojis_except_uc(self, text):
+        """Remove all emojis from text except 🆄🅲 emoji."""
+        return message_parser.remove_emojis_except_uc(text)
+
+    def build_mongo_document(self, message_data, parsed_message):
+        """Build the document stored for a message.
         
-        if is_limit_over:
-            print(f"  [Debug] Parsing Limit Over message...")
-            # For Limit Over, return minimal structure with failed status
-            topup_result = {
-                "status": "failed",
-                "orderId": None,
-                "user": {
-                    "name": None,
-                    "uid": None
-                }
-            }
-            
-            # Try to extract Order ID if present
-            order_id_match = re.search(r'Order\s+ID\s*:\s*#?(\d+)', text, re.IGNORECASE)
-            if order_id_match:
-                try:
-                    topup_result["orderId"] = int(order_id_match.group(1))
-                    print(f"  [Debug] Extracted orderId: {topup_result['orderId']}")
-                except ValueError:
-                    pass
-            
-            # Extract User name: User   : ツOɴʟʏ⸙ᴢ!xᴜ모
-            user_match = re.search(r'User\s*:\s*(.+)', text, re.IGNORECASE)
-            if user_match:
-                user_name = user_match.group(1).strip()
-                # Remove any trailing box drawing characters or separators
-                user_name = re.sub(r'[└┘┌┐│─━┃┏┓┗┛├┤┬┴┼╭╮╯╰╱╲╳]+', '', user_name).strip()
-                if user_name:
-                    topup_result["user"]["name"] = user_name
-                    print(f"  [Debug] Extracted user name: {topup_result['user']['name']}")
-            
-            # Extract UID: UID    : 2194747891
-            uid_match = re.search(r'UID\s*:\s*(\d+)', text, re.IGNORECASE)
-            if uid_match:
-                topup_result["user"]["uid"] = uid_match.group(1)
-                print(f"  [Debug] Extracted UID: {topup_result['user']['uid']}")
+        Args:
+            message_data: Dict from extract_message_data()
+            parsed_message: message_parser.ParsedMessage of the message
             
-            # Return structure for Limit Over with UID
-            return topup_result
-        
-        print(f"  [Debug] Parsing TOPUP DONE message...")
-        
-        topup_result = {
-            "status": "success",
-            "orderId": None,
-            "user": {
-                "name": None,
-                "uid": None
-            },
-            "product": {
-                "type": "diamond",
-                "quantity": None,
-                "unitPrice": None
-            },
-            "payment": {
-                "usedUc": [],
-                "feePerUnit": None,
-                "total": None,
-                "paid": None,
-                "due": None
-            },
-            "meta": {
-                "durationSec": None,
-                "provider": "UcBot"
-            }
+        Returns:
+            (document, update_fields): the full document for a new message, and
+            the fields to $set if a document for this message_id already exists
+            (empty if there is nothing to update)
+        """
+        topup_result = parsed_message.topup_result
+        account_status = parsed_message.account_status
+        price_list = parsed_message.price_list
+        
+        # Cleaned text without emojis (except 🆄🅲), or None if structured data exists
+        message_text = parsed_message.cleaned_text
+        if parsed_message.has_structured_data:
+            message_text = None
+        
+        document = {
+            "message_id": message_data["message_id"],
+            "date": message_data["date"],
+            "text": message_text,  # Will be None if structured data exists, otherwise cleaned text without emojis (except 🆄🅲)
+            "sender_id": message_data["sender_id"],
+            "chat_id": message_data["chat_id"],
+            "message_type": message_data["message_type"],
+            "media_type": message_data.get("media_type"),
+            "raw_date": message_data["raw_date"]
         }
+        update_fields = {}
         
-        # Extract Order ID: Order ID : #2237
-        order_id_match = re.search(r'Order\s+ID\s*:\s*#?(\d+)', text, re.IGNORECASE)
-        if order_id_match:
-            try:
-                topup_result["orderId"] = int(order_id_match.group(1))
-                print(f"  [Debug] Extracted orderId: {topup_result['orderId']}")
-            except ValueError:
-                pass
-        
-        # Extract User name: User   : ツOɴʟʏ⸙ᴢ!xᴜ모
-        user_match = re.search(r'User\s*:\s*(.+)', text, re.IGNORECASE)
-        if user_match:
-            user_name = user_match.group(1).strip()
-            # Remove any trailing box drawing characters or separators
-            user_name = re.sub(r'[└┘┌┐│─━┃┏┓┗┛├┤┬┴┼╭╮╯╰╱╲╳]+', '', user_name).strip()
-            if user_name:
-                topup_result["user"]["name"] = user_name
-                print(f"  [Debug] Extracted user name: {topup_result['user']['name']}")
-        
-        # Extract UID: UID    : 2194747891
-        uid_match = re.search(r'UID\s*:\s*(\d+)', text, re.IGNORECASE)
-        if uid_match:
-            topup_result["user"]["uid"] = uid_match.group(1)
-            print(f"  [Debug] Extracted UID: {topup_result['user']['uid']}")
-        
-        # Extract UC Cards: 
-        # BDMB-S-S-02536618 5494-2393-2291-4243  ✅ Success
-        # BDMB-T-S-01458610 1146-2271-5996-5120  ✅ Success
-        # UPBD-G-S-03504383 2137-4322-5341-2648  ✅ Success
-        # Parse line by line to find UC card lines
-        # Supports multiple prefixes: BDMB, UPBD, and any 4-letter prefix
-        uc_cards = []
-        lines = text.split('\n')
-        
-        print(f"  [Debug] Looking for UC cards in {len(lines)} lines...")
-        
-        # More flexible pattern to match UC card codes
-        # Pattern breakdown:
-        # - (BDMB|UPBD|[A-Z]{4}) : BDMB, UPBD, or any 4 uppercase letters
-        # - [-\w]+ : code part with dashes and alphanumeric (e.g., -T-S-01458610)
-        # - \s+ : one or more spaces
-        # - [\d-]+ : card number with dashes (e.g., 1146-2271-5996-5120)
-        uc_card_pattern = r'((?:BDMB|UPBD|[A-Z]{4})[-\w]+\s+[\d-]+)'
-        
-        for line_num, line in enumerate(lines, 1):
-            original_line = line
-            line = line.strip()
-            
-            # Check if line contains UC card indicators
-            has_uc_prefix = bool(re.search(r'(BDMB|UPBD|[A-Z]{4})[-\w]+\s+[\d-]+', line, re.IGNORECASE))
-            has_success = '✅' in line or '✓' in line or 'Success' in line.upper()
-            
-            if has_uc_prefix:
-                print(f"  [Debug] Line {line_num} contains UC prefix: {line[:80]}")
-                
-                # Try to extract UC card code
-                card_match = re.search(uc_card_pattern, line, re.IGNORECASE)
-                if card_match:
-                    card_str = card_match.group(1)
-                    # Normalize spaces
-                    card_str = re.sub(r'\s+', ' ', card_str.strip())
-                    if card_str not in uc_cards:  # Avoid duplicates
-                        uc_cards.append(card_str)
-                        print(f"  [Debug]   Found UC card: {card_str}")
-                else:
-                    print(f"  [Debug]   Pattern didn't match line: {line[:80]}")
-        
-        # Also try searching entire text if line-by-line didn't work
-        if not uc_cards:
-            print(f"  [Debug] Line-by-line search found nothing, trying full text search...")
-            # More comprehensive pattern for full text search
-            full_text_pattern = r'((?:BDMB|UPBD|[A-Z]{4})[-\w]+\s+[\d-]+)'
-            all_matches = re.findall(full_text_pattern, text, re.IGNORECASE)
-            if all_matches:
-                print(f"  [Debug] Found {len(all_matches)} potential UC cards in full text")
-                for match in all_matches:
-                    card_str = re.sub(r'\s+', ' ', match.strip())
-                    if card_str not in uc_cards:
-                        uc_cards.append(card_str)
-                        print(f"  [Debug]   Found UC card: {card_str}")
-        
-        if uc_cards:
-            # Convert string array to array of objects
-            # Each UC card will be an object with "code" field
-            uc_card_objects = []
-            for card_str in uc_cards:
-                uc_card_objects.append({
-                    "code": card_str
-                })
-            
-            # usedUc will be an object containing an array
-            topup_result["payment"]["usedUc"] = {
-                "codes": uc_card_objects
-            }
-            print(f"  [Debug] Extracted {len(uc_card_objects)} UC cards")
-            for i, card_obj in enumerate(uc_card_objects, 1):
-                print(f"  [Debug]   Card {i}: {card_obj['code']}")
-        else:
-            print(f"  [Debug] No UC cards found in message")
-            print(f"  [Debug] Message preview (first 500 chars): {text[:500]}")
+        # An edit replaces the stored text (cleared below if structured data arrived)
+        if message_data.get("edit_date"):
+            document["edit_date"] = message_data["edit_date"]
+            update_fields["text"] = message_text
+            update_fields["edit_date"] = message_data["edit_date"]
         
-        # Extract Total: Total  : 2934.0৳ ৳ (0.5৳ Fee/Unit)
-        total_match = re.search(r'Total\s*:\s*([\d.]+)', text, re.IGNORECASE)
-        if total_match:
-            try:
-                topup_result["payment"]["total"] = float(total_match.group(1))
-                print(f"  [Debug] Extracted total: {topup_result['payment']['total']}")
-            except ValueError:
-                pass
-        
-        # Extract Fee per Unit: (0.5৳ Fee/Unit)
-        fee_match = re.search(r'\(([\d.]+)\s*[৳Tk]+\s*Fee/Unit\)', text, re.IGNORECASE)
-        if fee_match:
-            try:
-                topup_result["payment"]["feePerUnit"] = float(fee_match.group(1))
-                print(f"  [Debug] Extracted feePerUnit: {topup_result['payment']['feePerUnit']}")
-            except ValueError:
-                pass
-        
-        # Extract Monthly count: Monthly  : 4x
-        monthly_match = re.search(r'Monthly\s*:\s*(\d+)x?', text, re.IGNORECASE)
-        if monthly_match:
-            try:
-                quantity = int(monthly_match.group(1))
-                topup_result["product"]["quantity"] = quantity
-                print(f"  [Debug] Extracted quantity: {topup_result['product']['quantity']}")
-                
-                # Calculate unitPrice from total and quantity
-                if topup_result["payment"]["total"] and quantity > 0:
-                    topup_result["product"]["unitPrice"] = topup_result["payment"]["total"] / quantity
-                    print(f"  [Debug] Calculated unitPrice: {topup_result['product']['unitPrice']}")
-            except (ValueError, ZeroDivisionError):
-                pass
-        
-        # Extract Baki: Baki   : 2934.00৳
-        baki_match = re.search(r'Baki\s*:\s*([\d.]+)', text, re.IGNORECASE)
-        if baki_match:
-            try:
-                baki = float(baki_match.group(1))
-                # Baki is the remaining amount, which is the same as due
-                topup_result["payment"]["due"] = baki
-                print(f"  [Debug] Extracted due (from Baki): {topup_result['payment']['due']}")
-            except ValueError:
-                pass
-        
-        # Extract Due: Due    : 0.00 + 2934.00 = 2934.00৳
-        # This format shows: previous_due + new_due = total_due
-        due_match = re.search(r'Due\s*:\s*([\d.]+)\s*\+\s*([\d.]+)\s*=\s*([\d.]+)', text, re.IGNORECASE)
-        if due_match:
-            try:
-                # Use the final due amount (after =)
-                total_due = float(due_match.group(3))
-                topup_result["payment"]["due"] = total_due
-                print(f"  [Debug] Extracted due: {topup_result['payment']['due']}")
-            except ValueError:
-                pass
-        
-        # Calculate paid amount: paid = total - due
-        if topup_result["payment"]["total"] is not None and topup_result["payment"]["due"] is not None:
-            topup_result["payment"]["paid"] = topup_result["payment"]["total"] - topup_result["payment"]["due"]
-            print(f"  [Debug] Calculated paid: {topup_result['payment']['paid']}")
-        
-        # Extract Duration: Duration : 5.47s
-        duration_match = re.search(r'Duration\s*:\s*([\d.]+)\s*s', text, re.IGNORECASE)
-        if duration_match:
-            try:
-                topup_result["meta"]["durationSec"] = float(duration_match.group(1))
-                print(f"  [Debug] Extracted duration: {topup_result['meta']['durationSec']}s")
-            except ValueError:
-                pass
+        if topup_result:
+            document["topupResult"] = update_fields["topupResult"] = topup_result
+            update_fields["text"] = None
         
-        # Check if we have at least orderId and user info to consider this a valid topup result
-        if topup_result["orderId"] and topup_result["user"]["name"]:
-            print(f"  [Debug] Successfully parsed TOPUP DONE for order #{topup_result['orderId']}")
-            return topup_result
+        if account_status:
+            document["account_status"] = update_fields["account_status"] = account_status
+            update_fields["text"] = None
         
-        print(f"  [Debug] Incomplete TOPUP DONE data, returning None")
-        return None
+        if price_list:
+            version = message_data.get("price_list_version", self.price_list_store.version)
+            document["price_list"] = update_fields["price_list"] = price_list
+            document["price_list_version"] = update_fields["price_list_version"] = version
+            update_fields["text"] = None
+        
+        return document, update_fields
 
-    def remove_emojis_except_uc(self, text):
-        """Remove all emojis from text except 🆄🅲 emoji.
+    def log_saved_document(self, action, message_id, fields):
+        """Print what was stored for a message (action: "Saved" or "Updated")."""
+        print(f"  [MongoDB] {action} message_id {message_id}")
+        
+        topup_result = fields.get("topupResult")
+        if topup_result:
+            print(f"    - topupResult: {topup_result.get('status', 'N/A')}"
+                  f" | Order ID: #{topup_result.get('orderId', 'N/A')}"
+                  f" | UID: {(topup_result.get('user') or {}).get('uid', 'N/A')}")
+            payment = topup_result.get('payment') or {}
+            if payment.get('total'):
+                print(f"    - Total: {payment['total']}৳")
+            used_uc = payment.get('usedUc')
+            if isinstance(used_uc, dict) and 'codes' in used_uc:
+                print(f"    - UC Cards: {len(used_uc['codes'])}")
+            elif isinstance(used_uc, list):
+                print(f"    - UC Cards: {len(used_uc)}")
+        
+        account_status = fields.get("account_status")
+        if account_status:
+            wallet = account_status.get('wallet', {})
+            print(f"    - account_status: {account_status['user']['name']}"
+                  f" | Due: {wallet.get('due', 'N/A')} | Balance: {wallet.get('balance', 'N/A')}"
+                  f" | Due Limit: {wallet.get('dueLimit', 'N/A')}")
+        
+        price_list = fields.get("price_list")
+        if price_list:
+            print(f"    - price_list (version {fields.get('price_list_version')}):"
+                  f" {len(price_list.get('ucPriceList', []))} UC prices,"
+                  f" {len(price_list.get('specialPackages', []))} special packages")
+
+    def build_upserts(self, items):
+        """Turn queued messages into upsert records, one per message_id.
+        
+        Writes for the same message_id (e.g. a message and its edit) are merged.
         
         Args:
-            text: Input text that may contain emojis
-            
+            items: list of (message_data, parsed_message) tuples; parsed_message
+                may be None (parsed here from message_data["text"])
+                
         Returns:
-            Text with all emojis removed except 🆄 (U+1F194) and 🅲 (U+1F172)
+            list of {"message_id", "set": fields to $set, "document": full document}
         """
-        if not text:
-            return text
-        
-        # Unicode ranges for emojis (comprehensive pattern)
-        # This covers most emoji ranges in Unicode
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U00002702-\U000027B0"  # dingbats
-            "\U000024C2-\U0001F251"   # enclosed characters
-            "\U0001F900-\U0001F9FF"  # supplemental symbols and pictographs
-            "\U0001FA00-\U0001FA6F"  # chess symbols
-            "\U0001FA70-\U0001FAFF"  # symbols and pictographs extended-A
-            "\U00002600-\U000026FF"  # miscellaneous symbols
-            "\U00002700-\U000027BF"  # dingbats
-            "\U0001F018-\U0001F270"  # various asian characters
-            "\U0001F300-\U0001F5FF"  # misc symbols and pictographs
-            "\U0001F680-\U0001F6FF"  # transport and map
-            "\U0001F1E6-\U0001F1FF"  # regional indicator symbols
-            "\U0001F191-\U0001F19A"  # enclosed characters
-            "\U0001F200-\U0001F2FF"  # enclosed CJK letters and months
-            "\U0001F300-\U0001F5FF"  # misc symbols
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F680-\U0001F6FF"  # transport and map
-            "\U00002600-\U000026FF"  # misc symbols
-            "\U00002700-\U000027BF"  # dingbats
-            "\U0001F900-\U0001F9FF"  # supplemental symbols
-            "\U0001FA00-\U0001FA6F"  # chess symbols
-            "\U0001FA70-\U0001FAFF"  # symbols extended-A
-            "]+", 
-            flags=re.UNICODE
-        )
+        upserts = {}
+        for message_data, parsed_message in items:
+            if parsed_message is None:
+                parsed_message = message_parser.parse_message(message_data["message_id"], message_data.get("text", ""))
+            document, update_fields = self.build_mongo_document(message_data, parsed_message)
+            message_id = message_data["message_id"]
+            if message_id in upserts:
+                upserts[message_id]["set"].update(update_fields)
+            else:
+                upserts[message_id] = {"message_id": message_id, "set": update_fields, "document": document}
+        return list(upserts.values())
+
+    def write_upserts(self, upserts, ordered=False):
+        """Write upsert records to the store, update the topup roll-ups and log what was saved.
         
-        # Temporarily replace 🆄 and 🅲 with placeholders
-        placeholder_uc = "___UC_EMOJI___"
-        placeholder_c = "___C_EMOJI___"
+        Roll-ups count each message once, so writing the same records again
+        (an edit, a spool replay after a failure) does not count them twice.
         
-        # Replace 🆄 and 🅲 with placeholders
-        text = text.replace('🆄', placeholder_uc)
-        text = text.replace('🅲', placeholder_c)
+        Args:
+            upserts: Records from build_upserts()
+            ordered: Apply in order (spool replay, where a message_id may repeat)
+            
+        Returns:
+            list of ids of new documents
+            
+        Raises:
+            StorageUnavailable while the backend is unreachable (other store errors as raised)
+        """
+        inserted_ids = self.store.write_upserts(upserts, ordered=ordered)
+        
+        rollup_entries = []
+        for upsert in upserts:
+            topup_result = upsert["set"].get("topupResult")
+            if topup_result and upsert["document"].get("raw_date"):
+                rollup_entries.extend(rollups.rollup_entries(topup_result, upsert["message_id"], upsert["document"]["raw_date"]))
+        if rollup_entries:
+            self.store.increment_rollups(rollup_entries)
+        
+        for index, upsert in enumerate(upserts):
+            if index in inserted_ids:
+                self.log_saved_document("Saved", upsert["message_id"], upsert["document"])
+            elif upsert["set"]:
+                self.log_saved_document("Updated", upsert["message_id"], upsert["set"])
+            else:
+                print(f"  [MongoDB] Message {upsert['message_id']} already exists, no update needed")
+        if len(upserts) > 1:
+            print(f"  [MongoDB] Wrote {len(upserts)} documents in one batch")
         
-        # Remove all other emojis
-        text = emoji_pattern.sub('', text)
+        return list(inserted_ids.values())
+
+    def save_batch_to_mongodb(self, items):
+        """Save several messages to the store with one batch of upserts.
         
-        # Restore 🆄 and 🅲
-        text = text.replace(placeholder_uc, '🆄')
-        text = text.replace(placeholder_c, '🅲')
+        While MongoDB is unreachable, the circuit breaker is open or older writes
+        are still spooled, the batch is appended to the on-disk spool instead and
+        replayed in order by the health thread.
         
-        return text
-
-    def save_to_mongodb(self, message_data):
-        """Save message data to MongoDB - all text in one document per message_id."""
-        if self.mongo_collection is None:
-            print("  [MongoDB] Collection not available, skipping save")
-            return None
-            
-        try:
-            # Check if message already exists
-            existing = self.mongo_collection.find_one({"message_id": message_data["message_id"]})
-            
-            # Parse account status, price list, and topup result if present
-            account_status = None
-            price_list = None
-            topup_result = None
-            
-            # Check if topup_result was already parsed in message_handler
-            if "_parsed_topup_result" in message_data:
-                topup_result = message_data["_parsed_topup_result"]
-                print(f"  [MongoDB] Using pre-parsed topup_result")
-            
-            message_text = message_data.get("text", "")
-            
-            if message_text:
-                # Remove emojis except 🆄🅲 before parsing and saving
-                message_text = self.remove_emojis_except_uc(message_text)
-                
-                # Try to parse topup result if not already parsed
-                if not topup_result:
-                    topup_result = self.parse_topup_result(message_text)
-                
-                # Try to parse account status
-                account_status = self.parse_account_status(message_text)
-                
-                # Try to parse price list
-                price_list = self.parse_price_list(message_text)
-                
-                # If any structured data is found, set text to None
-                if topup_result or account_status or price_list:
-                    print(f"  [MongoDB] Structured data found, setting text to None")
-                    message_text = None
-        
-            if existing:
-                # Message already exists - update with structured data
-                update_fields = {}
-                
-                if topup_result:
-                    update_fields["topupResult"] = topup_result
-                    update_fields["text"] = None
-                    print(f"  [MongoDB] Will update with topupResult")
-                    
-                if account_status:
-                    update_fields["account_status"] = account_status
-                    update_fields["text"] = None
-                    print(f"  [MongoDB] Will update with account_status")
-                    
-                if price_list:
-                    update_fields["price_list"] = price_list
-                    update_fields["text"] = None
-                    print(f"  [MongoDB] Will update with price_list")
+        Args:
+            items: list of (message_data, parsed_message) tuples; parsed_message
+                may be None (parsed here from message_data["text"])
                 
-                if update_fields:
-                    update_result = self.mongo_collection.update_one(
-                        {"message_id": message_data["message_id"]},
-                        {"$set": update_fields}
-                    )
-                    if update_result.modified_count > 0:
-                        if topup_result:
-                            print(f"  [MongoDB] Updated message_id {message_data['message_id']} with topupResult:")
-                            print(f"    - Status: {topup_result.get('status', 'N/A')}")
-                            if topup_result.get('orderId'):
-                                print(f"    - Order ID: #{topup_result['orderId']}")
-                            if 'user' in topup_result and topup_result['user']:
-                                user_name = topup_result['user'].get('name', 'N/A')
-                                user_uid = topup_result['user'].get('uid', 'N/A')
-                                print(f"    - User: {user_name} (UID: {user_uid})")
-                            if 'payment' in topup_result and topup_result['payment']:
-                                payment = topup_result['payment']
-                                if payment.get('total'):
-                                    print(f"    - Total: {payment['total']}৳")
-                                if 'usedUc' in payment:
-                                    used_uc = payment['usedUc']
-                                    if isinstance(used_uc, dict) and 'codes' in used_uc:
-                                        print(f"    - UC Cards: {len(used_uc['codes'])}")
-                                    elif isinstance(used_uc, list):
-                                        print(f"    - UC Cards: {len(used_uc)}")
-                        
-                        if account_status:
-                            print(f"  [MongoDB] Updated message_id {message_data['message_id']} with account_status:")
-                            print(f"    - Name: {account_status['user']['name']}")
-                            if 'due' in account_status.get('wallet', {}):
-                                print(f"    - Due: {account_status['wallet']['due']}")
-                            if 'balance' in account_status.get('wallet', {}):
-                                print(f"    - Balance: {account_status['wallet']['balance']}")
-                            if 'dueLimit' in account_status.get('wallet', {}):
-                                print(f"    - Due Limit: {account_status['wallet']['dueLimit']}")
-                        
-                        if price_list:
-                            uc_count = len(price_list.get("ucPriceList", []))
-                            pkg_count = len(price_list.get("specialPackages", []))
-                            print(f"  [MongoDB] Updated message_id {message_data['message_id']} with price_list:")
-                            print(f"    - UC Prices: {uc_count}")
-                            print(f"    - Special Packages: {pkg_count}")
-                    
-                    return [existing.get("_id")]
-                else:
-                    print(f"  [MongoDB] Message already exists, no update needed")
-                    return None
-            
-            # Create new document
-            document = {
-                "message_id": message_data["message_id"],
-                "date": message_data["date"],
-                "text": message_text,  # Will be None if structured data exists, otherwise cleaned text without emojis (except 🆄🅲)
-                "sender_id": message_data["sender_id"],
-                "chat_id": message_data["chat_id"],
-                "message_type": message_data["message_type"],
-                "media_type": message_data.get("media_type"),
-                "raw_date": message_data["raw_date"]
-            }
-            
-            # Add topup result if found
-            if topup_result:
-                document["topupResult"] = topup_result
-                print(f"  [MongoDB] Saving topupResult:")
-                print(f"    - Status: {topup_result.get('status', 'N/A')}")
-                if topup_result.get('orderId'):
-                    print(f"    - Order ID: #{topup_result['orderId']}")
-                if 'user' in topup_result and topup_result['user']:
-                    user_name = topup_result['user'].get('name', 'N/A')
-                    user_uid = topup_result['user'].get('uid', 'N/A')
-                    print(f"    - User: {user_name} (UID: {user_uid})")
-                if 'payment' in topup_result and topup_result['payment']:
-                    payment = topup_result['payment']
-                    if payment.get('total'):
-                        print(f"    - Total: {payment['total']}৳")
-                    if 'usedUc' in payment:
-                        used_uc = payment['usedUc']
-                        if isinstance(used_uc, dict) and 'codes' in used_uc:
-                            print(f"    - UC Cards: {len(used_uc['codes'])}")
-                        elif isinstance(used_uc, list):
-                            print(f"    - UC Cards: {len(used_uc)}")
-                if 'meta' in topup_result and topup_result['meta']:
-                    if topup_result['meta'].get('durationSec'):
-                        print(f"    - Duration: {topup_result['meta']['durationSec']}s")
+        Returns:
+            list of ids of new documents, or None if nothing was written
+        """
+        try:
+            upserts = self.build_upserts(items)
             
-            # Add account status if found
-            if account_status:
-                document["account_status"] = account_status
-                print(f"  [MongoDB] Saving account_status:")
-                print(f"    - Name: {account_status['user']['name']}")
-                if 'due' in account_status.get('wallet', {}):
-                    print(f"    - Due: {account_status['wallet']['due']}")
-                if 'balance' in account_status.get('wallet', {}):
-                    print(f"    - Balance: {account_status['wallet']['balance']}")
-                if 'dueLimit' in account_status.get('wallet', {}):
-                    print(f"    - Due Limit: {account_status['wallet']['dueLimit']}")
+            # Spooled writes go first so a message's updates stay in order
+            if self.spool is not None and (
+                    not self.store.connected or len(self.spool) or not self.mongo_breaker.allow_request()):
+                self.spool.append(upserts)
+                print(f"  [Spool] MongoDB unavailable or replay pending, spooled {len(upserts)} message(s) ({len(self.spool)} pending)")
+                return None
             
-            # Add price list if found
-            if price_list:
-                document["price_list"] = price_list
-                uc_count = len(price_list.get("ucPriceList", []))
-                pkg_count = len(price_list.get("specialPackages", []))
-                print(f"  [MongoDB] Saving price_list:")
-                print(f"    - UC Prices: {uc_count}")
-                print(f"    - Special Packages: {pkg_count}")
+            if self.store is None or not self.store.connected:
+                print(f"  [MongoDB] Storage not available, skipping save of {len(items)} message(s)")
+                return None
             
-            # Insert into MongoDB
-            result = self.mongo_collection.insert_one(document)
-            print(f"  [MongoDB] Saved message_id {message_data['message_id']} to MongoDB")
+            if self.spool is None and not self.mongo_breaker.allow_request():
+                print(f"  [MongoDB] Circuit breaker open, skipping save of {len(items)} message(s)")
+                return None
             
-            return [result.inserted_id]
+            try:
+                inserted_ids = self.write_upserts(upserts)
+                self.mongo_breaker.record_success()
+                return inserted_ids
+            except StorageUnavailable as e:
+                self.mongo_breaker.record_failure(e)
+                if self.spool is None:
+                    raise
+                self.spool.append(upserts)
+                print(f"  [Spool] MongoDB unreachable ({e}), spooled {len(upserts)} message(s) ({len(self.spool)} pending)")
+                return None
             
         except Exception as e:
-            print(f"  [MongoDB] ERROR saving: {e}")
+            print(f"  [MongoDB] ERROR saving batch of {len(items)} message(s): {e}")
             import traceback
             traceback.print_exc()
             return None
 
+    def replay_spool(self):
+        """Write spooled messages to MongoDB in ordered bulk batches, oldest first.
+        
+        Returns:
+            Number of messages replayed (stops early if MongoDB fails again)
+        """
+        replayed = 0
+        while self.store.connected:
+            last_id, upserts = self.spool.read_batch(config.SPOOL_REPLAY_BATCH)
+            if not upserts:
+                break
+            try:
+                self.write_upserts(upserts, ordered=True)
+            except StorageUnavailable as e:
+                self.mongo_breaker.record_failure(e)
+                print(f"  [Spool] Replay interrupted, MongoDB unreachable: {e}")
+                break
+            self.spool.delete_through(last_id)
+            replayed += len(upserts)
+        if replayed:
+            print(f"  [Spool] Replayed {replayed} message(s) to MongoDB ({len(self.spool)} pending)")
+        return replayed
+
+    def store_available(self):
+        """True if storage is connected and the circuit breaker is closed (lookups will not stall)."""
+        return self.store is not None and self.store.connected and self.mongo_breaker.is_closed
+
+    def store_lookup(self, lookup, *args, **kwargs):
+        """Call a store method and record the outcome on the circuit breaker.
+        
+        Lookups open the breaker like failed writes do, so API reads stop
+        waiting out the server selection timeout once storage is down.
+        
+        Raises:
+            StorageUnavailable: Storage could not be reached
+        """
+        try:
+            result = lookup(*args, **kwargs)
+        except StorageUnavailable as e:
+            self.mongo_breaker.record_failure(e)
+            raise
+        self.mongo_breaker.record_success()
+        return result
+
+    def probe_mongodb(self):
+        """Ping MongoDB once and record the outcome on the circuit breaker.
+        
+        Returns:
+            True if the ping succeeded
+        """
+        try:
+            self.store.ping()
+        except StorageUnavailable as e:
+            self.mongo_breaker.record_failure(e)
+            print(f"  [Health] MongoDB ping failed: {e}")
+            return False
+        self.mongo_breaker.record_success()
+        return True
+
+    def run_mongo_health(self):
+        """Health thread: reconnect or probe MongoDB while it is failing, then drain the spool."""
+        while not self.mongo_health_stop.wait(config.SPOOL_RETRY_SECONDS):
+            try:
+                if not self.store.connected:
+                    if not len(self.spool):
+                        continue
+                    print(f"  [Spool] {len(self.spool)} message(s) pending, reconnecting to MongoDB...")
+                    # Keep the in-memory state; it is newer than what MongoDB has
+                    if not self.connect_store(load_state=False):
+                        continue
+                    self.mongo_breaker.record_success()
+                elif not self.mongo_breaker.is_closed:
+                    # Probe only once the breaker's reset timeout has passed
+                    if not self.mongo_breaker.allow_request() or not self.probe_mongodb():
+                        continue
+                if len(self.spool):
+                    self.replay_spool()
+            except Exception as e:
+                print(f"  [Health] MongoDB health check error: {e}")
+
+    def save_to_mongodb(self, message_data, parsed_message=None):
+        """Save message data to the store - all text in one document per message_id.
+        
+        Args:
+            message_data: Dict from extract_message_data()
+            parsed_message: message_parser.ParsedMessage built once by message_handler
+                (parsed here from message_data["text"] if not provided)
+        """
+        return self.save_batch_to_mongodb([(message_data, parsed_message)])
+
 
     def format_topup_message(self, topup_result):
         """Format TOPUP DONE message for console output."""
@@ -1077,9 +776,13 @@ class TelegramBotListener:
                 output.append(f"  UC Cards Used: {len(uc_codes)}")
                 for i, card_obj in enumerate(uc_codes[:3], 1):  # Show first 3 cards
                     card_code = card_obj.get('code', 'N/A') if isinstance(card_obj, dict) else str(card_obj)
-                    output.append(f"    {i}. {card_code}")
+                    card_state = card_obj.get('status') if isinstance(card_obj, dict) else None
+                    output.append(f"    {i}. {card_code}" + (f" ({card_state})" if card_state else ""))
                 if len(uc_codes) > 3:
                     output.append(f"    ... and {len(uc_codes) - 3} more")
+                summary = used_uc_obj.get('summary')
+                if summary and summary.get('failed'):
+                    output.append(f"  Failed Cards: {summary['failed']} of {summary['total']}")
             elif isinstance(used_uc_obj, list):
                 # Fallback for old format (direct array)
                 output.append(f"  UC Cards Used: {len(used_uc_obj)}")
@@ -1122,7 +825,10 @@ class TelegramBotListener:
                 "sent_message_id": sent_message_id,
                 "timestamp": datetime.now(),
                 "event": event,
-                "response_data": None
+                "response_data": None,
+                # Set once the full topup result is in response_data["raw_data"];
+                # waited on from the API thread, hence a threading.Event
+                "parsed_event": threading.Event()
             }
             # Use a list to handle multiple requests with same UID
             if uid not in self.pending_requests:
@@ -1194,7 +900,7 @@ class TelegramBotListener:
             response_data: The response data to deliver
             
         Returns:
-            True if matched, False otherwise
+            The matched pending item, or None
         """
         async with self.pending_requests_lock:
             if uid in self.pending_requests and self.pending_requests[uid]:
@@ -1204,71 +910,287 @@ class TelegramBotListener:
                 pending["event"].set()
                 print(f"  [Pending] Matched response to pending request for UID: {uid} (queue size: {len(self.pending_requests[uid])})")
                 # Don't remove yet - let the waiting coroutine clean it up
-                return True
-        return False
+                return pending
+        return None
+
+    def find_order(self, order_id):
+        """Look up an order: recent orders first, then storage (the result is cached).
+        
+        Returns:
+            ({"topupResult", "messageId", "date", "retry"}, source) with source
+            "cache" or "storage", or (None, None) if the order is not found
+        """
+        entry = self.recent_orders.get(order_id)
+        if entry is not None:
+            return entry, "cache"
+        if not self.store_available():
+            return None, None
+        document = self.store_lookup(self.store.find_topup_by_order_id, order_id)
+        if not document or not document.get("topupResult"):
+            return None, None
+        self.recent_orders.put(document["topupResult"], document.get("message_id"), document.get("date"),
+                               retry=document.get("retry"))
+        return {
+            "topupResult": document["topupResult"],
+            "messageId": document.get("message_id"),
+            "date": document.get("date"),
+            "retry": document.get("retry")
+        }, "storage"
+
+    def claim_order_retry(self, order_id, retry):
+        """Record a retry of an order's failed cards unless one is already recorded.
+        
+        Claimed in recent orders first (concurrent API calls), then on the stored
+        order document so the record survives a restart and is shared between
+        processes. While storage is down only the in-memory claim is made.
+        
+        Args:
+            order_id: Order ID of the original order
+            retry: Retry record ({"retryId", "state": "pending", "retriedAt", "command",
+                "failedCount", "failedUc"}); settled by finish_order_retry()
+            
+        Returns:
+            (claimed, retry record of the order)
+        """
+        claimed, record = self.recent_orders.claim_retry(order_id, retry)
+        if not claimed and record is not None:
+            return False, record
+        if self.store_available():
+            try:
+                stored_claimed, stored_record = self.store_lookup(self.store.claim_order_retry, order_id, retry)
+            except Exception as e:
+                print(f"  [Orders] Could not record the retry of order #{order_id} in storage: {e}")
+            else:
+                if not stored_claimed and stored_record is not None:
+                    self.recent_orders.set_retry(order_id, stored_record)
+                    return False, stored_record
+        return True, retry
+
+    def finish_order_retry(self, order_id, retry, retry_order_id=None):
+        """Settle a retry claimed by claim_order_retry().
+        
+        With the Order ID the bot answered with, the record becomes "sent"; without
+        one nothing is known to have been sent and the claim is released, so the
+        order can be retried again.
+        
+        Args:
+            order_id: Order ID of the original order
+            retry: The claimed retry record
+            retry_order_id: Order ID of the bot's answer, or None
+        """
+        if retry_order_id is not None:
+            settled = dict(retry, state="sent", retryOrderId=retry_order_id)
+            self.recent_orders.set_retry(order_id, settled)
+        else:
+            settled = None
+            self.recent_orders.release_retry(order_id, retry["retryId"])
+            print(f"  [Orders] Retry of order #{order_id} got no order back, released")
+        if self.store_available():
+            try:
+                self.store_lookup(self.store.update_order_retry, order_id, retry["retryId"], settled)
+            except Exception as e:
+                print(f"  [Orders] Could not update the retry of order #{order_id} in storage: {e}")
+
+    async def resolve_pending_topup(self, message_data, topup_header):
+        """Deliver a topup response to the pending request for its UID.
+        
+        Each message resolves at most one request, so a later edit of the same
+        message cannot complete a second request for that UID.
+        
+        Args:
+            message_data: Message data (raw_data of the response)
+            topup_header: Result of message_parser.parse_topup_header()
+            
+        Returns:
+            The matched pending item, or None
+        """
+        message_id = message_data["message_id"]
+        if message_id in self.matched_message_ids:
+            return None
+        
+        message_data["topupHeader"] = topup_header
+        response_data = {
+            "message_id": message_id,
+            "text": message_data["text"],
+            "date": message_data["date"],
+            "raw_data": message_data
+        }
+        matched_pending = await self.match_response_to_pending_request(topup_header["uid"], response_data)
+        if matched_pending:
+            self.matched_message_ids[message_id] = True
+            if len(self.matched_message_ids) > 1000:
+                self.matched_message_ids.popitem(last=False)
+            print(f"  [Pending] Response matched to pending request for UID: {topup_header['uid']} ({topup_header['status']})")
+        return matched_pending
 
-    async def message_handler(self, event):
-        """Handle incoming messages from the bot."""
+    async def flush_topup_assemblies(self, now=None):
+        """Store split orders whose footer did not arrive within the assembly window.
+        
+        The parts received so far are parsed into one topupResult, stored on the
+        last part's message and delivered to a request still waiting for the UID.
+        
+        Args:
+            now: Current time in seconds (time.time()), now if None
+        """
+        if now is None:
+            now = datetime.now().timestamp()
+        for order_id, topup_result, context in self.topup_assembler.expire(now):
+            if topup_result is None or context is None:
+                print(f"  [Topup] Dropped incomplete split order #{order_id} (buffered parts did not parse)")
+                continue
+            message_data, parsed_message = context
+            print(f"  [Topup] No footer for split order #{order_id} within {config.TOPUP_ASSEMBLY_WINDOW}s,"
+                  f" storing {topup_result['meta']['parts']} part(s) as received")
+            message_data["topupResult"] = topup_result
+            self.recent_orders.put(topup_result, message_data["message_id"], message_data["date"])
+            if not self.persistence_queue.put((message_data, parsed_message.with_topup_result(topup_result))):
+                print(f"  [Writer] Queue full ({config.PERSIST_OVERFLOW}), message_id {message_data['message_id']} not saved")
+            
+            uid = (topup_result.get("user") or {}).get("uid")
+            if uid:
+                matched_pending = await self.resolve_pending_topup(message_data, {
+                    "status": topup_result["status"],
+                    "orderId": order_id,
+                    "uid": str(uid),
+                    "complete": True
+                })
+                if matched_pending:
+                    matched_pending["parsed_event"].set()
+
+    async def refresh_account_status(self, command, timeout=10.0):
+        """Ask the bot for the account status and wait for the reply.
+        
+        Args:
+            command: Command that makes the bot send the account status block
+            timeout: Seconds to wait for the reply
+            
+        Returns:
+            The new account snapshot dict, or None on timeout
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self.account_status_waiters.append(waiter)
+        try:
+            await self.client.send_message(self.bot_entity, command)
+            return await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"  [Account] Timeout waiting for account status reply to: {command}")
+            return None
+        finally:
+            if waiter in self.account_status_waiters:
+                self.account_status_waiters.remove(waiter)
+
+    async def message_handler(self, event, edited=False):
+        """Handle new and edited messages from the bot.
+        
+        Edits go through the same pipeline: the stored document is updated by
+        message_id, and a bot that edits a "processing" message into the final
+        TOPUP DONE text resolves the pending request when that edit arrives. An
+        edit replaces its part of a split order and its recent response, and
+        does not answer account status waiters.
+        
+        Args:
+            event: Telethon NewMessage or MessageEdited event
+            edited: True for a MessageEdited event
+        """
         message = event.message
         
         # Extract message data
         message_data = self.extract_message_data(message)
         
-        # Check if this is a TOPUP DONE message and format accordingly
-        message_text = message.text if message.text else ""
-        if message_text:
-            # Try to parse topup result for console output
-            cleaned_text = self.remove_emojis_except_uc(message_text)
-            topup_result = self.parse_topup_result(cleaned_text)
-            
-            # Store parsed topup_result in message_data for MongoDB saving
-            if topup_result:
-                message_data["_parsed_topup_result"] = topup_result
-                # Print formatted TOPUP DONE message
-                formatted_msg = self.format_topup_message(topup_result)
-                print(formatted_msg)
-                
-                # Try to match this response to a pending request by UID
-                # Check for UID in both success and failed status
-                user_uid = None
-                if topup_result.get("user") and topup_result["user"].get("uid"):
-                    user_uid = str(topup_result["user"]["uid"])
-                elif topup_result.get("status") == "failed":
-                    # For failed status, try to extract UID from the original request if available
-                    # The UID should be in the message text or we can try to match by orderId
-                    # But for now, we'll rely on the UID being in the topup_result
-                    pass
-                
-                if user_uid:
-                    response_data = {
-                        "message_id": message.id,
-                        "text": message_text,
-                        "date": message_data["date"],
-                        "raw_data": message_data
-                    }
-                    matched = await self.match_response_to_pending_request(user_uid, response_data)
-                    if matched:
-                        print(f"  [Pending] Response matched to pending request for UID: {user_uid}")
-            else:
-                # Print regular message
-                formatted_msg = self.format_message(message)
-                print(formatted_msg)
+        # Phase 1: status, UID and Order ID only, so the waiting API call is
+        # woken before the card list and payment fields are parsed
+        # (the first part of a split order waits for its footer, see below)
+        matched_pending = None
+        topup_header = message_parser.parse_topup_header(message_data["text"])
+        if topup_header and topup_header["complete"]:
+            matched_pending = await self.resolve_pending_topup(message_data, topup_header)
+            if matched_pending:
+                # Let the waiting request return before the full parse
+                await asyncio.sleep(0)
+        
+        # Phase 2: parse it once for every stage below
+        parsed_message = self.parse_cache.parse(message_data["message_id"], message_data["text"])
+        
+        # A card list split across several messages is assembled into one topupResult
+        now = datetime.now().timestamp()
+        await self.flush_topup_assemblies(now)
+        assembly_state, assembled = self.topup_assembler.feed(parsed_message, now, context=(message_data, parsed_message))
+        if assembly_state == message_parser.ASSEMBLY_PARTIAL:
+            print(f"  [Topup] Buffered part of a split order, waiting for the footer")
+            if parsed_message.topup_result:
+                parsed_message = parsed_message.with_topup_result(None)
+        elif assembly_state == message_parser.ASSEMBLY_ASSEMBLED:
+            print(f"  [Topup] Edit of a part of an already assembled split order, result unchanged")
+            if parsed_message.topup_result:
+                parsed_message = parsed_message.with_topup_result(None)
+        elif assembly_state == message_parser.ASSEMBLY_COMPLETE:
+            print(f"  [Topup] Assembled split order #{assembled['orderId']} from {assembled['meta']['parts']} messages")
+            parsed_message = parsed_message.with_topup_result(assembled)
+        
+        topup_result = parsed_message.topup_result
+        if topup_result:
+            # Expose the parsed result to API callers through raw_data
+            message_data["topupResult"] = topup_result
+            self.recent_orders.put(topup_result, message_data["message_id"], message_data["date"])
+            # Print formatted TOPUP DONE message
+            formatted_msg = self.format_topup_message(topup_result)
+            print(formatted_msg)
         else:
-            # Print regular message for non-text messages
-            formatted_msg = self.format_message(message)
+            # Print regular message
+            formatted_msg = self.format_message(message, parsed_message.text)
             print(formatted_msg)
         
-        # Save to MongoDB (all text in one document)
-        inserted_ids = self.save_to_mongodb(message_data)
-        if inserted_ids:
-            print(f"✓ Saved to MongoDB")
+        # The last part of a split order has no header: complete the request now
+        if assembly_state == message_parser.ASSEMBLY_COMPLETE and parsed_message.uid:
+            topup_header = {
+                "status": topup_result["status"],
+                "orderId": topup_result["orderId"],
+                "uid": parsed_message.uid,
+                "complete": True
+            }
+            matched_pending = await self.resolve_pending_topup(message_data, topup_header)
+        
+        if matched_pending:
+            matched_pending["parsed_event"].set()
+        
+        # Keep the latest account status in memory and wake refresh callers; an
+        # edit only replaces the snapshot it came from and is not a reply
+        if parsed_message.account_status:
+            current = self.account_snapshot.snapshot()
+            if not edited or (current is not None and current["messageId"] == message.id):
+                self.account_snapshot.update(parsed_message.account_status, message.id)
+            if not edited:
+                waiters, self.account_status_waiters = self.account_status_waiters, []
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(self.account_snapshot.snapshot())
+        
+        # Keep the current price list in memory; only changed versions are persisted
+        price_list_changed = True
+        if parsed_message.price_list:
+            price_list_changed = self.price_list_store.update(parsed_message.price_list, message.id)
+        
+        if price_list_changed:
+            # Save to MongoDB (all text in one document) on the writer thread
+            if parsed_message.price_list:
+                message_data["price_list_version"] = self.price_list_store.version
+            if not self.persistence_queue.put((message_data, parsed_message)):
+                print(f"  [Writer] Queue full ({config.PERSIST_OVERFLOW}), message_id {message.id} not saved")
+        else:
+            print(f"  [Prices] Price list unchanged (version {self.price_list_store.version}), not saved")
         
         # Store response for API access (store last 100 responses)
         async with self.response_lock:
-            response_id = f"{message.id}_{datetime.now().timestamp()}"
+            response_id = None
+            if edited:
+                # Replace the response of the edited message instead of adding one
+                response_id = next((key for key, response in self.recent_responses.items()
+                                    if response["message_id"] == message.id), None)
+            if response_id is None:
+                response_id = f"{message.id}_{datetime.now().timestamp()}"
             self.recent_responses[response_id] = {
                 "message_id": message.id,
-                "text": message_text,
+                "text": parsed_message.text,
                 "date": message_data["date"],
                 "raw_data": message_data
             }
@@ -1281,6 +1203,17 @@ class TelegramBotListener:
         
         print("-" * 80)  # Separator line
 
+    def close_persistence(self):
+        """Write what is still queued (to MongoDB or the spool) and stop the background threads."""
+        self.persistence_queue.close()
+        self.mongo_health_stop.set()
+
+    def write_messages(self, items):
+        """Persist a batch of queued (message_data, parsed_message) items (writer thread)."""
+        inserted_ids = self.save_batch_to_mongodb(items)
+        if inserted_ids:
+            print(f"✓ Saved to {self.store.describe()} ({len(inserted_ids)} new)")
+
     async def send_message_to_bot(self, message_text):
         """Send a message to the bot."""
         try:
@@ -1301,8 +1234,8 @@ class TelegramBotListener:
         print(f"\n{'='*80}")
         print(f"Listening to messages from @{self.bot_username}")
         print(f"Send commands to the bot from your Telegram app to see responses here.")
-        if self.mongo_collection is not None:
-            print(f"Messages will be saved to MongoDB: {config.MONGODB_DATABASE}.{config.MONGODB_COLLECTION}")
+        if self.store is not None and self.store.connected:
+            print(f"Messages will be saved to {self.store.describe()}")
         else:
             print(f"Warning: MongoDB not connected. Messages will only be printed to console.")
         print(f"Press Ctrl+C to stop.")
@@ -1313,6 +1246,11 @@ class TelegramBotListener:
         async def handler(event):
             await self.message_handler(event)
         
+        # The bot may edit a "processing" message into the final result
+        @self.client.on(events.MessageEdited(from_users=self.bot_entity))
+        async def edit_handler(event):
+            await self.message_handler(event, edited=True)
+        
         # Start periodic cleanup task for stale pending requests
         async def cleanup_task():
             while True:
@@ -1325,6 +1263,17 @@ class TelegramBotListener:
         # Start cleanup task in background
         asyncio.create_task(cleanup_task())
         
+        # Store split orders whose last part never arrives, even if the bot goes quiet
+        async def topup_flush_task():
+            while True:
+                await asyncio.sleep(max(1.0, config.TOPUP_ASSEMBLY_WINDOW / 2))
+                try:
+                    await self.flush_topup_assemblies()
+                except Exception as e:
+                    print(f"  [Topup] Error flushing split orders: {e}")
+        
+        asyncio.create_task(topup_flush_task())
+        
         # Keep the script running
         await self.client.run_until_disconnected()
 
@@ -1348,9 +1297,10 @@ class TelegramBotListener:
             print(f"\nError: {e}")
         finally:
             await self.client.disconnect()
-            if self.mongo_client:
-                self.mongo_client.close()
-                print("Disconnected from MongoDB.")
+            self.close_persistence()
+            if self.store is not None and self.store.connected:
+                self.store.close()
+                print(f"Disconnected from {self.store.name} storage.")
             print("Disconnected from Telegram.")
 
 
@@ -0,0 +1,70 @@
+"""
+Tests for the RecentOrders cache in bot_state.py
+Run: python -m pytest -q test_bot_state.py
+"""
+
+from bot_state import RecentOrders
+
+
+def topup(order_id, status="failed"):
+    return {"orderId": order_id, "status": status}
+
+
+def test_hit_and_miss_are_counted():
+    orders = RecentOrders(maxsize=4)
+    orders.put(topup(5), message_id=1)
+    assert orders.get(5)["messageId"] == 1
+    assert orders.get(6) is None
+    stats = orders.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_least_recently_used_order_is_evicted():
+    orders = RecentOrders(maxsize=2)
+    orders.put(topup(1))
+    orders.put(topup(2))
+    orders.get(1)          # 1 is now the most recent
+    orders.put(topup(3))   # evicts 2
+    assert orders.get(2) is None
+    assert orders.get(1) is not None
+    assert orders.get(3) is not None
+    assert orders.stats()["size"] == 2
+
+
+def test_result_without_order_id_is_ignored():
+    orders = RecentOrders(maxsize=2)
+    orders.put({"status": "success"})
+    assert orders.stats()["size"] == 0
+
+
+def test_claim_retry_is_granted_once_and_survives_put():
+    orders = RecentOrders()
+    pending = {"retryId": "a", "state": "pending"}
+    assert orders.claim_retry(5, pending) == (False, None)
+
+    orders.put(topup(5))
+    assert orders.claim_retry(5, pending) == (True, pending)
+    assert orders.claim_retry(5, {"retryId": "b", "state": "pending"}) == (False, pending)
+
+    # A newer parse of the order (e.g. an edit) keeps the claim
+    orders.put(topup(5, status="success"))
+    assert orders.get(5)["retry"] == pending
+    assert orders.get(5)["topupResult"]["status"] == "success"
+
+
+def test_release_retry_only_drops_its_own_claim():
+    orders = RecentOrders()
+    orders.put(topup(5))
+    orders.claim_retry(5, {"retryId": "a", "state": "pending"})
+    orders.release_retry(5, "b")
+    assert orders.get(5)["retry"]["retryId"] == "a"
+    orders.release_retry(5, "a")
+    assert orders.get(5)["retry"] is None
+    assert orders.claim_retry(5, {"retryId": "c", "state": "pending"})[0]
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
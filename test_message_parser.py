@@ -0,0 +1,182 @@
+"""
+Regression tests for message_parser.py
+Run: python -m pytest -q test_message_parser.py
+"""
+
+import message_parser
+
+
+TOPUP_DONE_TEXT = """✅ Monthly 💎 TOPUP DONE
+┌──────────────────────────┐
+│ Order ID : #2237
+│ User   : {user}
+│ UID    : 2194747891
+└──────────────────────────┘
+BDMB-S-S-02536618 5494-2393-2291-4243  ✅ Success
+BDMB-S-S-02539602 1251-3736-3127-9172  ❌ Failed
+┌──────────────────────────┐
+│ Total  : 2934.0৳ ৳ (0.5৳ Fee/Unit)
+│ Monthly  : 4x
+│ Baki   : 2934.00৳
+│ Due    : 0.00 + 2934.00 = 2934.00৳
+│
+│ Duration : 5.47s
+└── 🤖 Powered by UcBot ───┘"""
+
+
+def test_user_name_that_normalizes_to_empty_keeps_uid():
+    # Hangul + emoji are stripped by normalize_text(); "User :" must not swallow the UID line
+    parsed = message_parser.parse_message(1, TOPUP_DONE_TEXT.format(user="모모🔥"))
+    assert parsed.topup_result is not None
+    assert parsed.topup_result["orderId"] == 2237
+    assert parsed.topup_result["user"]["uid"] == "2194747891"
+    assert parsed.topup_result["user"]["name"] is None
+
+
+def test_header_fields_stay_on_their_line():
+    fields = message_parser.ORDER_HEADER_SPEC.extract("Order ID : #2237\nUser :\nUID : 2194747891")
+    assert fields == {"orderId": 2237, "uid": "2194747891"}
+
+
+def test_plain_user_name():
+    parsed = message_parser.parse_message(1, TOPUP_DONE_TEXT.format(user="Sakib"))
+    assert parsed.topup_result["user"] == {"name": "Sakib", "uid": "2194747891"}
+    assert parsed.topup_result["payment"]["usedUc"]["summary"]["failed"] == 1
+
+
+def test_header_and_full_parse_agree_on_emoji_only_failure():
+    text = "🚫 Sorry, server busy\nUID : 5123456789\nOrder ID : #2240"
+    parsed = message_parser.parse_message(1, text)
+    assert parsed.kind is None and parsed.topup_result is None
+    assert message_parser.parse_topup_header(text) is None
+
+
+def test_header_and_full_parse_agree_on_limit_over():
+    text = "🚫 LIMIT OVER\n│ Order ID : #2240\n│ UID    : 5123456789"
+    header = message_parser.parse_topup_header(text)
+    parsed = message_parser.parse_message(1, text)
+    assert header["status"] == parsed.topup_result["status"] == "failed"
+    assert header["orderId"] == parsed.topup_result["orderId"] == 2240
+
+
+def footerless_topup(card_lines):
+    header = TOPUP_DONE_TEXT.format(user="Sakib").split("BDMB-S-S-02536618")[0]
+    return header + "\n".join(card_lines)
+
+
+def card_lines(count, start=0):
+    return [f"BDMB-S-S-{start + n:08d} 5494-2393-2291-{n % 10000:04d}  ✅ Success" for n in range(count)]
+
+
+def test_short_topup_without_footer_is_complete():
+    text = footerless_topup(card_lines(2))
+    assert message_parser.parse_topup_header(text)["complete"] is True
+    assembler = message_parser.TopupAssembler(30)
+    assert assembler.feed(message_parser.parse_message(1, text), 0) == (message_parser.ASSEMBLY_NONE, None)
+    assert assembler.stats()["open"] == 0
+
+
+def test_split_order_is_assembled():
+    first = footerless_topup(card_lines(90))
+    assert len(first) >= message_parser.MESSAGE_LENGTH_LIMIT - message_parser.SPLIT_LENGTH_MARGIN
+    assert message_parser.parse_topup_header(first)["complete"] is False
+    last = "\n".join(card_lines(3, start=90)) + "\n" + TOPUP_DONE_TEXT.split("Failed\n")[1]
+
+    assembler = message_parser.TopupAssembler(30)
+    state, _ = assembler.feed(message_parser.parse_message(1, first), 0)
+    assert state == message_parser.ASSEMBLY_PARTIAL
+    state, assembled = assembler.feed(message_parser.parse_message(2, last), 1)
+    assert state == message_parser.ASSEMBLY_COMPLETE
+    assert assembled["meta"]["messageIds"] == [1, 2]
+    assert assembled["payment"]["usedUc"]["summary"]["total"] == 93
+
+
+def test_chatter_is_not_appended_to_split_order():
+    assembler = message_parser.TopupAssembler(30)
+    assembler.feed(message_parser.parse_message(1, footerless_topup(card_lines(90))), 0)
+    for chatter in ("Order 2237", "Checking UID 2194747891", "BDMB-S-S-02536618 5494-2393-2291-4243"):
+        assert assembler.feed(message_parser.parse_message(2, chatter), 1) == (message_parser.ASSEMBLY_NONE, None)
+    state, _ = assembler.feed(message_parser.parse_message(3, "\n".join(card_lines(2, start=90))), 2)
+    assert state == message_parser.ASSEMBLY_PARTIAL
+
+
+def test_split_order_without_footer_is_flushed():
+    assembler = message_parser.TopupAssembler(30)
+    context = object()
+    assembler.feed(message_parser.parse_message(1, footerless_topup(card_lines(90))), 0, context=context)
+    assert assembler.expire(10) == []
+    [(order_id, assembled, flushed_context)] = assembler.expire(31)
+    assert order_id == 2237 and flushed_context is context
+    assert assembled["meta"]["footerMissing"] is True
+    assert assembled["payment"]["usedUc"]["summary"]["total"] == 90
+    assert assembler.stats()["open"] == 0
+
+
+def test_edited_first_part_keeps_received_parts():
+    assembler = message_parser.TopupAssembler(30)
+    first = footerless_topup(card_lines(90))
+    assembler.feed(message_parser.parse_message(1, first), 0)
+    assembler.feed(message_parser.parse_message(2, "\n".join(card_lines(2, start=90))), 1)
+    state, _ = assembler.feed(message_parser.parse_message(1, first), 2)
+    assert state == message_parser.ASSEMBLY_PARTIAL
+
+    last = TOPUP_DONE_TEXT.split("Failed\n")[1]
+    state, assembled = assembler.feed(message_parser.parse_message(3, last), 3)
+    assert state == message_parser.ASSEMBLY_COMPLETE
+    assert assembled["meta"]["messageIds"] == [1, 2, 3]
+    assert assembled["payment"]["usedUc"]["summary"]["total"] == 92
+
+
+def test_edited_middle_part_is_replaced_not_appended():
+    assembler = message_parser.TopupAssembler(30)
+    assembler.feed(message_parser.parse_message(1, footerless_topup(card_lines(90))), 0)
+    assembler.feed(message_parser.parse_message(2, "\n".join(card_lines(2, start=90))), 1)
+    assembler.feed(message_parser.parse_message(2, "\n".join(card_lines(3, start=90))), 2)
+    last = TOPUP_DONE_TEXT.split("Failed\n")[1]
+    _, assembled = assembler.feed(message_parser.parse_message(3, last), 3)
+    assert assembled["meta"]["parts"] == 3
+    assert assembled["payment"]["usedUc"]["summary"]["total"] == 93
+
+    # Edits of an assembled order's parts do not start or join another order
+    state, _ = assembler.feed(message_parser.parse_message(1, footerless_topup(card_lines(90))), 4)
+    assert state == message_parser.ASSEMBLY_ASSEMBLED
+    assert assembler.stats()["open"] == 0
+
+
+def test_parse_cache_hit_returns_parse_for_new_message_id():
+    cache = message_parser.ParseCache(maxsize=4)
+    text = TOPUP_DONE_TEXT.format(user="Rahim")
+    first = cache.parse(1, text)
+    second = cache.parse(2, text)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.message_id == 2
+    assert second.topup_result is first.topup_result
+    assert cache.stats()["hitRate"] == 0.5
+
+
+def test_parse_cache_evicts_least_recently_used():
+    cache = message_parser.ParseCache(maxsize=2)
+    cache.parse(1, "a")
+    cache.parse(2, "b")
+    cache.parse(3, "a")    # "a" is now the most recent
+    cache.parse(4, "c")    # evicts "b"
+    assert cache.stats()["size"] == 2
+    cache.parse(5, "a")
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.parse(6, "b")
+    assert cache.misses == 4
+
+
+def test_parse_cache_disabled_with_zero_maxsize():
+    cache = message_parser.ParseCache(maxsize=0)
+    cache.parse(1, "a")
+    cache.parse(2, "a")
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert cache.stats()["size"] == 0
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,106 @@
+"""
+Tests for the embedded message_store backends (memory and SQLite)
+Run: python -m pytest -q test_message_store.py
+"""
+
+import os
+import tempfile
+
+import message_store
+import rollups
+
+
+def stores():
+    """Yield a connected memory store and a connected SQLite store on a fresh file."""
+    memory = message_store.MemoryMessageStore()
+    memory.connect()
+    yield memory
+    sqlite = message_store.SQLiteMessageStore(os.path.join(tempfile.mkdtemp(), "messages.sqlite3"))
+    sqlite.connect()
+    try:
+        yield sqlite
+    finally:
+        sqlite.close()
+
+
+def topup_upsert(message_id, order_id, status="success", raw_date="2026-10-17T10:00:00"):
+    topup_result = {"orderId": order_id, "status": status, "user": {"uid": "5801424265"},
+                    "payment": {"total": 80, "paid": 80, "due": 0, "usedUc": ["code"]}}
+    return {
+        "message_id": message_id,
+        "document": {"message_id": message_id, "raw_text": "TOPUP DONE", "raw_date": raw_date},
+        "set": {"topupResult": topup_result}
+    }
+
+
+def test_upsert_inserts_then_updates_in_place():
+    for store in stores():
+        assert list(store.write_upserts([topup_upsert(1, 5, status="failed")])) == [0]
+        assert store.write_upserts([topup_upsert(1, 5)]) == {}
+
+        document = store.find_by_message_id(1)
+        assert document["raw_text"] == "TOPUP DONE"
+        assert document["topupResult"]["status"] == "success"
+        assert store.find_by_message_id(2) is None
+
+
+def test_order_lookup_returns_latest_document():
+    for store in stores():
+        store.write_upserts([topup_upsert(1, 5), topup_upsert(2, 6), topup_upsert(3, 5)])
+        assert store.find_topup_by_order_id(5)["message_id"] == 3
+        assert store.find_topup_by_order_id(6)["message_id"] == 2
+        assert store.find_topup_by_order_id(7) is None
+        assert store.find_latest("topupResult")["message_id"] == 3
+
+
+def test_claim_order_retry_is_granted_once():
+    for store in stores():
+        pending = {"retryId": "a", "state": "pending"}
+        assert store.claim_order_retry(5, pending) == (False, None)
+
+        store.write_upserts([topup_upsert(1, 5, status="failed")])
+        assert store.claim_order_retry(5, pending) == (True, pending)
+        claimed, record = store.claim_order_retry(5, {"retryId": "b", "state": "pending"})
+        assert not claimed
+        assert record["retryId"] == "a"
+
+
+def test_update_order_retry_checks_the_claim():
+    for store in stores():
+        store.write_upserts([topup_upsert(1, 5, status="failed")])
+        store.claim_order_retry(5, {"retryId": "a", "state": "pending"})
+
+        assert not store.update_order_retry(5, "b", {"retryId": "b", "state": "sent"})
+        assert store.update_order_retry(5, "a", {"retryId": "a", "state": "sent"})
+        assert store.find_topup_by_order_id(5)["retry"]["state"] == "sent"
+
+        # Release makes the order claimable again
+        assert store.update_order_retry(5, "a", None)
+        assert store.find_topup_by_order_id(5).get("retry") is None
+        assert store.claim_order_retry(5, {"retryId": "c", "state": "pending"})[0]
+
+
+def test_rollups_count_each_message_once():
+    for store in stores():
+        first = topup_upsert(1, 5)["set"]["topupResult"]
+        second = topup_upsert(2, 6, status="failed")["set"]["topupResult"]
+        store.increment_rollups(rollups.rollup_entries(first, 1, "2026-10-17T10:00:00"))
+        store.increment_rollups(rollups.rollup_entries(second, 2, "2026-10-17T11:00:00"))
+        # Replayed or edited message
+        store.increment_rollups(rollups.rollup_entries(first, 1, "2026-10-17T10:00:00"))
+
+        (daily,) = store.find_rollups(rollups.ROLLUP_DAILY, "2026-10-17", "2026-10-17")
+        assert daily["orders"] == 2
+        assert daily["successOrders"] == 1
+        assert daily["failedOrders"] == 1
+        assert daily["total"] == 160
+        (per_uid,) = store.find_rollups(rollups.ROLLUP_UID, "2026-10-17", "2026-10-17", uid="5801424265")
+        assert per_uid["orders"] == 2
+        assert store.find_rollups(rollups.ROLLUP_DAILY, "2026-10-18", "2026-10-20") == []
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,160 @@
+"""
+Tests for persistence.py (write-behind queue, spool, circuit breaker)
+Run: python -m pytest -q test_persistence.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import persistence
+
+
+def blocked_queue(overflow, maxsize=2, block_timeout=5.0):
+    """Queue whose writer is stuck on item 0 until the returned event is set."""
+    release = threading.Event()
+    written = []
+
+    def write_batch(items):
+        release.wait(5)
+        written.extend(items)
+
+    writer = persistence.WriteBehindQueue(write_batch, maxsize=maxsize, overflow=overflow,
+                                          block_timeout=block_timeout, batch_size=1, linger_ms=0)
+    writer.put(0)
+    deadline = time.monotonic() + 5
+    while writer.stats()["depth"] and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return writer, release, written
+
+
+def test_drop_newest_keeps_queued_items():
+    writer, release, written = blocked_queue(persistence.OVERFLOW_DROP_NEWEST)
+    assert writer.put(1) and writer.put(2)
+    assert writer.put(3) is False
+    release.set()
+    assert writer.flush(5)
+    assert written == [0, 1, 2]
+    assert writer.stats()["dropped"] == 1
+    writer.close()
+
+
+def test_drop_oldest_makes_room_for_new_item():
+    writer, release, written = blocked_queue(persistence.OVERFLOW_DROP_OLDEST)
+    assert writer.put(1) and writer.put(2)
+    assert writer.put(3) is True
+    release.set()
+    assert writer.flush(5)
+    assert written == [0, 2, 3]
+    assert writer.stats()["dropped"] == 1
+    writer.close()
+
+
+def test_block_gives_up_after_timeout():
+    writer, release, written = blocked_queue(persistence.OVERFLOW_BLOCK, block_timeout=0.05)
+    assert writer.put(1) and writer.put(2)
+    start = time.monotonic()
+    assert writer.put(3) is False
+    assert time.monotonic() - start >= 0.05
+    release.set()
+    assert writer.flush(5)
+    assert written == [0, 1, 2]
+    writer.close()
+
+
+def test_unknown_overflow_policy_is_rejected():
+    try:
+        persistence.WriteBehindQueue(lambda items: None, overflow="drop_random")
+    except ValueError:
+        return
+    assert False, "expected ValueError"
+
+
+def test_batches_are_capped_at_batch_size():
+    batches = []
+    writer = persistence.WriteBehindQueue(lambda items: batches.append(list(items)), batch_size=3, linger_ms=200)
+    for item in range(7):
+        writer.put(item)
+    assert writer.flush(5)
+    writer.close()
+    assert [item for batch in batches for item in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert batches[0] == [0, 1, 2]
+
+
+def test_linger_collects_a_burst_into_one_batch():
+    batches = []
+    writer = persistence.WriteBehindQueue(lambda items: batches.append(list(items)), batch_size=100, linger_ms=100)
+    writer.put("a")
+    writer.put("b")
+    assert writer.flush(5)
+    writer.close()
+    assert batches == [["a", "b"]]
+
+
+def test_failed_batch_is_counted_and_writer_continues():
+    def write_batch(items):
+        if "bad" in items:
+            raise RuntimeError("boom")
+
+    writer = persistence.WriteBehindQueue(write_batch, batch_size=1, linger_ms=0)
+    writer.put("bad")
+    writer.put("good")
+    assert writer.flush(5)
+    writer.close()
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["written"] == 1
+
+
+def test_spool_keeps_order_and_survives_reopen():
+    path = os.path.join(tempfile.mkdtemp(), "spool.sqlite3")
+    spool = persistence.MessageSpool(path)
+    spool.append([{"n": 1}, {"n": 2}])
+    spool.append([{"n": 3}])
+    assert len(spool) == 3
+
+    last_id, records = spool.read_batch(2)
+    assert records == [{"n": 1}, {"n": 2}]
+    spool.delete_through(last_id)
+    assert len(spool) == 1
+
+    reopened = persistence.MessageSpool(path)
+    assert len(reopened) == 1
+    last_id, records = reopened.read_batch(10)
+    assert records == [{"n": 3}]
+    reopened.delete_through(last_id)
+    assert reopened.read_batch(10) == (None, [])
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = persistence.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow_request()
+    breaker.record_failure("down")
+    assert breaker.state == persistence.BREAKER_CLOSED
+    breaker.record_failure("down")
+    assert breaker.state == persistence.BREAKER_OPEN
+    assert not breaker.allow_request()
+
+    # A failed trial opens it again
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == persistence.BREAKER_HALF_OPEN
+    breaker.record_failure("still down")
+    assert breaker.state == persistence.BREAKER_OPEN
+    assert not breaker.allow_request()
+
+    # A successful trial closes it
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.is_closed
+    assert breaker.stats()["timesOpened"] == 2
+    assert breaker.stats()["consecutiveFailures"] == 0
+
+
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")